@@ -0,0 +1,9 @@
+"""
+Benchmarks for ColdHotGame bot
+
+Run from the project root, e.g.:
+    python -m benchmarks.players_save
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
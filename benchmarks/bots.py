@@ -0,0 +1,202 @@
+"""
+Per-bot throughput and memory of several bots hosted in one process
+
+BOTS BotInstances of src.bot (different MAX_GUESS_NUMBER values, their own
+players namespaces of --backend) are created next to the default bot in a
+temporary directory and populated with PLAYERS players each. Printed are
+the traced memory taken by every bot and the RSS of the whole process
+against the one of a separate process running a single empty bot (Linux).
+
+Then USERS users of every bot play long games (GUESSES guesses each)
+through bot.process_new_messages(), first one bot at a time and then all
+the bots interleaved over the shared executor and storage. Printed are
+the updates per second of every bot in both runs. FakeTransport of
+benchmarks.handlers replaces the network, the send rate limits and the
+flood guards are lifted.
+
+Usage:
+    python -m benchmarks.bots [--bots N] [--users N] [--players N]
+        [--backend B] [--output FILE]
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import argparse
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import telebot.apihelper
+
+from benchmarks import results
+from benchmarks.common import make_message
+from benchmarks.handlers import BATCH, FakeTransport, new_users
+
+GUESSES = 30
+MAX_NUMBERS = (100, 1000, 10_000)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_SINGLE_BOT = (
+    "import src.bot; from benchmarks.bots import rss; print(rss()); "
+    "src.bot.close()")
+
+
+class BotTransport(FakeTransport):
+    def __init__(self) -> None:
+        super().__init__()
+        self.tokens = dict()  # token -> sent messages
+
+    def __call__(self, method: str, url: str, params=None, **kwargs):
+        if url.endswith("/sendMessage"):
+            token = url.rsplit("/", 2)[-2][len("bot"):]
+            with self._lock:
+                self.tokens[token] = self.tokens.get(token, 0) + 1
+        return super().__call__(method, url, params, **kwargs)
+
+
+def rss() -> int:
+    # the current resident set, ru_maxrss would be inherited over exec
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def populate(game, count: int) -> None:
+    for uid in new_users(count):
+        game.players.add_new(uid, f"Player {uid}")
+        player = game.players[uid]
+        if random.random() < 0.5:
+            hard_mode = random.random() < 0.2
+            player.increase_games_count(hard_mode)
+            game.players.set_best_steps(
+                uid, random.randint(5, 30), hard_mode)
+            game.players.set_best_time(
+                uid, random.randint(10, 600), hard_mode)
+
+
+def sessions(users: int, max_number: int) -> list:
+    uids = new_users(users)
+    messages = [make_message(uid, "/start") for uid in uids]
+    for _ in range(GUESSES):
+        messages += [
+            make_message(uid, str(random.randint(1, max_number)))
+            for uid in uids]
+    return messages
+
+
+def drain(instances: list, executor) -> None:
+    executor.join()
+    while any(instance.sender.stats()["depth"] for instance in instances):
+        time.sleep(0.001)
+
+
+def single_bot_rss() -> int:
+    with tempfile.TemporaryDirectory() as directory:
+        output = subprocess.run(
+            [sys.executable, "-c", _SINGLE_BOT], cwd=directory,
+            env=dict(os.environ, PYTHONPATH=ROOT),
+            capture_output=True, text=True, check=True).stdout
+    return int(output.split()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--bots", type=int, default=4)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--players", type=int, default=100_000)
+    parser.add_argument(
+        "--backend", choices=("pickle", "sqlite", "indexed"),
+        default="pickle")
+    parser.add_argument("--output", help="save the results as JSON")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    import src.players
+    src.players.PLAYERS_BACKEND = args.backend
+    transport = BotTransport()
+    telebot.apihelper.CUSTOM_REQUEST_SENDER = transport
+    measured = dict()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            from src.bot import BotInstance, default, executor
+            instances = [default]
+            tracemalloc.start()
+            for i in range(args.bots):
+                before = tracemalloc.get_traced_memory()[0]
+                instance = BotInstance(
+                    f"{i + 1}:benchmark", f"bot{i + 1}",
+                    MAX_NUMBERS[i % len(MAX_NUMBERS)])
+                populate(instance.game, args.players)
+                measured[f"bot{i + 1}_memory_bytes"] = (
+                    tracemalloc.get_traced_memory()[0] - before)
+                instances.append(instance)
+            tracemalloc.stop()
+            process_rss = rss()
+            for instance in instances:
+                instance.sender.set_limits(1e9, 1e9, 1e9)
+                instance.sender.coalesce = False
+                instance.guard.mode = "off"
+            hosted = instances[1:]
+            print(f"{args.bots=} {args.users=} {args.players=} "
+                  f"{args.backend=}")
+            print(f"{'bot':>6} {'max':>6} {'memory, MB':>10} "
+                  f"{'alone, upd/s':>13} {'together, upd/s':>16}")
+            workloads = {
+                instance.name: sessions(args.users, instance.game.max_number)
+                for instance in hosted}
+            for instance in hosted:
+                messages = workloads[instance.name]
+                start = time.perf_counter()
+                for i in range(0, len(messages), BATCH):
+                    instance.bot.process_new_messages(messages[i:i + BATCH])
+                drain(instances, executor)
+                measured[f"{instance.name}_alone_updates_per_s"] = (
+                    len(messages) / (time.perf_counter() - start))
+            # the same users start again, their games are interleaved
+            workloads = {
+                instance.name: sessions(args.users, instance.game.max_number)
+                for instance in hosted}
+            start = time.perf_counter()
+            for i in range(0, len(messages), BATCH):
+                for instance in hosted:
+                    instance.bot.process_new_messages(
+                        workloads[instance.name][i:i + BATCH])
+            drain(instances, executor)
+            elapsed = time.perf_counter() - start
+            for instance in hosted:
+                name = instance.name
+                together = len(workloads[name]) / elapsed
+                measured[f"{name}_together_updates_per_s"] = together
+                print(f"{name:>6} {instance.game.max_number:>6} "
+                      f"{measured[f'{name}_memory_bytes'] / 2**20:>10.1f} "
+                      f"{measured[f'{name}_alone_updates_per_s']:>13.0f} "
+                      f"{together:>16.0f}")
+            executor.stop()
+            for instance in instances:
+                instance.close()
+        finally:
+            os.chdir(cwd)
+    measured["process_rss_bytes"] = process_rss
+    measured["single_bot_process_rss_bytes"] = single_bot_rss()
+    updates = sum(len(messages) for messages in workloads.values())
+    measured["total_updates_per_s"] = updates / elapsed
+    print(f"total together {measured['total_updates_per_s']:.0f} updates/s, "
+          f"replies per bot {sorted(transport.tokens.values())}")
+    print(f"process RSS {process_rss / 2**20:.1f} MB "
+          f"with {args.bots + 1} bots, "
+          f"a separate single bot process "
+          f"{measured['single_bot_process_rss_bytes'] / 2**20:.1f} MB")
+    if args.output:
+        results.save(args.output, "bots", measured)
+
+
+if __name__ == "__main__":
+    main()
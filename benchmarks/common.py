@@ -0,0 +1,61 @@
+"""
+Helpers shared by the benchmarks
+
+per_call() times function(*args) over the inputs REPEAT times and returns
+the best run in nanoseconds per call. make_message() builds a private
+chat message of a user (a command gets its bot_command entity as sent by
+Telegram). make_players() fills a pickle backend Players with count
+players numbered from first, about half of them with the results of some
+games (ranked by the leaderboard) unless results is False.
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import random
+import time
+
+from telebot.types import Message
+
+from src.players import Players
+
+REPEAT = 5
+
+
+def per_call(function, inputs: list) -> float:
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        for args in inputs:
+            function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(inputs) * 1e9
+
+
+def make_message(uid: int, text: str) -> Message:
+    message = {
+        "message_id": 1,
+        "from": {"id": uid, "is_bot": False, "first_name": f"User {uid}"},
+        "chat": {"id": uid, "type": "private"},
+        "date": int(time.time()),
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [
+            {"type": "bot_command", "offset": 0, "length": len(text)}]
+    return Message.de_json(message)
+
+
+def make_players(count: int, first: int = 0,
+                 results: bool = True) -> Players:
+    players = Players()
+    for pid in range(first, first + count):
+        players.add_new(pid, f"Player {pid - first}")
+        if not results or random.random() >= 0.5:
+            continue
+        hard_mode = random.random() < 0.2
+        players[pid].increase_games_count(hard_mode)
+        players.set_best_steps(pid, random.randint(5, 30), hard_mode)
+        players.set_best_time(pid, random.randint(10, 600), hard_mode)
+    return players
@@ -0,0 +1,123 @@
+"""
+Stress check of the handlers running on the per-user ordered executor
+
+Thousands of users play several games each at once through
+src.executor.KeyedExecutor with the real src.game handlers. The players
+journal is compacted every few saves, so snapshots are written while the
+other workers keep saving. Every winning move checks that no step of the
+game was lost or reordered, at the end the statistics in memory and the
+ones loaded back from the disk are compared with the expected ones.
+Exits with status 1 on any mismatch.
+
+    python -m benchmarks.concurrency [--backend sqlite] [--users 2000]
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+import src.players
+from benchmarks.common import make_message
+from src.executor import KeyedExecutor
+
+MAX_MISSES = 5
+
+
+def run(users: int, games: int, workers: int) -> list:
+    from src.game import Game
+    game = Game()
+    errors = []
+
+    def start(uid: int) -> None:
+        game.start_game(make_message(uid, "/start"))
+
+    def miss(uid: int) -> None:
+        number = game.sessions.get(uid).number_to_guess
+        guess = number % game.max_number + 1
+        game.make_move(make_message(uid, str(guess)))
+
+    def win(uid: int, steps: int) -> None:
+        session = game.sessions.get(uid)
+        if session.steps_count != steps - 1:
+            errors.append(f"{uid=} made {session.steps_count} of {steps - 1}")
+        game.make_move(make_message(uid, str(session.number_to_guess)))
+
+    expected = {uid: [0, src.players._INFINITY] for uid in range(1, users + 1)}
+    tasks = []
+    for uid, stats in expected.items():
+        moves = []
+        for _ in range(games):
+            steps = random.randint(1, MAX_MISSES + 1)
+            stats[0] += 1
+            stats[1] = min(stats[1], steps)
+            moves += [(uid, start)] + [(uid, miss)] * (steps - 1) + [
+                (uid, win, steps)]
+        tasks.append(moves)
+    executor = KeyedExecutor(workers, queue_size=1000)
+    start_time = time.perf_counter()
+    while tasks:
+        # interleave the users, keeping the order of every user's moves
+        i = random.randrange(len(tasks))
+        uid, fn, *args = tasks[i].pop(0)
+        executor.submit(uid, fn, uid, *args)
+        if not tasks[i]:
+            tasks[i] = tasks[-1]
+            tasks.pop()
+    executor.join()
+    elapsed = time.perf_counter() - start_time
+    executor.stop()
+    game.persister.stop()
+    played = sum(stats[0] for stats in expected.values())
+    print(f"{users=} {games=} {workers=}: {played} games in {elapsed:.2f} s")
+
+    def check(players, where: str) -> None:
+        for uid, (games_played, best_steps) in expected.items():
+            player = players[uid]
+            if (player.games_played, player.best_steps) != (
+                    games_played, best_steps):
+                errors.append(
+                    f"{where} {uid=} has {player.games_played=} "
+                    f"{player.best_steps=}, expected {games_played=} "
+                    f"{best_steps=}")
+
+    check(game.players, "memory")
+    reloaded = src.players.create_players()
+    reloaded.load()
+    check(reloaded, "disk")
+    return errors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--backend", choices=("pickle", "sqlite", "indexed"),
+                        default="pickle")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--games", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--journal-limit", type=int, default=50)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    src.players.PLAYERS_BACKEND = args.backend
+    src.players.PLAYERS_JOURNAL_LIMIT = args.journal_limit
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            errors = run(args.users, args.games, args.workers)
+        finally:
+            os.chdir(cwd)
+    for error in errors[:20]:
+        print(error)
+    print(f"{len(errors)} errors")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
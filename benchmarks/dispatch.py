@@ -0,0 +1,158 @@
+"""
+Per-update dispatch cost of src.dispatcher against the telebot handler chain
+
+Two TeleBot instances get recording handlers instead of the game ones:
+"chain" registers them the former way, one message_handler per command
+list followed by the text and the media ones, "dispatch" registers the
+single handler of src.bot routing by src.dispatcher.Dispatcher. First
+checks that both pick the same handler for the commands, their "@botname"
+and case variants, guesses and random texts, and that src.game.is_hard()
+agrees with the former any() over HARD, exits with 1 on a mismatch.
+Then prints the cost of one update through bot.process_new_messages()
+for a mix of GUESS_SHARE guesses and commands, and of route() alone.
+
+Usage:
+    python -m benchmarks.dispatch [--updates N] [--output FILE]
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import telebot
+
+from benchmarks import results
+from benchmarks.common import make_message, per_call
+from src.dispatcher import CONTENT_TYPES, MEDIA, create_dispatcher
+from src.thesaurus.commands import LEADERS, HELP, STOP, STATS, HARD, START
+
+HANDLERS = (
+    "start_game", "stop_command", "help_command", "stats_command",
+    "leaders_command", "make_move", "message_reply")
+GUESS_SHARE = 0.9
+_COMMANDS = START + HARD + STOP + HELP + STATS + LEADERS
+
+
+def recording_handlers(picked: list) -> SimpleNamespace:
+    def record(name: str):
+        return lambda message: picked.append(name)
+
+    return SimpleNamespace(**{name: record(name) for name in HANDLERS})
+
+
+def chain_bot(handlers: SimpleNamespace) -> telebot.TeleBot:
+    bot = telebot.TeleBot("1:benchmark", threaded=False)
+    bot.message_handler(commands=START+HARD)(handlers.start_game)
+    bot.message_handler(commands=STOP)(handlers.stop_command)
+    bot.message_handler(commands=HELP)(handlers.help_command)
+    bot.message_handler(commands=STATS)(handlers.stats_command)
+    bot.message_handler(commands=LEADERS)(handlers.leaders_command)
+    bot.message_handler(content_types=["text"])(handlers.make_move)
+    bot.message_handler(content_types=MEDIA)(handlers.message_reply)
+    return bot
+
+
+def dispatch_bot(handlers: SimpleNamespace) -> telebot.TeleBot:
+    bot = telebot.TeleBot("1:benchmark", threaded=False)
+    dispatcher = create_dispatcher(handlers)
+    bot.message_handler(content_types=CONTENT_TYPES)(
+        lambda message: dispatcher.route(message)(message))
+    return bot
+
+
+def media_message(content_type: str):
+    message = make_message(1, "")
+    message.content_type, message.text = content_type, None
+    return message
+
+
+def texts() -> list:
+    samples = ["", "/", "/@", "/@bot", "//start", " /start", "5", "/5", "-3"]
+    for command in _COMMANDS:
+        samples += [
+            f"/{command}", f"/{command}@ColdHotGameBot", f"/{command}@other",
+            f"/{command} 42", f"/{command} x", f"/{command}\n",
+            f"/{command.upper()}", f"/{command.title()}", f"/{command}x",
+            f"{command}", f"/start {command}", f"/x{command}"]
+    alphabet = "/@ \t\n0123456789hardstopжесть" + "".join(_COMMANDS)
+    samples += [
+        "".join(random.choice(alphabet) for _ in range(random.randint(1, 16)))
+        for _ in range(5000)]
+    samples += [str(random.randint(-10 ** 6, 10 ** 6)) for _ in range(1000)]
+    return samples
+
+
+def check(is_hard) -> tuple:
+    picked = {"chain": [], "dispatch": []}
+    bots = {
+        "chain": chain_bot(recording_handlers(picked["chain"])),
+        "dispatch": dispatch_bot(recording_handlers(picked["dispatch"])),
+    }
+    messages = [make_message(1, text) for text in texts()]
+    messages += [media_message(kind) for kind in MEDIA]
+    mismatches = 0
+    for message in messages:
+        for name, bot in bots.items():
+            picked[name].append(None)  # a skipped message is seen too
+            bot.process_new_messages([message])
+        if picked["chain"][-2:] != picked["dispatch"][-2:]:
+            mismatches += 1
+            print(f"Mismatch for {message.content_type} {message.text!r}: "
+                  f"{picked['chain'][-2:]} != {picked['dispatch'][-2:]}")
+        text = message.text
+        if text is not None and is_hard(text) != any(c in text for c in HARD):
+            mismatches += 1
+            print(f"is_hard mismatch for {text!r}")
+    return len(messages), mismatches
+
+
+def workload(updates: int) -> list:
+    return [
+        make_message(1, str(random.randint(1, 1000)))
+        if random.random() < GUESS_SHARE
+        else make_message(1, f"/{random.choice(_COMMANDS)}")
+        for _ in range(updates)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--updates", type=int, default=100_000)
+    parser.add_argument("--output", help="save the results as JSON")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            from src.game import is_hard
+            checked, mismatches = check(is_hard)
+        finally:
+            os.chdir(cwd)
+    print(f"{checked} messages checked, {mismatches} mismatches")
+    if mismatches:
+        sys.exit(1)
+    noop = SimpleNamespace(**dict.fromkeys(HANDLERS, lambda message: None))
+    messages = [([message],) for message in workload(args.updates)]
+    measured = {
+        "chain_update_ns": per_call(
+            chain_bot(noop).process_new_messages, messages),
+        "dispatch_update_ns": per_call(
+            dispatch_bot(noop).process_new_messages, messages),
+        "route_ns": per_call(create_dispatcher(noop).route, [
+            (message,) for (message,), in messages]),
+    }
+    for name, value in measured.items():
+        print(f"{name[:-3]:<24} {value:>8.1f} ns/update")
+    if args.output:
+        results.save(args.output, "dispatch", measured)
+
+
+if __name__ == "__main__":
+    main()
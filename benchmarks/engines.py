@@ -0,0 +1,88 @@
+"""
+Throughput of the sync and async bot engines against a local fake Bot API
+
+Every engine runs in its own process with an empty players database and
+polls benchmarks.fake_bot_api.FakeBotApi, which answers every sendMessage
+after SEND_DELAY seconds to emulate the Telegram round trip.
+
+Usage:
+    python -m benchmarks.engines [--users N] [--guesses N] [--delay S]
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.fake_bot_api import FakeBotApi, expected_replies, make_updates
+
+ENGINES = ("sync", "async")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def unlimit(sender, guard) -> None:
+    # measure the engine itself: no rate limits, every reply is sent
+    sender.set_limits(1e9, 1e9, 1e9)
+    sender.coalesce = False
+    guard.mode = "off"
+
+
+def run_engine(engine: str, api_url: str) -> None:
+    import telebot.apihelper
+    import telebot.asyncio_helper
+    telebot.apihelper.API_URL = api_url
+    telebot.asyncio_helper.API_URL = api_url
+    if engine == "async":
+        from src.async_bot import guard, polling, sender
+        unlimit(sender, guard)
+        asyncio.run(polling())
+    else:
+        from src.bot import bot, guard, sender
+        unlimit(sender, guard)
+        bot.infinity_polling(timeout=1, long_polling_timeout=1)
+
+
+def measure(engine: str, users: int, guesses: int, delay: float) -> float:
+    api = FakeBotApi(make_updates(users, guesses), send_delay=delay).start()
+    expected = expected_replies(users, guesses)
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    with tempfile.TemporaryDirectory() as directory:
+        child = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.engines",
+             "--child", engine, "--api-url", api.url],
+            cwd=directory, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not api.wait_sent(expected, timeout=600):
+                raise RuntimeError(f"{engine=} sent {len(api.sent)}/{expected}")
+        finally:
+            child.terminate()
+            child.wait()
+            api.stop()
+    return len(api.updates) / (api.sent[-1][0] - api.first_poll)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--guesses", type=int, default=10)
+    parser.add_argument("--delay", type=float, default=0.02)
+    parser.add_argument("--child", choices=ENGINES, help=argparse.SUPPRESS)
+    parser.add_argument("--api-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_engine(args.child, args.api_url)
+        return
+    print(f"{args.users=} {args.guesses=} {args.delay=}")
+    for engine in ENGINES:
+        rate = measure(engine, args.users, args.guesses, args.delay)
+        print(f"{engine:>6}: {rate:8.1f} updates/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Local stand-in for the Telegram Bot API
+
+FakeBotApi serves getUpdates from a prepared list of updates (more can be
+published while it runs), accepts sendMessage and records every reply,
+so the bot engines can be loaded without the network. Point telebot at it with
+    telebot.apihelper.API_URL = api.url
+    telebot.asyncio_helper.API_URL = api.url
+or the whole bot with settings.BOT_API_URL. Every request can be delayed by
+`latency` seconds, sendMessage by `send_delay` more. Faults are injected
+into sendMessage: `throttle_rate` of the calls are answered with 429 and
+`retry_after`, `error_rate` of them with 502; on_send(chat_id, text) is
+called for every accepted message.
+
+Usage (serves the scripted games of USERS users until Ctrl+C):
+    python -m benchmarks.fake_bot_api [--port 8081] [--users N] [--guesses N]
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+BOT_USER = {
+    "id": 1, "is_bot": True, "first_name": "ColdHot",
+    "username": "ColdHotGameBot",
+}
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def make_updates(users: int, guesses: int, first_user: int = 1000) -> list:
+    updates = []
+    now = int(time.time())
+    for step in range(guesses + 1):
+        for uid in range(first_user, first_user + users):
+            text = "/start" if not step else str(random.randint(1, 1000))
+            message = {
+                "message_id": len(updates) + 1,
+                "from": {"id": uid, "is_bot": False, "first_name": f"U{uid}"},
+                "chat": {"id": uid, "type": "private"},
+                "date": now + step,
+                "text": text,
+            }
+            if text.startswith("/"):
+                message["entities"] = [
+                    {"type": "bot_command", "offset": 0, "length": len(text)}]
+            updates.append({"update_id": len(updates) + 1, "message": message})
+    return updates
+
+
+def expected_replies(users: int, guesses: int) -> int:
+    return users * (2 + guesses)  # hello and start, a reply to every guess
+
+
+class FakeBotApi:
+    def __init__(self, updates: list = (), send_delay: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.0, throttle_rate: float = 0.0,
+                 error_rate: float = 0.0, retry_after: int = 1,
+                 on_send=None) -> None:
+        self.updates = list(updates)
+        self.send_delay = send_delay
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.on_send = on_send
+        self.sent = []  # (time, chat_id, text)
+        self.throttled = self.failed = 0
+        self.first_poll = None
+        self._sent_changed = threading.Condition()
+        self._updates_changed = threading.Condition()
+        self._server = _Server((host, port), self._handler())
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/bot{{0}}/{{1}}"
+
+    def start(self) -> "FakeBotApi":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def publish(self, update: dict) -> None:
+        with self._updates_changed:
+            update["update_id"] = len(self.updates) + 1
+            self.updates.append(update)
+            self._updates_changed.notify_all()
+
+    def wait_sent(self, count: int, timeout: float) -> bool:
+        with self._sent_changed:
+            return self._sent_changed.wait_for(
+                lambda: len(self.sent) >= count, timeout)
+
+    def get_updates(self, params: dict) -> list:
+        if self.first_poll is None:
+            self.first_poll = time.perf_counter()
+        offset = int(params.get("offset", 0) or 0)
+        limit = int(params.get("limit", 100) or 100)
+        start = max(offset - 1, 0)
+        with self._updates_changed:
+            self._updates_changed.wait_for(
+                lambda: len(self.updates) > start,
+                min(float(params.get("timeout", 0) or 0), 1))
+            return self.updates[start:start + limit]
+
+    def send_message(self, params: dict) -> dict:
+        if self.send_delay:
+            time.sleep(self.send_delay)
+        chat_id = int(params["chat_id"])
+        with self._sent_changed:
+            self.sent.append((time.perf_counter(), chat_id, params.get("text")))
+            self._sent_changed.notify_all()
+        if self.on_send is not None:
+            self.on_send(chat_id, params.get("text", ""))
+        return {
+            "message_id": len(self.sent), "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER, "text": params.get("text", ""),
+        }
+
+    def fault(self, method: str):
+        if method != "sendMessage":
+            return None
+        chance = random.random()
+        if chance < self.throttle_rate:
+            self.throttled += 1
+            return 429, {
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after "
+                               f"{self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }
+        if chance < self.throttle_rate + self.error_rate:
+            self.failed += 1
+            return 502, None
+        return None
+
+    def call(self, method: str, params: dict):
+        if method == "getUpdates":
+            return self.get_updates(params)
+        if method == "sendMessage":
+            return self.send_message(params)
+        if method == "getMe":
+            return BOT_USER
+        return True
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+            wbufsize = 1 << 16  # headers and body in one segment
+
+            def do_GET(self):
+                self._reply()
+
+            def do_POST(self):
+                self._reply()
+
+            def _reply(self):
+                url = urlsplit(self.path)
+                params = dict(parse_qsl(url.query))
+                size = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(size).decode() if size else ""
+                if body.startswith("{"):
+                    params.update(json.loads(body))
+                elif body:
+                    params.update(parse_qsl(body))
+                method = url.path.rsplit("/", 1)[-1]
+                if api.latency:
+                    time.sleep(api.latency)
+                code, answer = api.fault(method) or (
+                    200, {"ok": True, "result": api.call(method, params)})
+                if answer is None:
+                    payload = b"Bad Gateway"
+                    content_type = "text/plain"
+                else:
+                    payload = json.dumps(answer).encode()
+                    content_type = "application/json"
+                self.send_response(code)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--guesses", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    api = FakeBotApi(
+        make_updates(args.users, args.guesses), port=args.port,
+        latency=args.latency, throttle_rate=args.throttle_rate,
+        error_rate=args.error_rate).start()
+    print(f"Serving {len(api.updates)} updates, "
+          f"BOT_API_URL = '{api.url}'")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"{len(api.sent)} sent, {api.throttled} throttled, "
+                  f"{api.failed} failed")
+    except KeyboardInterrupt:
+        api.stop()
+
+
+if __name__ == "__main__":
+    main()
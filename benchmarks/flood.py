@@ -0,0 +1,251 @@
+"""
+Flood guard of src.flood: limits, protected guesses, memory and cost
+
+First checks FloodGuard with a simulated clock in the drop, delay and
+collapse modes, exits with 1 on a failure:
+    a spammer sending SPAM_RATE updates per second for DURATION seconds
+        gets at most FLOOD_RATE of them per window and no less than the
+        limit allows
+    a user sending one update per second is never limited
+    guesses of a game in progress sent between the spam are all let
+        through once and in order, in the delay mode with the spam
+    stop() lets every waiting update through
+    the counted users are capped by FLOOD_USERS and forgotten after two
+        idle windows
+
+Then prints the traced bytes per counted user, the cost of admit() for
+users under the limit and for a spammer above it, and a flood through the
+handlers of src.bot: one user sending FLOOD stickers while USERS users
+play, with the guard off and in the drop mode. The replies sent to the
+spammer and the handler time are printed for both.
+
+Usage:
+    python -m benchmarks.flood [--users N] [--flood N] [--output FILE]
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import telebot.apihelper
+
+from benchmarks import results
+from benchmarks.common import make_message, per_call
+from benchmarks.handlers import BATCH, GUESSES, FakeTransport, new_users
+from src.config import MAX_GUESS_NUMBER
+from src.flood import FloodGuard
+
+RATE = 20
+WINDOW = 10
+SPAM_RATE = 100
+DURATION = 120
+CALLS = 100_000
+MEMORY_USERS = 200_000
+
+
+class ChatTransport(FakeTransport):
+    def __init__(self) -> None:
+        super().__init__()
+        self.chats = dict()  # chat id -> sent messages
+
+    def __call__(self, method: str, url: str, params=None, **kwargs):
+        if url.endswith("/sendMessage"):
+            chat_id = int(params["chat_id"])
+            with self._lock:
+                self.chats[chat_id] = self.chats.get(chat_id, 0) + 1
+        return super().__call__(method, url, params, **kwargs)
+
+
+def simulate(mode: str, updates: list, max_waiting: int = 1000) -> tuple:
+    # updates: (time, key, update) sorted by time, guesses are tuples
+    released = []
+    guard = FloodGuard(
+        lambda update: released.append((now, update)),
+        lambda update: isinstance(update, tuple), RATE, WINDOW, mode,
+        max_waiting=max_waiting)
+    now = tick = 0.0
+    for when, key, update in updates:
+        while tick + 0.1 <= when:
+            now = tick = tick + 0.1
+            guard.release_due(now)
+        now = when
+        guard.admit(key, update, now)
+    in_time = len(released)
+    guard.stop()
+    return guard, released, in_time
+
+
+def check_spammer(mode: str) -> list:
+    failures = []
+    updates = [
+        (i / SPAM_RATE, 1, i) for i in range(DURATION * SPAM_RATE)]
+    guard, released, in_time = simulate(mode, updates)
+    windows = DURATION / WINDOW
+    if not RATE * (windows - 1) <= in_time <= RATE * (windows + 1):
+        failures.append(
+            f"{mode}: spammer got {in_time} updates in {DURATION} s")
+    accounted = (
+        len(released) + guard.dropped
+        + (guard.collapsed if mode == "collapse" else 0))
+    if accounted != len(updates):
+        failures.append(f"{mode}: {len(updates) - accounted} updates lost")
+    if mode == "delay" and [u for _, u in released] != sorted(
+            u for _, u in released):
+        failures.append(f"{mode}: updates reordered")
+    return failures
+
+
+def check_calm(mode: str) -> list:
+    updates = [(float(i), 1, i) for i in range(DURATION)]
+    guard, released, _ = simulate(mode, updates)
+    if guard.admitted != len(updates) or any(
+            when != update for when, update in released):
+        return [f"{mode}: a calm user was limited"]
+    return []
+
+
+def check_guesses(mode: str) -> list:
+    updates = []
+    for i in range(DURATION * SPAM_RATE):
+        update = (i,) if i % 10 == 0 else i  # a guess among the stickers
+        updates.append((i / SPAM_RATE, 1, update))
+    guess_count = len([u for _, _, u in updates if isinstance(u, tuple)])
+    guard, released, _ = simulate(mode, updates, max_waiting=10)
+    guesses = [u for _, u in released if isinstance(u, tuple)]
+    if guesses != sorted(set(guesses)) or len(guesses) != guess_count:
+        return [f"{mode}: {len(guesses)} of {guess_count} guesses released "
+                f"once and in order"]
+    return []
+
+
+def check_users() -> list:
+    failures = []
+    guard = FloodGuard(lambda update: None, None, RATE, WINDOW, "drop", 1000)
+    for key in range(5000):
+        guard.admit(key, None, 1.0)
+    if len(guard) != 1000 or guard.untracked != 4000:
+        failures.append(
+            f"{len(guard)} users counted, {guard.untracked} untracked "
+            f"of 5000 with the cap of 1000")
+    guard.admit(1, None, 1.0 + 2 * WINDOW)
+    if len(guard) != 1:
+        failures.append(f"{len(guard)} users counted after two windows")
+    return failures
+
+
+def bytes_per_user() -> float:
+    guard = FloodGuard(lambda update: None, None, RATE, WINDOW, "drop")
+    tracemalloc.start()
+    for key in new_users(MEMORY_USERS):
+        guard.admit(key, None, 1.0)
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return allocated / len(guard)
+
+
+def admit_ns(keys: list, mode: str) -> float:
+    guard = FloodGuard(lambda update: None, None, RATE, WINDOW, mode)
+    return per_call(guard.admit, [(key, None) for key in keys])
+
+
+def sticker(uid: int):
+    message = make_message(uid, "")
+    message.content_type, message.text = "sticker", None
+    return message
+
+
+def flood(users: int, stickers: int, mode: str) -> dict:
+    from src.bot import bot, executor, guard, sender
+    transport = telebot.apihelper.CUSTOM_REQUEST_SENDER
+    guard.mode = mode
+    spammer = new_users(1)[0]
+    uids = new_users(users)
+    messages = [make_message(uid, "/start") for uid in uids]
+    for _ in range(GUESSES):
+        messages += [
+            make_message(uid, str(random.randint(1, MAX_GUESS_NUMBER)))
+            for uid in uids]
+    spam = [sticker(spammer) for _ in range(stickers)]
+    mixed = []
+    step = max(len(messages) // max(len(spam), 1), 1)
+    for i in range(0, max(len(messages), len(spam) * step), step):
+        mixed += messages[i:i + step]
+        mixed += spam[i // step:i // step + 1]
+    start = time.perf_counter()
+    for i in range(0, len(mixed), BATCH):
+        bot.process_new_messages(mixed[i:i + BATCH])
+        if i // BATCH == 0:
+            executor.join()  # the games start before the guesses come
+    executor.join()
+    while sender.stats()["depth"]:
+        time.sleep(0.001)
+    return {
+        "seconds": time.perf_counter() - start,
+        "spammer_replies": transport.chats.get(spammer, 0),
+        "replies": sum(transport.chats.get(uid, 0) for uid in uids),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--flood", type=int, default=20_000)
+    parser.add_argument("--output", help="save the results as JSON")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    failures = check_users()
+    for mode in ("drop", "delay", "collapse"):
+        failures += check_spammer(mode)
+        failures += check_calm(mode)
+        failures += check_guesses(mode)
+    for failure in failures:
+        print(failure)
+    print(f"{len(failures)} failures")
+    if failures:
+        sys.exit(1)
+    measured = {
+        "user_state_bytes": bytes_per_user(),
+        "admit_calm_ns": admit_ns(list(new_users(CALLS)), "drop"),
+        "admit_spammer_ns": admit_ns([1] * CALLS, "drop"),
+        "admit_off_ns": admit_ns([1] * CALLS, "off"),
+    }
+    for name in ("admit_calm_ns", "admit_spammer_ns", "admit_off_ns"):
+        print(f"{name[:-3]:<24} {measured[name]:>8.1f} ns/update")
+    print(f"{measured['user_state_bytes']:.0f} bytes per counted user")
+    transport = ChatTransport()
+    telebot.apihelper.CUSTOM_REQUEST_SENDER = transport
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            from src.bot import close, sender
+            sender.set_limits(1e9, 1e9, 1e9)
+            sender.coalesce = False
+            print(f"{args.users=} {args.flood=} stickers")
+            print(f"{'guard':>6} {'time, s':>8} {'spammer replies':>16} "
+                  f"{'player replies':>15}")
+            for mode in ("off", "drop"):
+                values = flood(args.users, args.flood, mode)
+                measured.update(
+                    (f"{mode}_{name}", value)
+                    for name, value in values.items())
+                print(f"{mode:>6} {values['seconds']:>8.3f} "
+                      f"{values['spammer_replies']:>16} "
+                      f"{values['replies']:>15}")
+            close()
+        finally:
+            os.chdir(cwd)
+    if args.output:
+        results.save(args.output, "flood", measured)
+
+
+if __name__ == "__main__":
+    main()
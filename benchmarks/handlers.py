@@ -0,0 +1,184 @@
+"""
+Realistic update mixes through the handlers of src.bot without the network
+
+Synthetic messages are passed to bot.process_new_messages(), so the whole
+in-process path is measured: telebot dispatch, KeyedExecutor, the src.game
+handlers and Sender. FakeTransport is installed as
+telebot.apihelper.CUSTOM_REQUEST_SENDER and records the Bot API calls
+instead of doing HTTP, the send rate limits and the flood guard are
+lifted.
+
+Scenarios:
+    starts - every user starts a game
+    sessions - long games, every user sends GUESSES guesses
+    leaders - /leaders storm over the populated players database
+    newcomers - bursts of unknown users starting a game and asking /stats
+
+Usage:
+    python -m benchmarks.handlers [--users N] [--players N] [--output FILE]
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import argparse
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+
+import telebot.apihelper
+
+from benchmarks import results
+from benchmarks.common import make_message
+from benchmarks.fake_bot_api import BOT_USER
+
+GUESSES = 30
+BATCH = 100  # updates in one getUpdates answer
+_first_user = 10 ** 9
+
+
+class _Response:
+    status_code = 200
+
+    def __init__(self, result) -> None:
+        self._result = result
+
+    def json(self) -> dict:
+        return {"ok": True, "result": self._result}
+
+
+class FakeTransport:
+    def __init__(self) -> None:
+        self.calls = dict()  # method -> count
+        self._lock = threading.Lock()
+
+    def __call__(self, method: str, url: str, params=None, **kwargs):
+        name = url.rsplit("/", 1)[-1]
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+        if name == "sendMessage":
+            chat_id = int(params["chat_id"])
+            return _Response({
+                "message_id": 1, "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": BOT_USER, "text": params.get("text", ""),
+            })
+        if name == "getMe":
+            return _Response(BOT_USER)
+        return _Response(True)
+
+    def sent(self) -> int:
+        return self.calls.get("sendMessage", 0)
+
+
+def new_users(count: int) -> range:
+    global _first_user
+    _first_user += count
+    return range(_first_user - count, _first_user)
+
+
+def starts(users: int) -> list:
+    return [make_message(uid, "/start") for uid in new_users(users)]
+
+
+def sessions(users: int) -> list:
+    uids = new_users(users)
+    messages = [make_message(uid, "/start") for uid in uids]
+    for _ in range(GUESSES):
+        messages += [
+            make_message(uid, str(random.randint(1, 1000))) for uid in uids]
+    return messages
+
+
+def leaders(users: int, known: list) -> list:
+    return [make_message(random.choice(known), "/leaders") for _ in range(users)]
+
+
+def newcomers(users: int) -> list:
+    messages = []
+    for uid in new_users(users):
+        messages += [make_message(uid, "/stats"), make_message(uid, "/start")]
+    return messages
+
+
+def populate(game, count: int) -> list:
+    uids = list(new_users(count))
+    for uid in uids:
+        game.players.add_new(uid, f"Player {uid}")
+        player = game.players[uid]
+        if random.random() < 0.5:
+            hard_mode = random.random() < 0.2
+            player.increase_games_count(hard_mode)
+            game.players.set_best_steps(
+                uid, random.randint(5, 30), hard_mode)
+            game.players.set_best_time(
+                uid, random.randint(10, 600), hard_mode)
+    return uids
+
+
+def run(bot, executor, sender, transport, messages: list) -> dict:
+    sent = transport.sent()
+    start = time.perf_counter()
+    for i in range(0, len(messages), BATCH):
+        bot.process_new_messages(messages[i:i + BATCH])
+    executor.join()
+    while sender.stats()["depth"]:
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    return {
+        "updates": len(messages),
+        "replies": transport.sent() - sent,
+        "s": elapsed,
+        "updates_per_s": len(messages) / elapsed,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--players", type=int, default=100_000)
+    parser.add_argument("--output", help="save the results as JSON")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    transport = FakeTransport()
+    telebot.apihelper.CUSTOM_REQUEST_SENDER = transport
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            from src.bot import bot, executor, game, guard, sender
+            sender.set_limits(1e9, 1e9, 1e9)
+            sender.coalesce = False
+            guard.mode = "off"
+            known = populate(game, args.players)
+            mixes = {
+                "starts": starts(args.users),
+                "sessions": sessions(args.users),
+                "leaders": leaders(args.users, known),
+                "newcomers": newcomers(args.users),
+            }
+            measured = dict()
+            print(f"{args.users=} {args.players=}")
+            print(f"{'scenario':>10} {'updates':>8} {'replies':>8} "
+                  f"{'time, s':>8} {'updates/s':>10}")
+            for name, messages in mixes.items():
+                result = run(bot, executor, sender, transport, messages)
+                print(f"{name:>10} {result['updates']:>8} "
+                      f"{result['replies']:>8} {result['s']:>8.3f} "
+                      f"{result['updates_per_s']:>10.0f}")
+                measured[f"{name}_s"] = result["s"]
+                measured[f"{name}_updates_per_s"] = result["updates_per_s"]
+            executor.stop()
+            game.close()
+            sender.stop()
+        finally:
+            os.chdir(cwd)
+    if args.output:
+        results.save(args.output, "handlers", measured)
+
+
+if __name__ == "__main__":
+    main()
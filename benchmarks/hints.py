@@ -0,0 +1,116 @@
+"""
+Hint lookup table and batch hints against the former chain of checks
+
+Checks that src.utils.get_hit_index and get_hit_indexes return what the
+former chain of float comparisons did for every goal 1..MAX_GUESS_NUMBER
+and every guess within 6 * MAX_GUESS_NUMBER of zero, and for random far
+values, exits with 1 on a mismatch. Then prints the cost of one hint for
+the former function, the lookup table and the batch API.
+
+Usage:
+    python -m benchmarks.hints [--output FILE]
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import argparse
+import random
+import sys
+
+import numpy as np
+
+from benchmarks import results
+from benchmarks.common import per_call
+from src.config import MAX_GUESS_NUMBER
+from src.utils import get_hit_index, get_hit_indexes
+
+CALLS = 100_000
+
+
+def get_hit_index_chained(guess: int, goal: int) -> int:
+    distance = abs(guess - goal)
+    percent = distance / MAX_GUESS_NUMBER
+    if abs(guess) >= MAX_GUESS_NUMBER * 5:
+        index = 0
+    elif guess > MAX_GUESS_NUMBER or guess <= 0:
+        index = 1
+    elif percent >= 0.9:
+        index = 2
+    elif percent >= 0.6:
+        index = 3
+    elif percent >= 0.4:
+        index = 4
+    elif percent >= 0.3:
+        index = 5
+    elif percent >= 0.2:
+        index = 6
+    elif distance >= MAX_GUESS_NUMBER * 0.1:
+        index = 7
+    elif distance >= 50:
+        index = 8
+    elif distance >= 25:
+        index = 9
+    elif distance >= 12:
+        index = 10
+    elif distance >= 6:
+        index = 11
+    elif distance >= 2:
+        index = 12
+    else:
+        index = 13
+    return index
+
+
+def check() -> int:
+    mismatches = 0
+    limit = MAX_GUESS_NUMBER * 6
+    guesses = np.arange(-limit, limit + 1, dtype=np.int64)
+    for goal in range(1, MAX_GUESS_NUMBER + 1):
+        expected = [get_hit_index_chained(guess, goal)
+                    for guess in range(-limit, limit + 1)]
+        actual = [get_hit_index(guess, goal)
+                  for guess in range(-limit, limit + 1)]
+        batch = get_hit_indexes(guesses, np.full_like(guesses, goal))
+        if actual != expected or batch.tolist() != expected:
+            mismatches += 1
+            print(f"Mismatch for {goal=}")
+    far = [(random.randint(-2 ** 62, 2 ** 62), random.randint(-2 ** 62, 2 ** 62))
+           for _ in range(CALLS)]
+    far += [(random.randint(1, MAX_GUESS_NUMBER), random.randint(-limit, limit))
+            for _ in range(CALLS)]
+    expected = [get_hit_index_chained(guess, goal) for guess, goal in far]
+    actual = [get_hit_index(guess, goal) for guess, goal in far]
+    batch = get_hit_indexes([g for g, _ in far], [g for _, g in far]).tolist()
+    if actual != expected or batch != expected:
+        mismatches += 1
+        print("Mismatch for the far values")
+    return mismatches
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--output", help="save the results as JSON")
+    args = parser.parse_args()
+    mismatches = check()
+    print(f"{MAX_GUESS_NUMBER} goals checked, {mismatches} mismatches")
+    if mismatches:
+        sys.exit(1)
+    inputs = [(random.randint(1, MAX_GUESS_NUMBER),
+               random.randint(1, MAX_GUESS_NUMBER)) for _ in range(CALLS)]
+    guesses = np.array([guess for guess, _ in inputs], dtype=np.int64)
+    goals = np.array([goal for _, goal in inputs], dtype=np.int64)
+    measured = {
+        "get_hit_index_chained_ns": per_call(get_hit_index_chained, inputs),
+        "get_hit_index_ns": per_call(get_hit_index, inputs),
+        "get_hit_indexes_ns": per_call(
+            get_hit_indexes, [(guesses, goals)]) / CALLS,
+    }
+    for name, value in measured.items():
+        print(f"{name[:-3]:<24} {value:>8.1f} ns/hint")
+    if args.output:
+        results.save(args.output, "hints", measured)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Write overhead and read speed of the binary game history of src.history
+
+First writes EVENTS random events (far and huge guesses included) through
+HistoryLog with a small file size, so the log is rotated several times,
+appends a truncated record to the last file as a crash would and writes
+more. Checks that read() and load() of every file return all the events
+in order (guesses clamped to int32), exits with 1 on a mismatch.
+
+Then prints the cost of one HistoryLog.write(), of one f-string
+logging.info() to a file the former way, and of Game.make_move() with and
+without the history, the events per second of read() and the time of
+load() with an aggregate query (guesses per hint and per user) over the
+memmap of the file. load() needs numpy.
+
+Usage:
+    python -m benchmarks.history [--events N] [--output FILE]
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks import results
+from benchmarks.common import make_message, per_call
+from src.config import HISTORY_FILES
+
+CALLS = 100_000
+
+
+def random_events(count: int) -> list:
+    events = []
+    for _ in range(count):
+        guess = random.choice((
+            random.randint(1, 1000), random.randint(-10 ** 4, 10 ** 4),
+            random.randint(-10 ** 12, 10 ** 12)))
+        events.append((
+            random.randint(1, 10 ** 10), random.randint(0, 2 ** 32 - 1),
+            guess, random.randint(0, 13), random.random() < 0.2))
+    return events
+
+
+def clamped(event: tuple) -> tuple:
+    uid, date, guess, hint, hard_mode = event
+    guess = max(-(2 ** 31 - 1), min(2 ** 31 - 1, guess))
+    return uid, date, guess, hint, int(hard_mode)
+
+
+def check(history, events: int) -> int:
+    file_name = "check.bin"
+    expected = random_events(events)
+    # about HISTORY_FILES - 1 rotations, none of the events is dropped
+    file_size = events * 18 // max(HISTORY_FILES - 1, 1) + 1024
+    log = history.HistoryLog(file_name, file_size, 4096)
+    half = events // 2
+    for event in expected[:half]:
+        log.write(*event)
+    log.close()
+    with open(file_name, "ab") as bf:
+        bf.write(b"\x01\x02\x03")  # a crash during the write
+    log = history.HistoryLog(file_name, file_size, 4096)
+    for event in expected[half:]:
+        log.write(*event)
+    log.close()
+    expected = [clamped(event) for event in expected]
+    mismatches = 0
+    read = [tuple(event) for event in history.read(file_name)]
+    if read != expected:
+        mismatches += 1
+        print(f"read() returned {len(read)} events of {len(expected)}")
+    loaded = [
+        record for name in history.files(file_name)
+        for record in history.load(name).tolist()]
+    if loaded != expected:
+        mismatches += 1
+        print(f"load() returned {len(loaded)} events of {len(expected)}")
+    print(f"{events} events in {len(history.files(file_name))} files "
+          f"checked, {mismatches} mismatches")
+    return mismatches
+
+
+def logging_call(file_name: str):
+    logger = logging.getLogger("benchmarks.history")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(logging.FileHandler(file_name))
+
+    def log(uid, date, guess, hint, hard_mode) -> None:
+        logger.info(f"Guess {uid=} {date=} {guess=} {hint=} {hard_mode=}")
+
+    return log
+
+
+def make_move_ns(game, history) -> float:
+    game.history = history
+    uids = range(1, 1001)
+    for uid in uids:
+        game.sessions.start(uid, 1, 0, False)
+    messages = [
+        (make_message(uid, str(random.randint(2, 1000))),)
+        for uid in random.choices(uids, k=CALLS)]
+    return per_call(game.make_move, messages)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--output", help="save the results as JSON")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    measured = dict()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            from src import history
+            from src.game import Game
+            if check(history, min(args.events, 200_000)):
+                sys.exit(1)
+            events = random_events(CALLS)
+            log = history.HistoryLog("write.bin", 2 ** 40)
+            measured["write_ns"] = per_call(log.write, events)
+            log.close()
+            logging.disable(logging.NOTSET)
+            measured["logging_ns"] = per_call(
+                logging_call("write.log"), events)
+            logging.disable(logging.WARNING)
+            game = Game()
+            log = history.HistoryLog("game.bin", 2 ** 40)
+            measured["make_move_ns"] = make_move_ns(game, None)
+            measured["make_move_history_ns"] = make_move_ns(game, log)
+            game.close()
+            log = history.HistoryLog("read.bin", 2 ** 40)
+            events = random_events(10_000)
+            for i in range(args.events):
+                log.write(*events[i % len(events)])
+            log.close()
+            start = time.perf_counter()
+            count = sum(1 for _ in history.read("read.bin"))
+            measured["read_events_per_s"] = (
+                count / (time.perf_counter() - start))
+            start = time.perf_counter()
+            records = history.load("read.bin")
+            hints = np.bincount(records["hint"], minlength=256)
+            users, guesses = np.unique(records["user_id"], return_counts=True)
+            measured["load_query_s"] = time.perf_counter() - start
+            del records
+        finally:
+            os.chdir(cwd)
+    for name in ("write_ns", "logging_ns", "make_move_ns",
+                 "make_move_history_ns"):
+        print(f"{name[:-3]:<24} {measured[name]:>8.1f} ns/call")
+    print(f"history overhead of make_move "
+          f"{measured['make_move_history_ns'] - measured['make_move_ns']:.1f}"
+          f" ns/guess")
+    print(f"read() {measured['read_events_per_s']:.0f} events/s, "
+          f"load() and query of {count} events "
+          f"{measured['load_query_s'] * 1000:.1f} ms "
+          f"({len(users)} users, {guesses.max()} guesses at most, "
+          f"{int(hints[:14].sum())} hints)")
+    if args.output:
+        results.save(args.output, "history", measured)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+End-to-end load test of the whole bot process against a local fake Bot API
+
+The bot runs as `coldhot.py` in a child process with settings.BOT_API_URL
+pointed at benchmarks.fake_bot_api.FakeBotApi, so the real polling loop and
+the requests based HTTP stack are measured. USERS simulated users play in
+a closed loop: every user sends /start, waits for the game to start and
+then sends a random guess after every hint, a finished game is started
+again. A message which got no reply in TIMEOUT seconds (lost by an
+injected 5xx) is counted as lost and the user goes on.
+
+Printed are the answered updates per second and the percentiles of the
+reply latency, from publishing an update to receiving its reply.
+The send rate limits and the flood guard of settings are lifted unless
+--rate-limits is given.
+
+Usage:
+    python -m benchmarks.load [--users N] [--duration S] [--engine E]
+        [--latency S] [--throttle-rate R] [--error-rate R]
+        [--rate-limits] [--output FILE]
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import argparse
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks import results
+from benchmarks.fake_bot_api import FakeBotApi
+from src.config import MAX_GUESS_NUMBER
+from src.thesaurus.messages import HELLO, HINTS, START_GAME
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TIMEOUT = 5
+_START_TEXT = START_GAME.format(MAX_GUESS_NUMBER)
+_HELLO_TEXT = HELLO.split("{0}")[0]
+_HINTS = frozenset(HINTS)
+
+
+class _User:
+    __slots__ = ("uid", "text", "published", "in_game")
+
+    def __init__(self, uid: int) -> None:
+        self.uid = uid
+        self.text = None
+        self.published = 0.0
+        self.in_game = False
+
+
+class Users:
+    def __init__(self, api: FakeBotApi, users: int) -> None:
+        self._api = api
+        self._users = {
+            uid: _User(uid) for uid in range(10 ** 9, 10 ** 9 + users)}
+        self._lock = threading.Lock()
+        self._running = False
+        self._message_id = 0
+        self.latencies = []
+        self.lost = 0
+
+    def start(self) -> None:
+        self._running = True
+        with self._lock:
+            for user in self._users.values():
+                self._next(user, time.perf_counter())
+        threading.Thread(target=self._watch, daemon=True).start()
+
+    def stop(self) -> None:
+        self._running = False
+
+    def on_send(self, chat_id: int, text: str) -> None:
+        now = time.perf_counter()
+        with self._lock:
+            user = self._users.get(chat_id)
+            if user is None or user.text is None:
+                return
+            if user.text == "/start":
+                if text.startswith(_HELLO_TEXT) \
+                        and not text.endswith(_START_TEXT):
+                    return  # the greeting of a new player, the game is next
+                user.in_game = True  # started now or before a lost reply
+            else:
+                user.in_game = text in _HINTS
+            self.latencies.append(now - user.published)
+            self._next(user, now)
+
+    def _next(self, user: _User, now: float) -> None:
+        user.text = None
+        if not self._running:
+            return
+        user.text = (
+            str(random.randint(1, MAX_GUESS_NUMBER)) if user.in_game
+            else "/start")
+        user.published = now
+        self._message_id += 1
+        message = {
+            "message_id": self._message_id,
+            "from": {"id": user.uid, "is_bot": False,
+                     "first_name": f"U{user.uid}"},
+            "chat": {"id": user.uid, "type": "private"},
+            "date": int(time.time()),
+            "text": user.text,
+        }
+        if user.text == "/start":
+            message["entities"] = [
+                {"type": "bot_command", "offset": 0, "length": 6}]
+        self._api.publish({"message": message})
+
+    def _watch(self) -> None:
+        while self._running:
+            time.sleep(1)
+            now = time.perf_counter()
+            with self._lock:
+                for user in self._users.values():
+                    if user.text is not None \
+                            and now - user.published > TIMEOUT:
+                        self.lost += 1
+                        self._next(user, now)
+
+
+def run_bot(api_url: str, engine: str, rate_limits: bool) -> None:
+    import settings
+    settings.BOT_API_URL = api_url
+    settings.METRICS_PORT = 0
+    if not rate_limits:
+        settings.SEND_RATE = settings.SEND_CHAT_RATE = 1e9
+        settings.SEND_CHAT_BURST = 1e9
+        settings.FLOOD_MODE = "off"
+    sys.argv = ["coldhot.py", "--engine", engine, "--shards", "1"]
+    import coldhot
+    coldhot.main()
+
+
+def percentile(values: list, share: float) -> float:
+    return values[min(int(len(values) * share), len(values) - 1)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--engine", choices=("sync", "async"), default="sync")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limits", action="store_true")
+    parser.add_argument("--output", help="save the results as JSON")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_bot(args.child, args.engine, args.rate_limits)
+        return
+    logging.disable(logging.WARNING)
+    api = FakeBotApi(
+        latency=args.latency, throttle_rate=args.throttle_rate,
+        error_rate=args.error_rate).start()
+    users = Users(api, args.users)
+    api.on_send = users.on_send
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    command = [
+        sys.executable, "-m", "benchmarks.load", "--child", api.url,
+        "--engine", args.engine]
+    if args.rate_limits:
+        command.append("--rate-limits")
+    with tempfile.TemporaryDirectory() as directory:
+        child = subprocess.Popen(
+            command, cwd=directory, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            deadline = time.monotonic() + 60
+            while api.first_poll is None and time.monotonic() < deadline:
+                time.sleep(0.1)  # the bot is started
+            users.start()
+            time.sleep(args.duration)
+            users.stop()
+            with users._lock:
+                latencies = sorted(users.latencies)
+        finally:
+            child.terminate()
+            child.wait()
+            api.stop()
+    if not latencies:
+        raise RuntimeError("No reply was received")
+    measured = {
+        "updates_per_s": len(latencies) / args.duration,
+        "latency_p50_s": percentile(latencies, 0.5),
+        "latency_p90_s": percentile(latencies, 0.9),
+        "latency_p99_s": percentile(latencies, 0.99),
+        "latency_max_s": latencies[-1],
+    }
+    print(f"{args.users=} {args.duration=} {args.engine=}")
+    print(f"answered {len(latencies)}, lost {users.lost}, "
+          f"throttled {api.throttled}, failed {api.failed}")
+    print(f"{measured['updates_per_s']:.0f} updates/s, latency ms: "
+          f"p50 {measured['latency_p50_s'] * 1e3:.1f} "
+          f"p90 {measured['latency_p90_s'] * 1e3:.1f} "
+          f"p99 {measured['latency_p99_s'] * 1e3:.1f} "
+          f"max {measured['latency_max_s'] * 1e3:.1f}")
+    if args.output:
+        results.save(args.output, "load", measured)
+
+
+if __name__ == "__main__":
+    main()
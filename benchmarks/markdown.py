@@ -0,0 +1,103 @@
+"""
+Single-pass escape_markdown against the former chain of str.replace
+
+First checks that src.utils.escape_markdown returns exactly what the chain
+of 18 str.replace calls did for the special characters themselves and for
+random names over the whole Unicode range (surrogates included), exits
+with 1 on a mismatch. Then prints the cost of one call for both versions
+and of reading the cached Player.escaped_name.
+
+Usage:
+    python -m benchmarks.markdown [--names N] [--output FILE]
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import argparse
+import random
+import sys
+
+from benchmarks import results
+from benchmarks.common import per_call
+from src.players import Player
+from src.utils import escape_markdown
+
+SPECIAL = "_*[]()~`>#+-=|{}.!"
+NAMES = (
+    "Maksym", "Олена Петренко", "john_doe", "[Admin] (bot)", "a.b-c+d=e!",
+    "Ψ~`>#|{}", "Юрій 🎮", "x" * 64,
+)
+
+
+def escape_markdown_chained(text: str) -> str:
+    return (text
+            .replace("_", "\\_")
+            .replace("*", "\\*")
+            .replace("[", "\\[")
+            .replace("]", "\\]")
+            .replace("(", "\\(")
+            .replace(")", "\\)")
+            .replace("~", "\\~")
+            .replace("`", "\\`")
+            .replace(">", "\\>")
+            .replace("#", "\\#")
+            .replace("+", "\\+")
+            .replace("-", "\\-")
+            .replace("=", "\\=")
+            .replace("|", "\\|")
+            .replace("{", "\\{")
+            .replace("}", "\\}")
+            .replace(".", "\\.")
+            .replace("!", "\\!")
+            )
+
+
+def random_name() -> str:
+    alphabet = random.choice((SPECIAL + "\\ ab", None))
+    length = random.randint(0, 40)
+    if alphabet:
+        return "".join(random.choice(alphabet) for _ in range(length))
+    return "".join(chr(random.randrange(0x110000)) for _ in range(length))
+
+
+def check(names: int) -> int:
+    samples = [SPECIAL, SPECIAL * 3, "\\" + SPECIAL, "", *NAMES]
+    samples += [random_name() for _ in range(names)]
+    mismatches = 0
+    for name in samples:
+        if escape_markdown(name) != escape_markdown_chained(name):
+            mismatches += 1
+            print(f"Mismatch for {name!r}")
+        elif Player(name).escaped_name != escape_markdown_chained(name):
+            mismatches += 1
+            print(f"Player.escaped_name mismatch for {name!r}")
+    return mismatches
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--names", type=int, default=100_000)
+    parser.add_argument("--output", help="save the results as JSON")
+    args = parser.parse_args()
+    mismatches = check(args.names)
+    print(f"{args.names} random names checked, {mismatches} mismatches")
+    if mismatches:
+        sys.exit(1)
+    inputs = [(random.choice(NAMES),) for _ in range(100_000)]
+    players = [Player(name) for name in NAMES]
+    cached = [(random.choice(players),) for _ in range(100_000)]
+    measured = {
+        "escape_markdown_chained_ns": per_call(escape_markdown_chained, inputs),
+        "escape_markdown_ns": per_call(escape_markdown, inputs),
+        "escaped_name_ns": per_call(
+            lambda player: player.escaped_name, cached),
+    }
+    for name, value in measured.items():
+        print(f"{name[:-3]:<24} {value:>8.1f} ns/call")
+    if args.output:
+        results.save(args.output, "markdown", measured)
+
+
+if __name__ == "__main__":
+    main()
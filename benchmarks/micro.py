@@ -0,0 +1,78 @@
+"""
+Microbenchmarks of the game helpers and the leaderboard reads
+
+Prints the cost of one call in nanoseconds (the best of common.REPEAT
+runs over precomputed inputs) of the src.utils helpers and of every
+get_top3_* method of Players at every database size.
+
+Usage:
+    python -m benchmarks.micro [--sizes N [N ...]] [--output FILE]
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import argparse
+import logging
+import random
+
+from benchmarks import results
+from benchmarks.common import make_players, per_call
+from src.config import MAX_GUESS_NUMBER
+from src.utils import (
+    GAMES, STEPS, escape_markdown, get_hit_index, get_plural_word,
+    seconds_to_ua,
+)
+
+SIZES = (10_000, 100_000, 1_000_000)
+CALLS = 100_000
+NAMES = (
+    "Maksym", "Олена", "john_doe", "[Admin] (bot)", "a.b-c+d=e!",
+    "Ψ~`>#|{}", "Юрій 🎮", "x" * 64,
+)
+TOP3 = (
+    "get_top3_steps", "get_top3_time", "get_top3_hard_steps",
+    "get_top3_hard_time",
+)
+
+
+def helpers() -> dict:
+    limit = MAX_GUESS_NUMBER * 6
+    return {
+        "get_hit_index": (get_hit_index, [
+            (random.randint(-limit, limit), random.randint(1, MAX_GUESS_NUMBER))
+            for _ in range(CALLS)]),
+        "escape_markdown": (escape_markdown, [
+            (random.choice(NAMES),) for _ in range(CALLS)]),
+        "seconds_to_ua": (seconds_to_ua, [
+            (random.randint(0, 10_000),) for _ in range(CALLS)]),
+        "get_plural_word": (get_plural_word, [
+            (random.randint(0, 1000), random.choice((STEPS, GAMES)))
+            for _ in range(CALLS)]),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--output", help="save the results as JSON")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    measured = dict()
+    print(f"{'function':<32} {'ns/call':>10}")
+    for name, (function, inputs) in helpers().items():
+        measured[f"{name}_ns"] = per_call(function, inputs)
+        print(f"{name:<32} {measured[f'{name}_ns']:>10.1f}")
+    for size in args.sizes:
+        players = make_players(size)
+        for method in TOP3:
+            name = f"{method}[{size}]"
+            measured[f"{name}_ns"] = per_call(
+                getattr(players, method), [()] * (CALLS // 10))
+            print(f"{name:<32} {measured[f'{name}_ns']:>10.1f}")
+    if args.output:
+        results.save(args.output, "micro", measured)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Handler-side cost of saving a player: in the handler or in the background
+
+Players win games at a steady pace and every win marks the player as
+changed through src.persistence.Persister, once with SAVE_INTERVAL = 0
+(the save is made in the handler) and once with the background group
+commit. Prints the mark() latency percentiles and the flush statistics
+for both storage backends.
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import logging
+import os
+import random
+import tempfile
+import time
+
+from src.persistence import Persister
+from src.players import Players
+from src.sqlite_players import SqlitePlayers
+
+PLAYERS = 10_000
+WINS = 20_000
+PAUSE = 0.00005  # seconds between the wins
+
+
+def measure(players, interval: float) -> tuple:
+    persister = Persister(players, interval=interval, batch=1000)
+    persister.start()
+    latencies = []
+    for _ in range(WINS):
+        pid = random.randrange(PLAYERS)
+        players[pid].increase_games_count(False)
+        start = time.perf_counter()
+        persister.mark(pid)
+        latencies.append(time.perf_counter() - start)
+        time.sleep(PAUSE)
+    persister.stop()
+    latencies.sort()
+    return (
+        latencies[len(latencies) // 2], latencies[len(latencies) * 99 // 100],
+        persister.stats())
+
+
+def main() -> None:
+    logging.disable(logging.INFO)
+    cwd = os.getcwd()
+    print(f"{'backend':>8} {'interval':>8} {'p50, us':>8} {'p99, us':>8} "
+          f"{'flushes':>8} {'records':>8} {'flush, ms':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            for backend in (Players, SqlitePlayers):
+                players = backend()
+                players.load()
+                for pid in range(PLAYERS):
+                    if not players.is_exist(pid):  # migrated by SQLite
+                        players.add_new(pid, f"Player {pid}")
+                players.save_many({pid: players[pid] for pid in range(PLAYERS)})
+                for interval in (0, 0.5):
+                    p50, p99, stats = measure(players, interval)
+                    flushes = stats["flushes"] or 1
+                    print(
+                        f"{backend.__name__[:8]:>8} {interval:>8} "
+                        f"{p50 * 1e6:>8.1f} {p99 * 1e6:>8.1f} "
+                        f"{stats['flushes']:>8} "
+                        f"{stats['records'] / flushes:>8.0f} "
+                        f"{stats['latency'] / flushes * 1e3:>10.2f}")
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Resident memory per player of the loaded players database
+
+For every size the players are saved as the pickle snapshot of Players in
+a temporary directory, then the memory allocated by Players.load() of a
+new Players (the records, the storage dictionary and the leaderboard) is
+measured with tracemalloc.
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import logging
+import os
+import tempfile
+import tracemalloc
+
+from benchmarks.common import make_players
+from src.players import Players
+
+SIZES = (10_000, 100_000, 1_000_000)
+
+
+def measure() -> int:
+    players = Players()
+    tracemalloc.start()
+    try:
+        players.load()
+        allocated, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return allocated
+
+
+def main() -> None:
+    logging.disable(logging.WARNING)
+    cwd = os.getcwd()
+    print(f"{'players':>10} {'bytes per player':>17}")
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            for size in SIZES:
+                make_players(size, 10 ** 9).save()
+                print(f"{size:>10} {measure() / size:>17.0f}")
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
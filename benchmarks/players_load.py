@@ -0,0 +1,60 @@
+"""
+Cold start of the players database: full pickle load vs indexed lazy load
+
+For every size the database is written both as the pickle snapshot of
+Players and as the indexed file of IndexedPlayers. Printed are the time
+until load() returns (the bot can start polling), the time until the
+leaderboard of the indexed backend is built in the background and the
+time of the first lookup of a player.
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks.common import make_players
+from src.indexed_players import IndexedPlayers
+from src.players import Players
+
+SIZES = (10_000, 100_000, 1_000_000)
+
+
+def measure(backend) -> tuple:
+    players = backend()
+    start = time.perf_counter()
+    players.load()
+    loaded = time.perf_counter() - start
+    players.get_top("best_steps")
+    ready = time.perf_counter() - start
+    start = time.perf_counter()
+    players[10 ** 9 + 7].was_games_played()
+    lookup = time.perf_counter() - start
+    return loaded, ready, lookup
+
+
+def main() -> None:
+    logging.disable(logging.WARNING)
+    cwd = os.getcwd()
+    print(f"{'players':>10} {'backend':>8} {'load, s':>8} "
+          f"{'ready, s':>9} {'lookup, us':>11}")
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            for size in SIZES:
+                make_players(size, 10 ** 9).save()
+                IndexedPlayers().migrate_from_pickle()
+                for backend in (Players, IndexedPlayers):
+                    loaded, ready, lookup = measure(backend)
+                    print(f"{size:>10} {backend.__name__[:8]:>8} "
+                          f"{loaded:>8.3f} {ready:>9.3f} {lookup * 1e6:>11.1f}")
+                os.remove(IndexedPlayers._file_name)
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Per-save cost of Players.save(id) for the growing number of players
+
+The journaled save appends one small record, so its cost has to stay flat
+while the full snapshot (Players.save() without id) grows with the database.
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import os
+import tempfile
+import time
+
+from benchmarks.common import make_players
+
+SIZES = (1_000, 10_000, 100_000, 300_000)
+SAVES = 1_000
+
+
+def main() -> None:
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            print(f"{'players':>10} {'journal, us':>12} {'snapshot, ms':>13}")
+            for size in SIZES:
+                players = make_players(size, results=False)
+                start = time.perf_counter()
+                players.save()
+                snapshot = time.perf_counter() - start
+                start = time.perf_counter()
+                for i in range(SAVES):
+                    players.save(i % size)
+                journal = (time.perf_counter() - start) / SAVES
+                print(f"{size:>10} {journal * 1e6:>12.1f} {snapshot * 1e3:>13.1f}")
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Machine-readable benchmark results and their comparison
+
+save() writes the flat {metric: number} results of a benchmark as JSON
+together with the Python version and the git commit of the tree, so the
+files of two versions can be compared by:
+    python -m benchmarks.results old.json new.json
+
+Metric names end with their unit: "_ns" and "_s" are better when smaller,
+"_per_s" when bigger. The printed change is positive when the new version
+is slower, "+" marks a regression and "-" an improvement of over 5%.
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def save(file_name: str, benchmark: str, results: dict) -> None:
+    document = {
+        "benchmark": benchmark,
+        "commit": commit(),
+        "python": platform.python_version(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    with open(file_name, "w") as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def load(file_name: str) -> dict:
+    with open(file_name) as f:
+        return json.load(f)
+
+
+def compare(old: dict, new: dict) -> list:
+    lines = []
+    for name in sorted(old["results"].keys() | new["results"].keys()):
+        before = old["results"].get(name)
+        after = new["results"].get(name)
+        if before is None or after is None:
+            lines.append(f"{name:<40} {before!s:>12} {after!s:>12}")
+            continue
+        change = (after - before) / before * 100 if before else 0.0
+        if name.endswith("_per_s"):
+            change = -change
+        mark = "+" if change > 5 else "-" if change < -5 else " "
+        lines.append(
+            f"{name:<40} {before:>12.4g} {after:>12.4g} {change:>+7.1f}% {mark}")
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("old")
+    parser.add_argument("new")
+    args = parser.parse_args()
+    old, new = load(args.old), load(args.new)
+    print(f"{'':<40} {old['commit'] or 'old':>12} "
+          f"{new['commit'] or 'new':>12} {'change':>8}")
+    for line in compare(old, new):
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
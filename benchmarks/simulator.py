@@ -0,0 +1,217 @@
+"""
+Offline game simulator to tune MAX_GUESS_NUMBER and the hint bands
+
+Plays many games at once with NumPy. Every game keeps the numbers it may
+still guess as a bitmask of uint64 words, a hint keeps only the numbers
+which would give the same hint:
+    candidates &= MASKS[guess, hint]
+MASKS are built once per configuration by src.utils.get_hit_indexes, so
+the bands are exactly those of the bot (or the --bands given instead).
+
+Strategies:
+    random - a random number not tried yet, the hints are ignored
+    greedy - a random number still possible after all the hints
+    optimal - band elimination: the number leaving the fewest possible
+        numbers expected after its hint (the smallest sum of the squared
+        band sizes), possible numbers win ties; it is evaluated once per
+        distinct state, the games in the same state share the guess
+
+Games are split into chunks of CHUNK played by a process pool. Printed
+are the step count statistics per configuration, --output saves the
+step count distributions as JSON.
+
+Usage:
+    python -m benchmarks.simulator [--max N [N ...]] [--bands D,D,...]
+        [--strategies S [S ...]] [--games N] [--processes N] [--output FILE]
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.config import MAX_GUESS_NUMBER
+from src.utils import get_hit_indexes, hit_bands
+
+STRATEGIES = ("random", "greedy", "optimal")
+CHUNK = 20_000
+_HINTS = 14  # hint indexes 0..13, the guesses in range get 2..13
+_BYTE_BITS = np.array([bin(byte).count("1") for byte in range(256)], np.uint8)
+_masks = {}  # (max_number, bands) -> MASKS built in this process
+
+
+def popcount(words: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words)
+    return _BYTE_BITS[words.view(np.uint8)].reshape(
+        words.shape + (8,)).sum(axis=-1)
+
+
+def pack(bits: np.ndarray) -> np.ndarray:
+    # bool (..., max_number) -> uint64 (..., words), number n is bit n - 1
+    size = (bits.shape[-1] + 63) // 64 * 64
+    padded = np.zeros(bits.shape[:-1] + (size,), dtype=bool)
+    padded[..., :bits.shape[-1]] = bits
+    return np.packbits(padded, axis=-1, bitorder="little").view("<u8")
+
+
+def unpack(words: np.ndarray, max_number: int) -> np.ndarray:
+    bits = np.unpackbits(
+        words.view(np.uint8), axis=-1, bitorder="little").astype(bool)
+    return bits[..., :max_number]
+
+
+def hint_masks(max_number: int, bands: tuple) -> np.ndarray:
+    # (guess - 1, hint) -> the numbers giving the hint, the guess excluded
+    key = (max_number, bands)
+    if key not in _masks:
+        numbers = np.arange(1, max_number + 1)
+        hints = get_hit_indexes(
+            numbers[:, None], numbers[None, :], max_number, list(bands))
+        other = numbers[:, None] != numbers[None, :]
+        _masks[key] = np.stack(
+            [pack((hints == hint) & other) for hint in range(_HINTS)], axis=1)
+    return _masks[key]
+
+
+def random_numbers(states: np.ndarray, rng) -> np.ndarray:
+    # a uniformly random set bit of every row as a number
+    rows = np.arange(len(states))
+    counts = popcount(states).astype(np.int64)
+    cumulative = np.cumsum(counts, axis=1)
+    picks = (rng.random(len(states)) * cumulative[:, -1]).astype(np.int64)
+    word = (cumulative <= picks[:, None]).sum(axis=1)
+    rank = picks - cumulative[rows, word] + counts[rows, word]
+    bits = unpack(states[rows, word][:, None], 64)
+    position = (np.cumsum(bits, axis=1) <= rank[:, None]).sum(axis=1)
+    return word * 64 + position + 1
+
+
+def optimal_numbers(states: np.ndarray, masks: np.ndarray,
+                    max_number: int) -> np.ndarray:
+    distinct, inverse = np.unique(states, axis=0, return_inverse=True)
+    guesses = np.empty(len(distinct), dtype=np.int64)
+    for i, state in enumerate(distinct):
+        sizes = popcount(masks & state).sum(axis=-1, dtype=np.int64)
+        scores = (sizes ** 2).sum(axis=1) * 2 - unpack(state, max_number)
+        guesses[i] = np.argmin(scores) + 1
+    return guesses[inverse.reshape(-1)]
+
+
+def play(task: tuple) -> np.ndarray:
+    max_number, bands, strategy, games, seed = task
+    rng = np.random.default_rng(seed)
+    masks = hint_masks(max_number, bands)
+    goals = rng.integers(1, max_number + 1, games)
+    states = np.tile(pack(np.ones(max_number, dtype=bool)), (games, 1))
+    steps = np.zeros(games, dtype=np.int64)
+    active = np.arange(games)
+    step = 0
+    while len(active):
+        step += 1
+        current = states[active]
+        if strategy == "optimal":
+            guesses = optimal_numbers(current, masks, max_number)
+        else:
+            guesses = random_numbers(current, rng)
+        hints = get_hit_indexes(guesses, goals[active], max_number, list(bands))
+        won = guesses == goals[active]
+        steps[active[won]] = step
+        active, guesses, hints = active[~won], guesses[~won], hints[~won]
+        if strategy == "random":
+            word, bit = np.divmod(guesses - 1, 64)
+            states[active, word] &= ~(np.uint64(1) << bit.astype(np.uint64))
+        else:
+            states[active] &= masks[guesses - 1, hints]
+    return np.bincount(steps)
+
+
+def simulate(max_number: int, bands: tuple, strategy: str, games: int,
+             pool: ProcessPoolExecutor) -> np.ndarray:
+    tasks = [
+        (max_number, bands, strategy, min(CHUNK, games - first), seed)
+        for seed, first in enumerate(range(0, games, CHUNK))
+    ]
+    distribution = np.zeros(1, dtype=np.int64)
+    for counts in pool.map(play, tasks):
+        if len(counts) > len(distribution):
+            distribution = np.pad(
+                distribution, (0, len(counts) - len(distribution)))
+        distribution[:len(counts)] += counts
+    return distribution
+
+
+def statistics(distribution: np.ndarray) -> dict:
+    steps = np.arange(len(distribution))
+    cumulative = np.cumsum(distribution)
+    games = cumulative[-1]
+
+    def percentile(share: float) -> int:
+        return int(np.searchsorted(cumulative, share * games))
+
+    return {
+        "games": int(games),
+        "mean": float((steps * distribution).sum() / games),
+        "p50": percentile(0.5),
+        "p90": percentile(0.9),
+        "p99": percentile(0.99),
+        "max": int(np.flatnonzero(distribution)[-1]),
+    }
+
+
+def parse_bands(text: str) -> tuple:
+    bands = tuple(int(distance) for distance in text.split(","))
+    if len(bands) != 11 or list(bands) != sorted(bands) or bands[0] < 1:
+        raise argparse.ArgumentTypeError(
+            "11 ascending distances of the hints 12..2 are expected")
+    return bands
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument(
+        "--max", type=int, nargs="+", default=[MAX_GUESS_NUMBER],
+        help="MAX_GUESS_NUMBER values (default: %(default)s)")
+    parser.add_argument(
+        "--bands", type=parse_bands,
+        help="smallest distances of the hints 12..2 instead of the bot ones")
+    parser.add_argument(
+        "--strategies", nargs="+", choices=STRATEGIES, default=STRATEGIES)
+    parser.add_argument("--games", type=int, default=1_000_000)
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--output", help="save the distributions as JSON")
+    args = parser.parse_args()
+    configurations = []
+    print(f"{'max':>6} {'strategy':>8} {'games':>9} {'mean':>7} "
+          f"{'p50':>4} {'p90':>4} {'p99':>4} {'max':>5}  bands")
+    with ProcessPoolExecutor(args.processes) as pool:
+        for max_number in args.max:
+            bands = args.bands or tuple(hit_bands(max_number))
+            for strategy in args.strategies:
+                distribution = simulate(
+                    max_number, bands, strategy, args.games, pool)
+                result = statistics(distribution)
+                print(f"{max_number:>6} {strategy:>8} {result['games']:>9} "
+                      f"{result['mean']:>7.2f} {result['p50']:>4} "
+                      f"{result['p90']:>4} {result['p99']:>4} "
+                      f"{result['max']:>5}  {','.join(map(str, bands))}")
+                configurations.append(dict(
+                    result, max_number=max_number, bands=list(bands),
+                    strategy=strategy,
+                    distribution={
+                        int(steps): int(count)
+                        for steps, count in enumerate(distribution) if count
+                    }))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(configurations, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
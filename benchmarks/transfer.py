@@ -0,0 +1,150 @@
+"""
+Streaming export and import of the players against str(players)
+
+For every SIZES number of players a --backend storage is populated in a
+temporary directory and loaded back. The players are exported to JSON
+Lines and CSV by src.transfer and both files are imported into the empty
+namespaces of the same backend. Checks that the imported players export
+to the same JSON Lines file, exits with 1 on a mismatch.
+
+Printed are the players per second of every export and import and the
+peak memory traced during the JSON Lines export and import and during
+str(players), the former way to dump the database. The export peak stays
+flat as the database grows, the import one grows only by the ranks of the
+added players kept by the leaderboard (and by the players themselves with
+the pickle backend, which keeps all of them in memory).
+
+Usage:
+    python -m benchmarks.transfer [--players N [N ...]] [--backend B]
+        [--output FILE]
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import argparse
+import filecmp
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks import results
+
+SIZES = (20_000, 200_000)
+
+
+def populate(players, count: int) -> None:
+    from src.players import Player
+    for start in range(0, count, 1000):
+        batch = dict()
+        for pid in range(start, min(start + 1000, count)):
+            player = Player(f"Player \"{pid}\", {random.random():.3f}")
+            if random.random() < 0.5:
+                hard_mode = random.random() < 0.2
+                player.increase_games_count(hard_mode)
+                player.set_best_steps(random.randint(5, 30), hard_mode)
+                player.set_best_time(random.randint(10, 600), hard_mode)
+            batch[10 ** 9 + pid] = player
+        players.add_many(batch)
+    players.save()
+
+
+def loaded(namespace: str = ""):
+    from src.players import create_players
+    players = create_players(namespace)
+    players.load()
+    return players
+
+
+def timed(function, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def peak(function, *args) -> int:
+    tracemalloc.start()
+    function(*args)
+    traced = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return traced
+
+
+def measure(size: int) -> tuple:
+    from src.transfer import export_players, import_players
+    populate(loaded(), size)
+    players = loaded()
+    measured = {
+        "export_jsonl_players_per_s": size / timed(
+            export_players, players, "players.jsonl"),
+        "export_csv_players_per_s": size / timed(
+            export_players, players, "players.csv"),
+        "import_jsonl_players_per_s": size / timed(
+            import_players, loaded("jsonl"), "players.jsonl"),
+        "import_csv_players_per_s": size / timed(
+            import_players, loaded("csv"), "players.csv"),
+    }
+    mismatches = 0
+    for namespace in ("jsonl", "csv"):
+        export_players(loaded(namespace), f"{namespace}.jsonl")
+        if not filecmp.cmp("players.jsonl", f"{namespace}.jsonl", False):
+            mismatches += 1
+            print(f"{size} players imported from {namespace} differ")
+    measured["export_peak_bytes"] = peak(
+        export_players, players, "peak.jsonl")
+    imported = loaded("peak")
+    measured["import_peak_bytes"] = peak(
+        import_players, imported, "players.jsonl")
+    measured["str_peak_bytes"] = peak(str, players)
+    return measured, mismatches
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--players", type=int, nargs="+", default=SIZES)
+    parser.add_argument(
+        "--backend", choices=("pickle", "sqlite", "indexed"),
+        default="sqlite")
+    parser.add_argument("--output", help="save the results as JSON")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    import src.players
+    src.players.PLAYERS_BACKEND = args.backend
+    print(f"{args.backend=}")
+    print(f"{'players':>8} {'export jsonl':>12} {'csv':>8} "
+          f"{'import jsonl':>12} {'csv':>8} {'export peak':>11} "
+          f"{'import peak':>11} {'str() peak':>11}")
+    measured = dict()
+    mismatches = 0
+    cwd = os.getcwd()
+    for size in args.players:
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                values, failed = measure(size)
+            finally:
+                os.chdir(cwd)
+        mismatches += failed
+        measured.update(
+            (f"players{size}_{name}", value)
+            for name, value in values.items())
+        print(f"{size:>8} {values['export_jsonl_players_per_s']:>12.0f} "
+              f"{values['export_csv_players_per_s']:>8.0f} "
+              f"{values['import_jsonl_players_per_s']:>12.0f} "
+              f"{values['import_csv_players_per_s']:>8.0f} "
+              f"{values['export_peak_bytes'] / 2**20:>9.1f}MB "
+              f"{values['import_peak_bytes'] / 2**20:>9.1f}MB "
+              f"{values['str_peak_bytes'] / 2**20:>9.1f}MB")
+    print(f"players per second, {mismatches} mismatches")
+    if mismatches:
+        sys.exit(1)
+    if args.output:
+        results.save(args.output, "transfer", measured)
+
+
+if __name__ == "__main__":
+    main()
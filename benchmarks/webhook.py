@@ -0,0 +1,134 @@
+"""
+End to end check and reply latency of the webhook mode against polling
+
+The bot runs in a child process with an empty players database and sends
+its replies to benchmarks.fake_bot_api.FakeBotApi. Updates are delivered
+one by one either by POSTing them to the embedded webhook server or by
+publishing them for getUpdates; the latency is the time until the reply
+reaches the fake API. Recorded updates can be replayed from a JSON file
+with a list of Telegram Update objects.
+
+Usage:
+    python -m benchmarks.webhook [--updates FILE] [--count N]
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks.fake_bot_api import FakeBotApi, make_updates
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECRET = "benchmark-secret"
+
+
+def run_child(mode: str, api_url: str, port: int) -> None:
+    import telebot.apihelper
+    telebot.apihelper.API_URL = api_url
+    from src.bot import bot, guard, sender
+    from benchmarks.engines import unlimit
+    unlimit(sender, guard)
+    if mode == "polling":
+        bot.infinity_polling(timeout=1, long_polling_timeout=1)
+    else:
+        from src.webhook import WebhookServer
+        WebhookServer(bot, port=port, secret=SECRET).serve_forever()
+
+
+def post(port: int, update: dict, secret: str = SECRET) -> int:
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}/", data=json.dumps(update).encode(),
+        headers={"Content-Type": "application/json",
+                 "X-Telegram-Bot-Api-Secret-Token": secret})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def wait_port(port: int, timeout: float = 10) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as s:
+            if not s.connect_ex(("127.0.0.1", port)):
+                return
+        time.sleep(0.05)
+    raise RuntimeError(f"webhook server is not listening on {port=}")
+
+
+def measure(mode: str, updates: list) -> list:
+    api = FakeBotApi().start()
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    latencies = []
+    with tempfile.TemporaryDirectory() as directory:
+        child = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.webhook", "--child", mode,
+             "--api-url", api.url, "--port", str(port)],
+            cwd=directory, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if mode == "webhook":
+                wait_port(port)
+                assert post(port, updates[0], "wrong") == 403
+                assert post(port, {"message": {}}) == 400  # no update_id
+                assert post(port, [updates[0]]) == 400
+            for update in updates:
+                sent = len(api.sent)
+                start = time.perf_counter()
+                if mode == "webhook":
+                    assert post(port, update) == 200
+                else:
+                    api.publish(update)
+                if not api.wait_sent(sent + 1, timeout=30):
+                    raise RuntimeError(f"{mode=} got no reply")
+                latencies.append(api.sent[sent][0] - start)
+                api.wait_sent(sent + 2, timeout=0.05)  # /start sends two
+        finally:
+            child.terminate()
+            child.wait()
+            api.stop()
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--updates", help="JSON file with recorded updates")
+    parser.add_argument("--count", type=int, default=200)
+    parser.add_argument("--child", choices=("polling", "webhook"),
+                        help=argparse.SUPPRESS)
+    parser.add_argument("--api-url", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child(args.child, args.api_url, args.port)
+        return
+    if args.updates:
+        with open(args.updates) as f:
+            updates = json.load(f)
+    else:
+        updates = make_updates(1, args.count - 1)
+    for mode in ("polling", "webhook"):
+        latencies = sorted(measure(mode, updates))
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(f"{mode:>8}: {len(latencies)} replies, "
+              f"p50 {statistics.median(latencies) * 1e3:.1f} ms, "
+              f"p95 {p95 * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,157 @@
 """
 Main application for Telegram game bot ColdHotGame
 
+Usage:
+    python coldhot.py [--engine {sync,async}] [--webhook] [--shards N]
+                      [--profiling]
+    python coldhot.py --export FILE [--from ID] [--to ID] [--played]
+                      [--namespace NAME]
+    python coldhot.py --import FILE [--namespace NAME]
+
+The engine defaults to settings.BOT_ENGINE: "sync" runs telebot.TeleBot,
+"async" runs telebot.async_telebot.AsyncTeleBot. Both poll for updates,
+--webhook receives them with the sync engine by the embedded HTTP server
+(see src.webhook). --shards N (settings.SHARDS) runs the sync engine in N
+worker processes sharing the players by user id (see src.shards).
+The sync polling also hosts the other bots of settings.BOTS in the same
+process (see src.bot).
+Metrics are served on settings.METRICS_PORT unless it is 0, the default
+(see src.metrics), --profiling adds the on demand cProfile and tracemalloc
+snapshots to the endpoint.
+--export and --import stream the players of settings.PLAYERS_BACKEND
+(of the bot NAME of settings.BOTS) to and from a JSON Lines (.jsonl) or
+CSV (.csv) file and exit without starting the bot (see src.transfer).
+On Ctrl+C or SIGTERM the queued updates are handled, the changed players
+and the games in progress are saved and the queued replies are sent.
+
 ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
 mtrineyev@gmail.com
 """
 
+import argparse
+import asyncio
 import logging
-from src.bot import bot
+import signal
+
+from src.config import BOT_ENGINE, BOTS, METRICS_PORT, SHARDS
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="ColdHotGame Telegram bot")
+    parser.add_argument(
+        "--engine", choices=("sync", "async"), default=BOT_ENGINE,
+        help="bot engine (default: %(default)s)")
+    parser.add_argument(
+        "--webhook", action="store_true",
+        help="receive updates by webhook instead of polling")
+    parser.add_argument(
+        "--shards", type=int, default=SHARDS,
+        help="worker processes owning the players (default: %(default)s)")
+    parser.add_argument(
+        "--profiling", action="store_true",
+        help="serve cProfile and tracemalloc snapshots with the metrics")
+    parser.add_argument(
+        "--export", metavar="FILE",
+        help="write the players to a .jsonl or .csv file and exit")
+    parser.add_argument(
+        "--import", metavar="FILE", dest="import_file",
+        help="add the players of a .jsonl or .csv file and exit")
+    parser.add_argument(
+        "--from", type=int, dest="first", metavar="ID",
+        help="export the players with ids from ID")
+    parser.add_argument(
+        "--to", type=int, dest="last", metavar="ID",
+        help="export the players with ids up to ID")
+    parser.add_argument(
+        "--played", action="store_true",
+        help="export the players who finished a game only")
+    parser.add_argument(
+        "--namespace", default="", metavar="NAME",
+        help="players of the bot NAME of settings.BOTS")
+    args = parser.parse_args()
+    for file_name in (args.export, args.import_file):
+        if file_name and not file_name.lower().endswith((".jsonl", ".csv")):
+            parser.error(f"{file_name} is neither .jsonl nor .csv")
+    if args.namespace and not args.namespace.isidentifier():
+        parser.error("--namespace must be a Python identifier")
+    if args.export and args.import_file:
+        parser.error("--export and --import are run one at a time")
+    if args.webhook and args.engine != "sync":
+        parser.error("--webhook runs with the sync engine only")
+    if args.shards < 1:
+        parser.error("--shards must be positive")
+    if args.shards > 1 and args.engine != "sync":
+        parser.error("--shards runs with the sync engine only")
+    if BOTS and (args.webhook or args.shards > 1 or args.engine != "sync"):
+        parser.error("settings.BOTS are hosted by the sync polling only")
+    return args
+
+
+def terminate(signum, frame):
+    raise KeyboardInterrupt
+
+
+def shutdown() -> None:
+    from src.bot import close
+    close()
+
+
+def transfer(args: argparse.Namespace) -> None:
+    from src.players import Player, create_players
+    from src.transfer import export_players, import_players
+    players = create_players(args.namespace)
+    players.load()
+    if args.export:
+        export_players(
+            players, args.export, args.first, args.last,
+            Player.was_games_played if args.played else None)
+    else:
+        import_players(players, args.import_file)
+        players.save()
+
+
+def webhook():
+    from src.bot import bot
+    from src.webhook import run
+    logging.info("Bot started and waiting for users updates by webhook...")
+    try:
+        run(bot)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shutdown()
 
 
 def main():
-    logging.info("Bot started and waiting for users input...")
-    bot.infinity_polling()
+    args = parse_args()
+    if args.export or args.import_file:
+        transfer(args)
+        return
+    signal.signal(signal.SIGTERM, terminate)
+    if METRICS_PORT:
+        from src import metrics
+        metrics.start(profiling=args.profiling)
+    if args.shards > 1:
+        from src.shards import run
+        logging.info(f"Bot started with {args.shards} shards...")
+        run(args.shards, args.webhook, args.profiling)
+        return
+    from src.shards import reshard
+    reshard(1)  # refuses the players split into shards
+    if args.webhook:
+        webhook()
+        return
+    logging.info(
+        f"Bot started with {args.engine} engine and waiting for users input...")
+    if args.engine == "async":
+        from src.async_bot import polling
+        asyncio.run(polling())
+    else:
+        from src.bot import polling
+        try:
+            polling()
+        finally:
+            shutdown()
 
 
 if __name__ == "__main__":
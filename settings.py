@@ -0,0 +1,132 @@
+"""
+Settings of the project
+
+Constants:
+
+    BOT_TOKEN - Telegram bot token received from @BotFather
+    BOT_ENGINE - "sync" (telebot.TeleBot) or "async" (AsyncTeleBot)
+    BOTS - other bots hosted in the same process by the sync polling, dicts
+        of BotInstance arguments: "token", "name" (a Python identifier,
+        the namespace of its players and games in progress) and optional
+        "max_number" (MAX_GUESS_NUMBER) and "thesaurus" (module of
+        src.thesaurus with the texts, "messages" by default)
+    BOT_API_URL - Bot API URL template like
+        'http://127.0.0.1:8081/bot{0}/{1}' (token, method) of a local Bot API
+        server or of benchmarks.fake_bot_api, empty for api.telegram.org
+    PLAYERS_BACKEND - users database backend: "pickle", "sqlite" or
+        "indexed" (lazy loading from PLAYERS_INDEX_FILE_NAME)
+    PLAYERS_FILE_NAME - name of the file with users database
+    PLAYERS_JOURNAL_LIMIT - journal records before it is compacted into
+        the users database snapshot
+    PLAYERS_DB_NAME - name of the SQLite users database, players from
+        PLAYERS_FILE_NAME are migrated into the empty one
+    PLAYERS_INDEX_FILE_NAME - name of the indexed users database, players
+        from PLAYERS_FILE_NAME are migrated into it if it does not exist
+    PLAYERS_CACHE_SIZE - players kept in memory by the SQLite and indexed
+        backends
+    MAX_NUMBER - upper limit for guessed number (recommended >= 501)
+    LEADERS_TOP_SIZE - number of players in the leaders table
+    RANK_STEPS_LIMIT, RANK_TIME_LIMIT - steps and seconds above which
+        the results share the last place in the players ranks
+    SESSION_TTL - seconds after which an idle game in progress is dropped
+    SESSIONS_FILE_NAME - file keeping the games in progress over a restart
+    HISTORY_FILE_NAME - binary log of every guess (src.history), empty
+        disables it
+    HISTORY_FILE_SIZE - bytes above which the history file is rotated
+    HISTORY_FILES - rotated history files kept
+    HISTORY_BUFFER - history bytes buffered before they are written
+    WEBHOOK_URL - public HTTPS URL registered with setWebhook in webhook
+        mode, leave empty to register it manually
+    WEBHOOK_HOST, WEBHOOK_PORT - address of the embedded webhook server
+    WEBHOOK_SECRET - secret token expected in webhook requests, required
+        in webhook mode (a long random string)
+    WEBHOOK_QUEUE_SIZE - updates waiting for the webhook intake thread
+    WEBHOOK_QUEUE_TIMEOUT - seconds to wait for a free place in the queue
+        before the update is refused and redelivered by Telegram
+    FLOOD_MODE - what is done with the updates of a user above FLOOD_RATE
+        (see src.flood): "off", "drop", "delay" or "collapse", guesses in
+        a game in progress are never dropped
+    FLOOD_RATE, FLOOD_WINDOW - updates of a user per sliding window of
+        seconds
+    FLOOD_USERS - users counted per window (about 100 bytes each), the
+        others are not limited
+    FLOOD_QUEUE - updates waiting in the delay and collapse modes
+    SEND_RATE - messages per second sent to all the chats
+    SEND_CHAT_RATE, SEND_CHAT_BURST - messages per second and burst size
+        sent to one chat
+    SEND_QUEUE_SIZE - queued messages above which flavour replies are dropped
+    SEND_WORKERS - threads sending the messages
+    WORKERS - threads running the handlers, the updates of one user are
+        always handled by the same thread in order
+    WORKER_QUEUE_SIZE - updates waiting for one handler thread
+    SAVE_INTERVAL - seconds between background saves of the changed
+        players (results lost on a crash), 0 saves them in the handlers
+    SAVE_BATCH - changed players which are saved without waiting
+        for SAVE_INTERVAL
+    SHARDS - worker processes sharing the players by user id (see
+        src.shards), 1 runs the bot in a single process
+    METRICS_HOST, METRICS_PORT - address of the Prometheus metrics
+        endpoint (src.metrics), port 0 (the default) disables it, pick
+        a free one (9100 is node_exporter's); shard n of the sharded mode
+        listens on METRICS_PORT + 1 + n
+    METRICS_SAMPLE - handler calls per one latency measurement
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import logging
+logging.basicConfig(
+    # filename='coldhot.log',
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    level=logging.INFO
+)
+
+BOT_TOKEN = "1234567890:AABB11cc22DD33ee44FF55gg66HH77ii88J"
+BOT_ENGINE = 'sync'
+BOTS = []
+BOT_API_URL = ''
+PLAYERS_BACKEND = 'pickle'
+PLAYERS_FILE_NAME = 'players.pickle'
+PLAYERS_JOURNAL_LIMIT = 10000
+PLAYERS_DB_NAME = 'players.sqlite3'
+PLAYERS_INDEX_FILE_NAME = 'players.index'
+PLAYERS_CACHE_SIZE = 10000
+MAX_GUESS_NUMBER = 1000
+LEADERS_TOP_SIZE = 3
+RANK_STEPS_LIMIT = 10000
+RANK_TIME_LIMIT = 86400
+SESSION_TTL = 86400
+SESSIONS_FILE_NAME = 'sessions.pickle'
+HISTORY_FILE_NAME = 'history.bin'
+HISTORY_FILE_SIZE = 64 * 2 ** 20
+HISTORY_FILES = 10
+HISTORY_BUFFER = 64 * 2 ** 10
+WEBHOOK_URL = ''
+WEBHOOK_HOST = '127.0.0.1'
+WEBHOOK_PORT = 8443
+WEBHOOK_SECRET = ''
+WEBHOOK_QUEUE_SIZE = 1000
+WEBHOOK_QUEUE_TIMEOUT = 1
+FLOOD_MODE = 'drop'
+FLOOD_RATE = 20
+FLOOD_WINDOW = 10
+FLOOD_USERS = 200000
+FLOOD_QUEUE = 10000
+SEND_RATE = 30
+SEND_CHAT_RATE = 1
+SEND_CHAT_BURST = 3
+SEND_QUEUE_SIZE = 10000
+SEND_WORKERS = 4
+WORKERS = 8
+WORKER_QUEUE_SIZE = 1000
+SAVE_INTERVAL = 1
+SAVE_BATCH = 500
+SHARDS = 1
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 0
+METRICS_SAMPLE = 1
+
+
+if __name__ == "__main__":
+    print(__doc__)
@@ -0,0 +1,104 @@
+"""
+Telegram bot engine for ColdHotGame on telebot.async_telebot.AsyncTeleBot
+
+Handlers of src.game, chosen by src.dispatcher, run one by one in a single
+worker thread, so the players storage I/O never stalls the event loop and
+the game state is not shared between threads. Updates pass
+src.flood.FloodGuard first, the ones it lets through (the delayed ones by
+its thread) are scheduled on the event loop, a handler error is logged.
+Replies go through the rate limited src.sender.Sender whose workers send
+them on the event loop.
+
+Run it with asyncio.run(polling()). When the polling stops, the scheduled
+handlers are awaited and the game executor is shut down before the
+players and the games in progress are saved.
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from telebot import asyncio_helper
+from telebot.async_telebot import AsyncTeleBot
+
+from src.config import BOT_API_URL, BOT_TOKEN
+from src.dispatcher import CONTENT_TYPES, create_dispatcher
+from src.flood import FloodGuard
+from src.flood import export_metrics as export_flood_metrics
+from src.game import Game
+from src.sender import Sender, export_metrics
+
+
+if BOT_API_URL:
+    asyncio_helper.API_URL = BOT_API_URL
+bot = AsyncTeleBot(BOT_TOKEN, parse_mode="MarkdownV2")
+_game_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="game")
+_loop = None
+_pending = set()  # futures of the scheduled handlers
+game = Game()
+dispatcher = create_dispatcher(game)
+
+
+def _send_message(chat_id: int, text: str) -> None:
+    asyncio.run_coroutine_threadsafe(
+        bot.send_message(chat_id, text), _loop).result()
+
+
+def _submit(message) -> None:
+    handler = dispatcher.route(message)
+    game.queued(handler, message)
+    future = asyncio.run_coroutine_threadsafe(
+        handle(handler, message), _loop)
+    _pending.add(future)
+    future.add_done_callback(_handled)
+
+
+def _handled(future) -> None:
+    _pending.discard(future)
+    if future.cancelled():
+        return
+    e = future.exception()
+    if e is not None:
+        logging.exception(f"Handler error {e}", exc_info=e)
+
+
+sender = Sender(_send_message)
+export_metrics(sender)
+guard = FloodGuard(_submit, game.is_guess)
+export_flood_metrics(guard)
+
+
+async def polling() -> None:
+    global _loop
+    _loop = asyncio.get_running_loop()
+    sender.start()
+    guard.start()
+    try:
+        await bot.infinity_polling()
+    finally:
+        guard.stop()  # the waiting updates are scheduled too
+        await asyncio.gather(
+            *(asyncio.wrap_future(future) for future in list(_pending)),
+            return_exceptions=True)  # the errors are logged by _handled
+        await _loop.run_in_executor(None, _game_executor.shutdown, True)
+        await _loop.run_in_executor(None, game.close)
+        await _loop.run_in_executor(None, sender.stop)
+
+
+async def handle(handler, message) -> None:
+    loop = asyncio.get_running_loop()
+    replies = await loop.run_in_executor(_game_executor, handler, message)
+    for chat_id, text, priority in replies:
+        sender.put(chat_id, text, priority)
+
+
+@bot.message_handler(content_types=CONTENT_TYPES)
+async def dispatch(message) -> None:
+    guard.admit(message.from_user.id, message)
+
+
+if __name__ == '__main__':
+    print(__doc__)
@@ -0,0 +1,70 @@
+"""
+Settings of ColdHotGame bot with the defaults of settings.example
+
+The modules of the bot take the settings from here instead of importing
+settings.py directly. A settings.py written for an older version of the
+bot lacks the settings added since then, they get the defaults of
+settings.example, so the bot starts after an upgrade without editing it.
+BOT_TOKEN, PLAYERS_FILE_NAME and MAX_GUESS_NUMBER are required as before.
+The settings module is read on the first import, so benchmarks.load
+changes it before importing the bot.
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import settings
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+BOT_TOKEN = settings.BOT_TOKEN
+BOT_ENGINE = _setting("BOT_ENGINE", "sync")
+BOTS = _setting("BOTS", [])
+BOT_API_URL = _setting("BOT_API_URL", "")
+PLAYERS_BACKEND = _setting("PLAYERS_BACKEND", "pickle")
+PLAYERS_FILE_NAME = settings.PLAYERS_FILE_NAME
+PLAYERS_JOURNAL_LIMIT = _setting("PLAYERS_JOURNAL_LIMIT", 10000)
+PLAYERS_DB_NAME = _setting("PLAYERS_DB_NAME", "players.sqlite3")
+PLAYERS_INDEX_FILE_NAME = _setting("PLAYERS_INDEX_FILE_NAME", "players.index")
+PLAYERS_CACHE_SIZE = _setting("PLAYERS_CACHE_SIZE", 10000)
+MAX_GUESS_NUMBER = settings.MAX_GUESS_NUMBER
+LEADERS_TOP_SIZE = _setting("LEADERS_TOP_SIZE", 3)
+RANK_STEPS_LIMIT = _setting("RANK_STEPS_LIMIT", 10000)
+RANK_TIME_LIMIT = _setting("RANK_TIME_LIMIT", 86400)
+SESSION_TTL = _setting("SESSION_TTL", 86400)
+SESSIONS_FILE_NAME = _setting("SESSIONS_FILE_NAME", "sessions.pickle")
+HISTORY_FILE_NAME = _setting("HISTORY_FILE_NAME", "history.bin")
+HISTORY_FILE_SIZE = _setting("HISTORY_FILE_SIZE", 64 * 2 ** 20)
+HISTORY_FILES = _setting("HISTORY_FILES", 10)
+HISTORY_BUFFER = _setting("HISTORY_BUFFER", 64 * 2 ** 10)
+WEBHOOK_URL = _setting("WEBHOOK_URL", "")
+WEBHOOK_HOST = _setting("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = _setting("WEBHOOK_PORT", 8443)
+WEBHOOK_SECRET = _setting("WEBHOOK_SECRET", "")
+WEBHOOK_QUEUE_SIZE = _setting("WEBHOOK_QUEUE_SIZE", 1000)
+WEBHOOK_QUEUE_TIMEOUT = _setting("WEBHOOK_QUEUE_TIMEOUT", 1)
+FLOOD_MODE = _setting("FLOOD_MODE", "drop")
+FLOOD_RATE = _setting("FLOOD_RATE", 20)
+FLOOD_WINDOW = _setting("FLOOD_WINDOW", 10)
+FLOOD_USERS = _setting("FLOOD_USERS", 200000)
+FLOOD_QUEUE = _setting("FLOOD_QUEUE", 10000)
+SEND_RATE = _setting("SEND_RATE", 30)
+SEND_CHAT_RATE = _setting("SEND_CHAT_RATE", 1)
+SEND_CHAT_BURST = _setting("SEND_CHAT_BURST", 3)
+SEND_QUEUE_SIZE = _setting("SEND_QUEUE_SIZE", 10000)
+SEND_WORKERS = _setting("SEND_WORKERS", 4)
+WORKERS = _setting("WORKERS", 8)
+WORKER_QUEUE_SIZE = _setting("WORKER_QUEUE_SIZE", 1000)
+SAVE_INTERVAL = _setting("SAVE_INTERVAL", 1)
+SAVE_BATCH = _setting("SAVE_BATCH", 500)
+SHARDS = _setting("SHARDS", 1)
+METRICS_HOST = _setting("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = _setting("METRICS_PORT", 0)
+METRICS_SAMPLE = _setting("METRICS_SAMPLE", 1)
+
+
+if __name__ == "__main__":
+    print(__doc__)
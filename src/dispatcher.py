@@ -0,0 +1,67 @@
+"""
+Dispatcher of the incoming messages to the game handlers in O(1)
+
+telebot tests the registered message handlers one by one, so every guess
+had to fail all the command filters before it reached make_move. The
+engines register one handler for all CONTENT_TYPES instead and
+Dispatcher.route() picks the game handler with a dict lookup, giving the
+same handler the chain of telebot filters gave:
+    not a text - the handler of the content type
+    a text not starting with "/" (every guess) - the text handler
+    a command - the handler of the command, the text handler if unknown
+The command is taken as telebot.util.extract_command() takes it: the
+first word with any "@botname" suffix cut off, case-sensitive. A bare
+command (the whole text, the most common case) is found without a split.
+
+create_dispatcher(handlers) - Dispatcher of the handlers of src.game
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+from src.thesaurus.commands import LEADERS, HELP, STOP, STATS, HARD, START
+
+MEDIA = [
+    "audio", "document", "photo", "sticker",
+    "video", "voice", "location", "contact"]
+CONTENT_TYPES = ["text"] + MEDIA
+
+
+class Dispatcher:
+    def __init__(self, commands: list, text_handler,
+                 content_handlers: dict) -> None:
+        self._commands = dict()  # "/command" -> handler, the first one wins
+        for names, handler in commands:
+            for name in names:
+                self._commands.setdefault(f"/{name}", handler)
+        self._text = text_handler
+        self._contents = content_handlers
+
+    def route(self, message):
+        if message.content_type != "text":
+            return self._contents.get(message.content_type)
+        text = message.text
+        if text[:1] != "/":
+            return self._text
+        handler = self._commands.get(text)
+        if handler is None:
+            command = text.split(None, 1)[0].partition("@")[0]
+            handler = self._commands.get(command, self._text)
+        return handler
+
+
+def create_dispatcher(handlers) -> Dispatcher:
+    return Dispatcher(
+        [
+            (START + HARD, handlers.start_game),
+            (STOP, handlers.stop_command),
+            (HELP, handlers.help_command),
+            (STATS, handlers.stats_command),
+            (LEADERS, handlers.leaders_command),
+        ],
+        handlers.make_move,
+        dict.fromkeys(MEDIA, handlers.message_reply))
+
+
+if __name__ == "__main__":
+    print(__doc__)
@@ -0,0 +1,79 @@
+"""
+Per-user ordered executor of the bot handlers
+
+Updates of one user are handled strictly in the order of arrival, updates
+of different users run in parallel. Every worker thread has its own queue
+and a user is always routed to the same worker (user id modulo the number
+of workers), so a game never sees two of its moves at once and no locks
+are needed around a player or a session. A full worker queue blocks the
+caller, which pushes back on the update intake.
+
+KeyedExecutor methods:
+    depth() -> int
+    join() -> None
+    stop() -> None
+    submit(key: int, fn, *args) -> None
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import logging
+import queue
+import threading
+
+from src.config import WORKER_QUEUE_SIZE, WORKERS
+from src import metrics
+
+_STOP = object()
+
+
+class KeyedExecutor:
+    def __init__(self, workers: int = WORKERS,
+                 queue_size: int = WORKER_QUEUE_SIZE) -> None:
+        self._queues = [queue.Queue(queue_size) for _ in range(workers)]
+        self._workers = [
+            threading.Thread(
+                target=self._work, args=(tasks,), daemon=True,
+                name=f"worker-{i}")
+            for i, tasks in enumerate(self._queues)
+        ]
+        for worker in self._workers:
+            worker.start()
+        metrics.Gauge(
+            "coldhot_handler_queue_depth", "Updates waiting for a handler",
+            function=self.depth)
+
+    def depth(self) -> int:
+        return sum(tasks.qsize() for tasks in self._queues)
+
+    def submit(self, key: int, fn, *args) -> None:
+        self._queues[hash(key) % len(self._queues)].put((fn, args))
+
+    def join(self) -> None:
+        for tasks in self._queues:
+            tasks.join()
+
+    def stop(self) -> None:
+        for tasks in self._queues:
+            tasks.put(_STOP)
+        for worker in self._workers:
+            worker.join()
+
+    @staticmethod
+    def _work(tasks: queue.Queue) -> None:
+        while True:
+            task = tasks.get()
+            try:
+                if task is _STOP:
+                    return
+                fn, args = task
+                fn(*args)
+            except Exception as e:
+                logging.exception(f"Handler {fn.__name__} error {e}")
+            finally:
+                tasks.task_done()
+
+
+if __name__ == "__main__":
+    print(__doc__)
@@ -0,0 +1,216 @@
+"""
+Per-user flood guard of the incoming updates
+
+FloodGuard runs before the handlers are dispatched and lets through at
+most settings.FLOOD_RATE updates of a user per sliding window of
+settings.FLOOD_WINDOW seconds. The window is approximated by the counts
+of the current and the previous fixed windows (the previous one weighted
+by its part still inside the sliding window), so admit() costs O(1) and
+the counts of the users idle for two windows are dropped with the
+previous window. At most settings.FLOOD_USERS users are counted per
+window, the others are let through, so the memory stays bounded for any
+number of users.
+
+An excess update is handled by settings.FLOOD_MODE:
+    off - no limits
+    drop - dropped
+    delay - queued and let through in order when the user is under the
+        limit again, the later updates of the user wait behind it
+    collapse - only the latest one is queued, a newer update let through
+        supersedes it
+At most settings.FLOOD_QUEUE updates wait, the excess ones are dropped.
+An update for which protect(update) is true (a guess in a game in
+progress) is never dropped or collapsed: it is let through at once (in the
+delay mode behind the waiting updates of the user, beyond FLOOD_QUEUE).
+stop() lets all the waiting updates through. Updates let through are
+passed to release(update).
+
+export_metrics() exports the counters of the updates admitted, exempt
+(protected beyond the limit), delayed, collapsed, dropped and untracked
+(let through uncounted above FLOOD_USERS) and the numbers of the waiting
+updates and the counted users by src.metrics.
+
+FloodGuard methods:
+    admit(key: int, update, now: float = None) -> None
+    release_due(now: float = None) -> int
+    start() -> None
+    stop() -> None
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+from src.config import (
+    FLOOD_MODE, FLOOD_QUEUE, FLOOD_RATE, FLOOD_USERS, FLOOD_WINDOW,
+)
+from src import metrics
+
+MODES = ("off", "drop", "delay", "collapse")
+COUNTERS = (
+    "admitted", "exempt", "delayed", "collapsed", "dropped", "untracked")
+
+
+class FloodGuard:
+    def __init__(self, release, protect=None, rate: int = FLOOD_RATE,
+                 window: float = FLOOD_WINDOW, mode: str = FLOOD_MODE,
+                 max_users: int = FLOOD_USERS,
+                 max_waiting: int = FLOOD_QUEUE) -> None:
+        if mode not in MODES:
+            raise ValueError(f"Unknown flood guard {mode=}")
+        self.mode = mode
+        self.rate = rate
+        self.window = window
+        self._release = release
+        self._protect = protect
+        self._max_users = max_users
+        self._max_waiting = max_waiting
+        self._period = 0
+        self._current = dict()  # key -> updates let through in the window
+        self._previous = dict()  # the same of the previous window
+        self._waiting = dict()  # key -> deque of the waiting updates
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self.waiting = 0
+        for counter in COUNTERS:
+            setattr(self, counter, 0)
+
+    def __len__(self) -> int:
+        return len(self._current) + len(self._previous)
+
+    def start(self) -> None:
+        if self.mode in ("delay", "collapse") and self._thread is None:
+            self._thread = threading.Thread(
+                target=self._work, daemon=True, name="flood")
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            waiting = [
+                update for updates in self._waiting.values()
+                for update in updates]
+            self._waiting = dict()
+            self.waiting = 0
+        for update in waiting:
+            self._release(update)
+
+    def admit(self, key: int, update, now: float = None) -> None:
+        if self.mode == "off":
+            self._release(update)
+            return
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            update = self._admit(key, update, now)
+        if update is not None:
+            self._release(update)
+
+    def release_due(self, now: float = None) -> int:
+        now = time.monotonic() if now is None else now
+        due = []
+        with self._lock:
+            for key in list(self._waiting):
+                updates = self._waiting[key]
+                while updates and self._take(key, now):
+                    due.append(updates.popleft())
+                if not updates:
+                    del self._waiting[key]
+            self.waiting -= len(due)
+        for update in due:
+            self._release(update)
+        return len(due)
+
+    def _admit(self, key: int, update, now: float):
+        waiting = self._waiting.get(key)
+        if waiting is not None and self.mode == "delay":
+            # the later updates of the user keep their order
+            if self.waiting >= self._max_waiting and not self._protected(
+                    update):
+                self.dropped += 1
+                return None
+            waiting.append(update)
+            self.waiting += 1
+            self.delayed += 1
+            return None
+        if self._take(key, now):
+            self.admitted += 1
+        elif self._protected(update):
+            self.exempt += 1
+        elif self.mode == "drop":
+            self.dropped += 1
+            return None
+        elif waiting is not None:  # collapse, the newer one waits instead
+            waiting[0] = update
+            self.collapsed += 1
+            return None
+        elif self.waiting < self._max_waiting:
+            self._waiting[key] = deque((update,))
+            self.waiting += 1
+            self.delayed += 1
+            return None
+        else:
+            self.dropped += 1
+            return None
+        if waiting is not None:  # collapse, superseded by the update
+            del self._waiting[key]
+            self.waiting -= 1
+            self.collapsed += 1
+        return update
+
+    def _protected(self, update) -> bool:
+        return self._protect is not None and self._protect(update)
+
+    def _take(self, key: int, now: float) -> bool:
+        position = now / self.window
+        period = int(position)
+        if period != self._period:
+            self._previous = (
+                self._current if period == self._period + 1 else dict())
+            self._current = dict()
+            self._period = period
+        count = self._current.get(key, 0)
+        if count >= self.rate:
+            return False
+        previous = self._previous.get(key, 0)
+        if previous and (
+                previous * (1 - position + period) + count >= self.rate):
+            return False
+        if not count and len(self._current) >= self._max_users:
+            self.untracked += 1
+            return True
+        self._current[key] = count + 1
+        return True
+
+    def _work(self) -> None:
+        tick = min(max(self.window / max(self.rate, 1), 0.01), 1.0)
+        while not self._stopping.wait(tick):
+            try:
+                self.release_due()
+            except Exception as e:
+                logging.error(f"Flood guard error {e!r}")
+
+
+def export_metrics(guard: FloodGuard, labels: str = "") -> None:
+    for counter in COUNTERS:
+        metrics.Gauge(
+            f"coldhot_flood_{counter}_total", f"Updates {counter}", labels,
+            function=lambda counter=counter: getattr(guard, counter),
+            kind="counter")
+    metrics.Gauge(
+        "coldhot_flood_waiting", "Updates waiting for the flood guard",
+        labels, function=lambda: guard.waiting)
+    metrics.Gauge(
+        "coldhot_flood_users", "Users counted by the flood guard", labels,
+        function=lambda: len(guard))
+
+
+if __name__ == "__main__":
+    print(__doc__)
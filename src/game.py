@@ -0,0 +1,328 @@
+"""
+Game logic for 'Guess the number' for Telegram bot
+
+The bot thinks number from 1 to Game.max_number (settings.MAX_GUESS_NUMBER
+by default). The user tries to guess the number by getting hints from the
+bot.
+
+Every hosted bot has its own Game: its players namespace (see
+src.players.create_players), games in progress, MAX_GUESS_NUMBER and
+thesaurus module of src.thesaurus with the texts. Handlers know nothing
+about the Telegram transport: each of them takes a message and returns
+the replies as a list of (chat_id, text, priority) to be sent by the
+engine (src.bot or src.async_bot) through src.sender.Sender. Changed
+players are saved in the background by src.persistence.Persister. close()
+saves the players and the games in progress before the bot exits.
+Every guess is appended to the binary game history of src.history.
+is_guess() tells the guesses in a game in progress to src.flood without
+refreshing the session; the engines pass every handler they queue to
+queued(), so the guesses sent after a queued /start count as well.
+Handler latencies and the numbers of the players and the active games
+(labelled by the bot name, metrics_labels) are exported by src.metrics.
+
+Rendered texts are reused: the leaders table while the top-K entries stay
+the same, the statistics of a player (in a bounded LRU cache keyed by the
+statistics values) while they do not change and the record messages.
+The ranks are appended to them on every call.
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import importlib
+import logging
+import math
+import random
+from functools import lru_cache
+
+from src.config import (
+    HISTORY_FILE_NAME, LEADERS_TOP_SIZE, MAX_GUESS_NUMBER, SESSION_TTL,
+    SESSIONS_FILE_NAME,
+)
+from src.thesaurus.commands import HARD
+from src import metrics
+from src.history import GUESSED, HistoryLog
+from src.leaderboard import BOARDS
+from src.persistence import Persister
+from src.players import create_players, namespaced
+from src.sender import FLAVOUR, HINT, REPLY
+from src.sessions import Sessions
+from src.utils import (
+    GAMES,
+    STEPS,
+    get_plural_word,
+    make_hit_index,
+    seconds_to_ua,
+    escape_markdown,
+)
+
+STATS_CACHE_SIZE = 4096
+# a text asks for the hard mode if it contains any HARD command, the ones
+# containing another of them ("hardcore" contains "hard") are redundant
+_HARD_WORDS = tuple(
+    word for word in dict.fromkeys(HARD)
+    if not any(other != word and other in word for other in HARD))
+
+
+def is_hard(text: str) -> bool:
+    for word in _HARD_WORDS:
+        if word in text:
+            return True
+    return False
+
+
+class Game:
+    def __init__(self, name: str = "", max_number: int = MAX_GUESS_NUMBER,
+                 thesaurus: str = "messages") -> None:
+        self.name = name
+        self.max_number = max_number
+        self.thesaurus = importlib.import_module(f"src.thesaurus.{thesaurus}")
+        self.players = create_players(name)
+        self.players.load()
+        self.persister = Persister(self.players)
+        self.persister.start()
+        self.sessions = Sessions(SESSION_TTL)
+        self.sessions_file_name = namespaced(SESSIONS_FILE_NAME, name)
+        self.sessions.load(self.sessions_file_name)
+        self._hit_index = make_hit_index(max_number)
+        self.history = (
+            HistoryLog(namespaced(HISTORY_FILE_NAME, name))
+            if HISTORY_FILE_NAME else None)
+        self._starting = set()  # users whose start_game is queued
+        self._leaders = (None, "")  # the top-K entries and their table
+        self.record_message = lru_cache(maxsize=None)(self._record_message)
+        self.stats_text = lru_cache(maxsize=STATS_CACHE_SIZE)(self._stats_text)
+        self.metrics_labels = f'bot="{name}"' if name else ""
+        metrics.Gauge(
+            "coldhot_active_games", "Games in progress", self.metrics_labels,
+            function=lambda: len(self.sessions))
+        metrics.Gauge(
+            "coldhot_players", "Players in the storage", self.metrics_labels,
+            function=lambda: len(self.players))
+
+    def close(self) -> None:
+        self.persister.stop()
+        self.sessions.save(self.sessions_file_name)
+        if self.history is not None:
+            self.history.close()
+
+    def _record_message(self, record_type: str, mode: str) -> str:
+        return " ".join([
+            self.thesaurus.RECORD_HEADER, record_type,
+            self.thesaurus.GAME_TYPE[mode]])
+
+    def leaders_text(self) -> str:
+        thesaurus = self.thesaurus
+
+        def top(entries: list, func, plurals=()) -> str:
+            result = ""
+            for i, (name, value) in enumerate(entries):
+                place = (
+                    thesaurus.MEDALS[i] if i < len(thesaurus.MEDALS)
+                    else thesaurus.PLACE.format(i + 1))
+                result += f"{place} {name} {func(value, plurals)}\n"
+            return result
+
+        tops = [self.players.get_top(board) for board in BOARDS]
+        cached_tops, text = self._leaders
+        if tops != cached_tops:
+            text = thesaurus.LEADERS_TABLE.format(
+                LEADERS_TOP_SIZE,
+                top(tops[0], get_plural_word, STEPS),
+                top(tops[1], seconds_to_ua),
+                top(tops[2], get_plural_word, STEPS),
+                top(tops[3], seconds_to_ua)
+            )
+            self._leaders = (tops, text)
+        return text
+
+    def _stats_text(self, games_played: int, best_steps: int, best_time: int,
+                    games_played_hard: int, best_steps_hard: int,
+                    best_time_hard: int) -> str:
+        stats = self.thesaurus.STATS_TITLE
+        if games_played:
+            stats += self.thesaurus.STATS_NORMAL.format(
+                get_plural_word(games_played, GAMES),
+                get_plural_word(best_steps, STEPS),
+                seconds_to_ua(best_time))
+        if games_played_hard:
+            stats += self.thesaurus.STATS_HARD.format(
+                get_plural_word(games_played_hard, GAMES),
+                get_plural_word(best_steps_hard, STEPS),
+                seconds_to_ua(best_time_hard))
+        return stats.rstrip("\n") + "\n\n"
+
+    def ranks_text(self, pid: int) -> str:
+        result = ""
+        for board, board_name in zip(BOARDS, self.thesaurus.RANK_NAMES):
+            rank = self.players.get_rank(pid, board)
+            if rank:
+                place, total = rank
+                percent = math.ceil(place * 100 / total)
+                result += self.thesaurus.RANK.format(
+                    board_name, place, total, percent)
+        return self.thesaurus.RANKS_TITLE + result if result else ""
+
+    def queued(self, handler, message) -> None:
+        if handler == self.start_game:
+            self._starting.add(message.from_user.id)
+
+    def is_guess(self, message) -> bool:
+        text = message.text
+        if text is None:
+            return False
+        pid = message.from_user.id
+        if pid not in self._starting and self.sessions.peek(pid) is None:
+            return False
+        try:
+            int(text.lstrip("/"))
+        except ValueError:
+            return False
+        return True
+
+    @metrics.timed("start_game")
+    def start_game(self, message) -> list:
+        try:
+            return self._start_game(message)
+        finally:
+            # the session is started, is_guess() relies on it from now on
+            self._starting.discard(message.from_user.id)
+
+    def _start_game(self, message) -> list:
+        replies = []
+        user = message.from_user
+        last_name = f" {user.last_name}" if user.last_name else ""
+        name = f"{user.first_name}{last_name}"
+        if message.chat.id != user.id:
+            replies.append((
+                message.chat.id,
+                self.thesaurus.START_GAME_OTHER_CHAT.format(
+                    escape_markdown(name)), REPLY))
+        if not self.players.is_exist(user.id):
+            self.players.add_new(user.id, name)
+            replies.append((user.id, self.thesaurus.HELLO.format(name), REPLY))
+            self.persister.mark(user.id)
+        session = self.sessions.get(user.id)
+        if session is not None:
+            replies.append((
+                user.id, self.thesaurus.GAME_ALREADY_STARTED.format(
+                    seconds_to_ua(message.date - session.start_time)), REPLY))
+            return replies
+        hard_mode = is_hard(message.text)
+        session = self.sessions.start(
+            user.id, random.randint(1, self.max_number), message.date,
+            hard_mode)
+        replies.append((
+            user.id, self.thesaurus.START_GAME.format(self.max_number), REPLY))
+        logging.info(
+            f"Game started bot={self.name!r} "
+            f"{name=}, {session.hard_mode=}, {session.number_to_guess=}")
+        return replies
+
+    @metrics.timed("stop_command")
+    def stop_command(self, message) -> list:
+        user = message.from_user
+        if self.sessions.stop(user.id) is None:
+            return [(message.chat.id, self.thesaurus.NO_GAME_STARTED, REPLY)]
+        logging.info(f"Game aborted bot={self.name!r} {user.id=}")
+        return [(message.chat.id, self.thesaurus.ABORT_GAME, REPLY)]
+
+    @metrics.timed("help_command")
+    def help_command(self, message) -> list:
+        user = message.from_user
+        if self.sessions.is_game_started(user.id):
+            return [(
+                message.chat.id, self.thesaurus.HELP_IN_GAME.format(
+                    "\n".join(self.thesaurus.HINTS[3:])), HINT)]
+        return [(
+            message.chat.id,
+            self.thesaurus.HELP_OUT_GAME.format(
+                self.max_number, LEADERS_TOP_SIZE), REPLY)]
+
+    @metrics.timed("stats_command")
+    def stats_command(self, message) -> list:
+        replies = []
+        user = message.from_user
+        if user.id != message.chat.id:
+            replies.append((
+                message.chat.id,
+                self.thesaurus.STATS_OTHER_CHAT.format(
+                    escape_markdown(message.from_user.first_name)),
+                REPLY))
+        if self.players.was_games_played(user.id):
+            player = self.players[user.id]
+            stats = self.stats_text(
+                player.games_played, player.best_steps, player.best_time,
+                player.games_played_hard, player.best_steps_hard,
+                player.best_time_hard) + self.ranks_text(user.id)
+        else:
+            stats = self.thesaurus.STATS_NO_GAMES
+        replies.append((user.id, stats, REPLY))
+        return replies
+
+    @metrics.timed("leaders_command")
+    def leaders_command(self, message) -> list:
+        leaders = self.leaders_text()
+        if self.players.was_games_played(message.from_user.id):
+            leaders += "\n" + self.ranks_text(message.from_user.id)
+        return [(message.chat.id, leaders, REPLY)]
+
+    @metrics.timed("make_move")
+    def make_move(self, message) -> list:
+        user = message.from_user
+        session = self.sessions.get(user.id)
+        if session is not None:
+            session.steps_count += 1
+            try:
+                guess = int(message.text.lstrip("/"))
+            except ValueError:
+                return [(
+                    message.chat.id, random.choice(self.thesaurus.ERRORS),
+                    HINT)]
+            if guess == session.number_to_guess:
+                index = GUESSED
+                self.sessions.stop(user.id)
+                player = self.players[user.id]
+                hard_mode = session.hard_mode
+                elapsed_time = message.date - session.start_time
+                priority = REPLY
+                relpy = self.thesaurus.END_GAME.format(
+                    get_plural_word(session.steps_count, STEPS),
+                    seconds_to_ua(elapsed_time))
+                record = ""
+                if self.players.set_best_time(
+                        user.id, elapsed_time, hard_mode):
+                    record = self.record_message(
+                        self.thesaurus.RECORD_TIME, hard_mode)
+                if self.players.set_best_steps(
+                        user.id, session.steps_count, hard_mode):
+                    record += self.record_message(
+                        self.thesaurus.RECORD_STEPS, hard_mode)
+                player.increase_games_count(hard_mode)
+                self.persister.mark(user.id, player)
+                if record:
+                    relpy += (
+                        self.thesaurus.EXCLAMATION + record
+                        + self.thesaurus.RECORD_FOOTER)
+                logging.info(
+                    f"{player.name=} guessed the number, {elapsed_time=}")
+            else:
+                index = self._hit_index(guess, session.number_to_guess)
+                hint = self.thesaurus.HINTS[index]
+                relpy = hint[-session.hard_mode:]  # last symbol if hard
+                priority = HINT
+            if self.history is not None:
+                self.history.write(
+                    user.id, message.date, guess, index, session.hard_mode)
+        else:
+            relpy = random.choice(self.thesaurus.REPLIES)
+            priority = FLAVOUR
+        return [(message.chat.id, relpy, priority)]
+
+    @metrics.timed("message_reply")
+    def message_reply(self, message) -> list:
+        return [(message.from_user.id, self.thesaurus.STICKER_REPLY, FLAVOUR)]
+
+
+if __name__ == '__main__':
+    print(__doc__)
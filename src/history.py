@@ -0,0 +1,165 @@
+"""
+Game history of the bot players as a compact binary event log
+
+Every guess handled by src.game.Game.make_move is appended to the log as
+a fixed-width little-endian record, the players keep only their best
+results. Packed records are queued without a lock and written to the file
+by settings.HISTORY_BUFFER bytes and on close(), so the records of the
+last buffer are lost on a crash. The file is rotated when it grows over
+settings.HISTORY_FILE_SIZE bytes: "<file>" becomes "<file>.1", the former
+"<file>.1" becomes "<file>.2" and so on, settings.HISTORY_FILES rotated
+files are kept. write() is thread safe.
+
+File layout, little-endian:
+    b"CHHIST01"
+    records: user id int64, time uint32 (Unix seconds of the message),
+        guess int32 (clamped to int32), hint uint8 (index of HINTS,
+        GUESSED for the right guess), mode uint8 (HARD bit for hard mode)
+
+A truncated last record (a crash during the write) is skipped by readers.
+
+Functions:
+    files(file_name: str) -> list - the rotated files, oldest first
+    read(file_name: str) -> Event generator of all the files
+    load(file_name: str) -> numpy.memmap of the records of one file,
+        zero-copy, of dtype() (needs numpy)
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import logging
+import os
+import struct
+import threading
+from collections import deque, namedtuple
+
+from src.config import HISTORY_BUFFER, HISTORY_FILE_SIZE, HISTORY_FILES
+
+GUESSED = 255  # hint of the right guess
+HARD = 1  # mode bit of the hard mode
+Event = namedtuple("Event", "user_id time guess hint mode")
+_MAGIC = b"CHHIST01"
+_RECORD = struct.Struct("<qIiBB")
+_FIELDS = (
+    ("user_id", "<i8"), ("time", "<u4"), ("guess", "<i4"), ("hint", "u1"),
+    ("mode", "u1"),
+)
+_INT32 = 2 ** 31 - 1
+_READ_RECORDS = 4096  # records read by one read() call
+
+
+class HistoryLog:
+    def __init__(self, file_name: str, file_size: int = HISTORY_FILE_SIZE,
+                 buffer_size: int = HISTORY_BUFFER) -> None:
+        self.file_name = file_name
+        self._file_size = file_size
+        self._buffer_records = max(buffer_size // _RECORD.size, 1)
+        self._records = deque()  # packed records, appended without a lock
+        self._pack = _RECORD.pack
+        self._lock = threading.Lock()  # of the file
+        self._file = None
+        self._size = 0  # of the current file with the written records
+
+    def write(self, user_id: int, time: int, guess: int, hint: int,
+              hard_mode: bool) -> None:
+        if not -_INT32 <= guess <= _INT32:
+            guess = _INT32 if guess > 0 else -_INT32
+        records = self._records
+        records.append(self._pack(user_id, time, guess, hint, hard_mode))
+        if len(records) >= self._buffer_records:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _flush(self) -> None:
+        popleft = self._records.popleft
+        # records appended meanwhile are left for the next flush
+        data = b"".join([popleft() for _ in range(len(self._records))])
+        if not data:
+            return
+        try:
+            if self._file is None:
+                self._open()
+            elif self._size + len(data) > self._file_size:
+                self._file.close()
+                self._file = None
+                self._rotate()
+                self._open()
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data)
+        except OSError as e:
+            logging.error(f"{self.file_name=} writing error {e}")
+
+    def _open(self) -> None:
+        self._file = open(self.file_name, "ab")
+        self._size = self._file.tell()
+        if not self._size:
+            self._file.write(_MAGIC)
+            self._size = len(_MAGIC)
+        # records after a truncated one would be misaligned
+        self._size -= (self._size - len(_MAGIC)) % _RECORD.size
+        self._file.truncate(self._size)
+
+    def _rotate(self) -> None:
+        name = self.file_name
+        for i in range(HISTORY_FILES - 1, 0, -1):
+            if os.path.exists(f"{name}.{i}"):
+                os.replace(f"{name}.{i}", f"{name}.{i + 1}")
+        if HISTORY_FILES:
+            os.replace(name, f"{name}.1")
+        else:
+            os.remove(name)
+        logging.info(f"{name=} rotated")
+
+
+def files(file_name: str) -> list:
+    rotated = [f"{file_name}.{i}" for i in range(HISTORY_FILES, 0, -1)]
+    return [name for name in rotated + [file_name] if os.path.exists(name)]
+
+
+def read(file_name: str):
+    for name in files(file_name):
+        with open(name, "rb") as bf:
+            if bf.read(len(_MAGIC)) != _MAGIC:
+                logging.warning(f"{name=} is not a game history, skipped")
+                continue
+            while True:
+                chunk = bf.read(_RECORD.size * _READ_RECORDS)
+                tail = len(chunk) % _RECORD.size
+                for values in _RECORD.iter_unpack(chunk[:len(chunk) - tail]):
+                    yield Event(*values)
+                if len(chunk) < _RECORD.size * _READ_RECORDS:
+                    break
+
+
+def dtype():
+    import numpy as np  # optional, the bot itself does not need it
+    return np.dtype(list(_FIELDS))
+
+
+def load(file_name: str):
+    import numpy as np  # optional, the bot itself does not need it
+    records = (os.path.getsize(file_name) - len(_MAGIC)) // _RECORD.size
+    with open(file_name, "rb") as bf:
+        if bf.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError(f"{file_name=} is not a game history")
+    if records <= 0:
+        return np.zeros(0, dtype=dtype())
+    return np.memmap(
+        file_name, dtype=dtype(), mode="r", offset=len(_MAGIC),
+        shape=(records,))
+
+
+if __name__ == "__main__":
+    print(__doc__)
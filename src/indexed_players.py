@@ -0,0 +1,347 @@
+"""
+Indexed storage backend for the bot players with lazy loading
+
+The snapshot settings.PLAYERS_INDEX_FILE_NAME keeps the sorted player ids,
+the offsets of their records and the columns of the best results ahead of
+the pickled records. load() only maps the file into memory with mmap and
+replays the journal: a player is found by a binary search over the ids
+and unpickled on the first access, the recently used players are kept in
+an LRU of settings.PLAYERS_CACHE_SIZE. The leaderboard is built from the
+columns by a background thread, leaderboard queries and new records wait
+until it is ready.
+
+Changes are journaled as by src.players.Players, the changed players stay
+in memory until the journal is compacted into a new snapshot, the records
+of the other players are copied into it without unpickling.
+
+On the first load() without the snapshot the players are migrated from
+settings.PLAYERS_FILE_NAME (snapshot plus journal) if it exists.
+
+File layout, little-endian:
+    b"CHPLIDX1", players count: uint64
+    ids: int64 * count, sorted
+    offsets: uint64 * (count + 1), record i is offsets[i]:offsets[i + 1]
+    best_steps, best_time, best_steps_hard, best_time_hard: int64 * count
+    records: pickled Player objects
+
+len() returns the count kept by load(), add_new() and add_many(), as the
+metrics read it on every scrape. items() walks the ids of the index and
+unpickles the records one by one from the mapped file, the changed
+players are taken from memory.
+
+IndexedPlayers methods are the same as src.players.Players ones.
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import logging
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from itertools import chain
+
+from src.config import (
+    LEADERS_TOP_SIZE, PLAYERS_CACHE_SIZE, PLAYERS_FILE_NAME,
+    PLAYERS_INDEX_FILE_NAME,
+)
+from src.leaderboard import BOARDS, Leaderboard
+from src.players import (
+    _INFINITY, _JOURNAL_FILE_NAME, _LOAD_BYTES, _LOAD_SECONDS, _files_size,
+    _in_range, BasePlayers, Player, Players, namespaced,
+)
+
+_HEADER = struct.Struct("<8sQ")  # magic, players count
+_MAGIC = b"CHPLIDX1"
+
+
+class _Index:
+    def __init__(self, file_name: str = None) -> None:
+        self._map = None
+        self.ids = self.offsets = ()
+        self.columns = {board: () for board in BOARDS}
+        if file_name is None:
+            return
+        with open(file_name, "rb") as bf:
+            self._map = mmap.mmap(bf.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = _HEADER.unpack_from(self._map)
+        if magic != _MAGIC:
+            raise ValueError(f"{file_name=} is not a players index")
+        view = memoryview(self._map)
+        start = _HEADER.size
+
+        def take(items: int, code: str) -> memoryview:
+            nonlocal start
+            start += 8 * items
+            return view[start - 8 * items:start].cast(code)
+
+        self.ids = take(count, "q")
+        self.offsets = take(count + 1, "Q")
+        for board in BOARDS:
+            self.columns[board] = take(count, "q")
+
+    def find(self, pid: int) -> int:
+        i = bisect_left(self.ids, pid)
+        return i if i < len(self.ids) and self.ids[i] == pid else -1
+
+    def record(self, i: int) -> bytes:
+        return self._map[self.offsets[i]:self.offsets[i + 1]]
+
+    def player(self, i: int) -> Player:
+        return pickle.loads(self.record(i))
+
+
+def _pack(player: Player) -> tuple:
+    return pickle.dumps(player), [getattr(player, board) for board in BOARDS]
+
+
+class IndexedPlayers(Players):
+    _file_name = PLAYERS_INDEX_FILE_NAME
+    _journal_file_name = f"{PLAYERS_INDEX_FILE_NAME}.journal"
+    _old_journal_file_name = f"{_journal_file_name}.old"
+
+    def __init__(self, namespace: str = "") -> None:
+        super().__init__(namespace)
+        self._index = _Index()
+        self._cache = OrderedDict()
+        self._pinned = dict()  # changed players waiting to be saved
+        self._compacting = dict()  # changed players written to the snapshot
+        self._ready = threading.Event()
+        self._count = 0
+
+    __str__ = BasePlayers.__str__
+
+    def __iter__(self):
+        with self._lock:
+            index = self._index
+            new = [
+                pid for pid in chain(self._compacting, self._players)
+                if index.find(pid) < 0
+            ]
+        return chain(index.ids, dict.fromkeys(new))
+
+    def __getitem__(self, key):
+        with self._lock:
+            for players in (self._pinned, self._players, self._compacting):
+                player = players.get(key)
+                if player is not None:
+                    return player
+            player = self._cache.get(key)
+            if player is not None:
+                self._cache.move_to_end(key)
+                return player
+            i = self._index.find(key)
+            if i < 0:
+                raise KeyError(key)
+            player = self._index.player(i)
+            self._remember(key, player)
+            return player
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add_new(self, pid: int, name: str) -> None:
+        with self._lock:
+            super().add_new(pid, name)
+            self._count += 1
+
+    def is_exist(self, pid: int) -> bool:
+        with self._lock:
+            return (
+                pid in self._pinned or pid in self._players
+                or pid in self._compacting or pid in self._cache
+                or self._index.find(pid) >= 0
+            )
+
+    def add_many(self, players: dict) -> int:
+        self._ready.wait()  # the new players are ranked at once
+        return super().add_many(players)
+
+    def items(self, first: int = None, last: int = None):
+        with self._lock:
+            index = self._index
+            changed = {**self._compacting, **self._players, **self._pinned}
+        ids = index.ids
+        start = 0 if first is None else bisect_left(ids, first)
+        stop = len(ids) if last is None else bisect_right(ids, last)
+        for i in range(start, stop):
+            pid = ids[i]
+            player = changed.pop(pid, None)
+            yield pid, index.player(i) if player is None else player
+        for pid in sorted(changed):
+            if _in_range(pid, first, last) and index.find(pid) < 0:
+                yield pid, changed[pid]
+
+    def get_top(self, board: str, k: int = LEADERS_TOP_SIZE) -> list:
+        self._ready.wait()
+        return super().get_top(board, k)
+
+    def get_rank(self, pid: int, board: str) -> tuple:
+        self._ready.wait()
+        return super().get_rank(pid, board)
+
+    def get_player_at(self, board: str, rank: int) -> int:
+        self._ready.wait()
+        return super().get_player_at(board, rank)
+
+    def load(self) -> None:
+        if not os.path.exists(self._file_name) and (
+                os.path.exists(namespaced(PLAYERS_FILE_NAME, self.namespace))
+                or os.path.exists(
+                    namespaced(_JOURNAL_FILE_NAME, self.namespace))):
+            self.migrate_from_pickle()
+        start = time.perf_counter()
+        try:
+            self._index = _Index(self._file_name)
+        except FileNotFoundError:
+            logging.warning(f"{self._file_name=} not found, no players yet")
+        except (OSError, ValueError) as e:
+            logging.warning(f"{self._file_name=} reading error {e}")
+        self._journal_records = (
+            self._replay_journal(self._old_journal_file_name)
+            + self._replay_journal(self._journal_file_name)
+        )
+        self._count = len(self._index.ids) + sum(
+            1 for pid in self._players if self._index.find(pid) < 0)
+        self._leaderboard = Leaderboard(LEADERS_TOP_SIZE)
+        self._ready.clear()
+        _LOAD_SECONDS.set(time.perf_counter() - start)
+        _LOAD_BYTES.set(_files_size(
+            self._file_name, self._old_journal_file_name,
+            self._journal_file_name))
+        threading.Thread(
+            target=self._build_leaderboard, daemon=True, name="leaderboard"
+        ).start()
+
+    def migrate_from_pickle(self) -> None:
+        players = Players(self.namespace)
+        players.load()
+        temp_file_name = f"{self._file_name}.tmp"
+        with open(temp_file_name, "wb") as bf:
+            self._write_snapshot(
+                bf, (_Index(), {pid: _pack(players[pid]) for pid in players}))
+            bf.flush()
+            os.fsync(bf.fileno())
+        os.replace(temp_file_name, self._file_name)
+        logging.info(
+            f"{len(players)} players migrated "
+            f"from {players._file_name=} to {self._file_name=}")
+
+    def pin(self, pid: int, player: Player) -> None:
+        with self._lock:
+            self._pinned[pid] = player
+
+    def unpin(self, pids) -> None:
+        with self._lock:
+            for pid in pids:
+                self._pinned.pop(pid, None)
+
+    def _build_leaderboard(self) -> None:
+        start = time.perf_counter()
+        with self._lock:
+            index = self._index
+            changed = dict(self._players)
+        for board in BOARDS:
+            entries = [
+                (value, pid)
+                for pid, value in zip(index.ids, index.columns[board])
+                if value != _INFINITY and pid not in changed
+            ]
+            entries.extend(
+                (getattr(player, board), pid)
+                for pid, player in changed.items()
+                if getattr(player, board) != _INFINITY
+            )
+            entries.sort()
+            self._leaderboard.extend(board, entries, self._name)
+        self._ready.set()
+        logging.info(
+            f"Leaderboard of {len(index.ids)} players built "
+            f"in {time.perf_counter() - start:.2f} s")
+
+    def _added(self, pid: int, player: Player) -> None:
+        super()._added(pid, player)
+        self._count += 1
+
+    def _find(self, board: str, low: int, high: int) -> int:
+        high = _INFINITY - 1 if high is None else high
+        with self._lock:
+            index = self._index
+            changed = {**self._compacting, **self._players, **self._pinned}
+        for pid, player in changed.items():
+            if low <= getattr(player, board) <= high:
+                return pid
+        for pid, value in zip(index.ids, index.columns[board]):
+            if low <= value <= high and pid not in changed:
+                return pid
+        raise KeyError(f"No player of {board=} in {low}..{high}")
+
+    def _name(self, pid: int) -> str:
+        return self[pid].escaped_name
+
+    def _record(self, pid: int, name: str, board: str, value: int,
+                previous: int = None) -> None:
+        self._ready.wait()
+        self._leaderboard.update(pid, name, board, value, previous)
+
+    def _remember(self, pid: int, player: Player) -> None:
+        self._cache[pid] = player
+        if len(self._cache) > PLAYERS_CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    def _journaled(self, players: dict) -> None:
+        self._players.update(players)  # kept until compacted
+
+    def _take_snapshot(self):
+        self._compacting.update(self._players)  # after a failed compaction
+        self._players = dict()
+        return self._index, {
+            pid: _pack(player) for pid, player in self._compacting.items()}
+
+    def _write_snapshot(self, bf, snapshot) -> None:
+        index, changed = snapshot
+        entries = sorted(chain(
+            ((pid, i) for i, pid in enumerate(index.ids) if pid not in changed),
+            ((pid, -1) for pid in changed),
+        ))
+        count = len(entries)
+        ids = array("q", (pid for pid, _ in entries))
+        offsets = array("Q")
+        columns = {board: array("q") for board in BOARDS}
+        offset = _HEADER.size + 8 * (count * (2 + len(BOARDS)) + 1)
+        for pid, i in entries:
+            offsets.append(offset)
+            if i < 0:
+                payload, values = changed[pid]
+                offset += len(payload)
+                for board, value in zip(BOARDS, values):
+                    columns[board].append(value)
+            else:
+                offset += index.offsets[i + 1] - index.offsets[i]
+                for board in BOARDS:
+                    columns[board].append(index.columns[board][i])
+        offsets.append(offset)
+        bf.write(_HEADER.pack(_MAGIC, count))
+        bf.write(ids)
+        bf.write(offsets)
+        for board in BOARDS:
+            bf.write(columns[board])
+        for pid, i in entries:
+            bf.write(changed[pid][0] if i < 0 else index.record(i))
+
+    def _snapshot_stored(self) -> None:
+        self._index = _Index(self._file_name)
+        for pid, player in self._compacting.items():
+            if pid not in self._players:
+                self._remember(pid, player)
+        self._compacting = dict()
+
+
+if __name__ == '__main__':
+    print(__doc__)
@@ -0,0 +1,204 @@
+"""
+Incrementally maintained leaderboards of the bot players
+
+Player records only improve (become smaller), so every board keeps just
+the best `size` entries sorted by value: an improved record is inserted
+in O(size) and reading the top-K costs O(K). Equal values are ranked by
+who got the result first.
+
+Ranks of all the players are answered in O(log n) by a Fenwick tree of
+counts over the values 0..limit (settings.RANK_STEPS_LIMIT and
+RANK_TIME_LIMIT), larger values share the last slot. Equal values share
+the same rank: 1 + number of players with a better result. The tree keeps
+only the counts: values_at() tells the values (low, high) of the slot of
+a rank (high is None for the last slot) and player_in_top() finds such a
+player in the top-K entries, the storage looks for the other ones (see
+src.players). All the methods are thread safe. share_ranks() places the
+Fenwick trees into the given buffers (shared memory of the src.shards
+workers), so the other processes can count ranks by rank_index(board,
+buffer, clear=False).
+
+Boards are named after Player attributes:
+    best_steps, best_time, best_steps_hard, best_time_hard
+
+Leaderboard methods:
+    extend(board: str, entries: [(value, id)...], names) -> None
+    player_in_top(board: str, low: int, high: int) -> int or None
+    rank(board: str, value: int) -> (rank, total)
+    top(board: str, k: int) -> [(name, value)...]
+    update(pid: int, name: str, board: str, value: int, previous: int)
+    values_at(board: str, rank: int) -> (low, high)
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import threading
+from array import array
+from bisect import insort
+from itertools import count
+
+from src.config import RANK_STEPS_LIMIT, RANK_TIME_LIMIT
+
+BOARDS = ("best_steps", "best_time", "best_steps_hard", "best_time_hard")
+_LIMITS = {
+    "best_steps": RANK_STEPS_LIMIT,
+    "best_time": RANK_TIME_LIMIT,
+    "best_steps_hard": RANK_STEPS_LIMIT,
+    "best_time_hard": RANK_TIME_LIMIT,
+}
+_SHARED_TREES = {}  # board -> memoryview, set by share_ranks()
+
+
+def tree_size(board: str) -> int:
+    return _LIMITS[board] + 2
+
+
+def rank_index(board: str, tree: memoryview = None,
+               clear: bool = True) -> "RankIndex":
+    return RankIndex(_LIMITS[board], tree, clear)
+
+
+def share_ranks(trees: dict) -> None:
+    _SHARED_TREES.update(trees)
+
+
+class TopK:
+    def __init__(self, size: int) -> None:
+        self._size = size
+        self._entries = []  # sorted (value, sequence, pid, name)
+        self._sequence = count()
+
+    def top(self, k: int) -> list:
+        return [(name, value) for value, _, _, name in self._entries[:k]]
+
+    def player_in(self, low: int, high: int) -> int:
+        for value, _, pid, _ in self._entries:
+            if low <= value and (high is None or value <= high):
+                return pid
+        return None
+
+    def update(self, pid: int, name: str, value: int) -> None:
+        entries = self._entries
+        if len(entries) == self._size and value >= entries[-1][0]:
+            return
+        for i, entry in enumerate(entries):
+            if entry[2] == pid:
+                del entries[i]
+                break
+        insort(entries, (value, next(self._sequence), pid, name))
+        del entries[self._size:]
+
+
+class RankIndex:
+    def __init__(self, limit: int, tree: memoryview = None,
+                 clear: bool = True) -> None:
+        self._limit = limit
+        self._tree = array("q", bytes(8 * (limit + 2)))
+        if tree is not None:
+            if clear:
+                tree[:] = self._tree
+            self._tree = tree
+        self.total = 0
+
+    def _slot(self, value: int) -> int:
+        return min(value, self._limit) + 1
+
+    def _add(self, slot: int, delta: int) -> None:
+        tree = self._tree
+        while slot < len(tree):
+            tree[slot] += delta
+            slot += slot & -slot
+
+    def _prefix(self, slot: int) -> int:
+        tree = self._tree
+        result = 0
+        while slot > 0:
+            result += tree[slot]
+            slot -= slot & -slot
+        return result
+
+    def extend(self, entries) -> None:
+        # bulk load of (value, pid) into an empty index in O(n + limit)
+        tree = self._tree
+        for value, _ in entries:
+            tree[self._slot(value)] += 1
+            self.total += 1
+        for slot in range(1, len(tree)):
+            parent = slot + (slot & -slot)
+            if parent < len(tree):
+                tree[parent] += tree[slot]
+
+    def move(self, previous: int, value: int) -> None:
+        if previous is not None:
+            self._add(self._slot(previous), -1)
+            self.total -= 1
+        self._add(self._slot(value), 1)
+        self.total += 1
+
+    def rank(self, value: int) -> int:
+        return self._prefix(self._slot(value) - 1) + 1
+
+    def count(self) -> int:
+        return self._prefix(len(self._tree) - 1)
+
+    def values_at(self, rank: int) -> tuple:
+        if not 1 <= rank <= self.total:
+            raise IndexError(f"{rank=} out of range 1..{self.total}")
+        slot = 0
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            if slot + step < len(self._tree) and self._tree[slot + step] < rank:
+                slot += step
+                rank -= self._tree[slot]
+            step >>= 1
+        if slot == self._limit:  # the last slot of the larger values
+            return slot, None
+        return slot, slot
+
+
+class Leaderboard:
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._boards = {board: TopK(size) for board in BOARDS}
+        self._ranks = {
+            board: rank_index(board, _SHARED_TREES.get(board))
+            for board in BOARDS
+        }
+        self._lock = threading.Lock()
+
+    def extend(self, board: str, entries: list, names) -> None:
+        with self._lock:
+            top = self._boards[board]
+            for value, pid in entries[:self.size]:
+                top.update(pid, names(pid), value)
+            self._ranks[board].extend(entries)
+
+    def player_in_top(self, board: str, low: int, high: int) -> int:
+        with self._lock:
+            return self._boards[board].player_in(low, high)
+
+    def rank(self, board: str, value: int) -> tuple:
+        index = self._ranks[board]
+        with self._lock:
+            return index.rank(value), index.total
+
+    def top(self, board: str, k: int) -> list:
+        with self._lock:
+            return self._boards[board].top(k)
+
+    def update(
+            self, pid: int, name: str, board: str, value: int,
+            previous: int = None,
+    ) -> None:
+        with self._lock:
+            self._boards[board].update(pid, name, value)
+            self._ranks[board].move(previous, value)
+
+    def values_at(self, board: str, rank: int) -> tuple:
+        with self._lock:
+            return self._ranks[board].values_at(rank)
+
+
+if __name__ == "__main__":
+    print(__doc__)
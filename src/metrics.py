@@ -0,0 +1,252 @@
+"""
+Built-in metrics of ColdHotGame bot in the Prometheus text format
+
+Histograms and gauges are created once (at import time, the handler ones
+on the first call for every bot) and keep their values in preallocated
+arrays, so observing a value only bumps counters. Handlers decorated by
+timed() are measured on every settings.METRICS_SAMPLE call (1 measures all
+of them), labelled by the handler and by the metrics_labels of the object
+they are the methods of (the bot of a src.game.Game when several are
+hosted). Counters are updated without locks by several threads, a rare
+lost increment is accepted for the speed.
+
+start() serves the metrics at http://METRICS_HOST:METRICS_PORT/metrics,
+a port which cannot be bound is logged and the bot runs without them.
+With profiling enabled it also serves:
+    /profile?seconds=10 - cProfile of the timed handlers for the period
+    /tracemalloc?seconds=10 - top memory allocations during the period
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import cProfile
+import io
+import logging
+import pstats
+import threading
+import time
+import tracemalloc
+from array import array
+from bisect import bisect_left
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from src.config import METRICS_HOST, METRICS_PORT, METRICS_SAMPLE
+
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+SIZE_BUCKETS = tuple(256 * 4 ** i for i in range(10))  # 256 bytes..64 MB
+_PROFILE_TOP = 40
+_metrics = []  # in the order of creation
+_profiles = None  # thread id -> cProfile.Profile while profiling
+_profiles_lock = threading.Lock()
+
+
+class Histogram:
+    __slots__ = (
+        "name", "help", "labels", "buckets", "counts", "sum", "sample",
+        "calls",
+    )
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: str = "",
+                 buckets: tuple = LATENCY_BUCKETS, sample: int = 1) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.counts = array("q", bytes(8 * (len(buckets) + 1)))
+        self.sum = 0.0
+        self.sample = sample
+        self.calls = 0
+        _metrics.append(self)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def render(self) -> list:
+        labels = f"{self.labels}," if self.labels else ""
+        lines = []
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            lines.append(f'{self.name}_bucket{{{labels}le="{bound}"}} {total}')
+        total += self.counts[-1]
+        lines.append(f'{self.name}_bucket{{{labels}le="+Inf"}} {total}')
+        suffix = f"{{{self.labels}}}" if self.labels else ""
+        lines.append(f"{self.name}_sum{suffix} {self.sum}")
+        lines.append(f"{self.name}_count{suffix} {total}")
+        return lines
+
+
+class Gauge:
+    __slots__ = ("name", "help", "labels", "kind", "value", "function")
+
+    def __init__(self, name: str, help: str, labels: str = "",
+                 function=None, kind: str = "gauge") -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.kind = kind
+        self.value = 0
+        self.function = function
+        _metrics.append(self)
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def render(self) -> list:
+        value = self.value if self.function is None else self.function()
+        suffix = f"{{{self.labels}}}" if self.labels else ""
+        return [f"{self.name}{suffix} {value}"]
+
+
+def timed(handler: str):
+    handler_label = f'handler="{handler}"'
+    histograms = dict()  # metrics_labels of the owner -> Histogram
+    lock = threading.Lock()
+
+    def histogram_of(owner) -> Histogram:
+        labels = getattr(owner, "metrics_labels", "")
+        histogram = histograms.get(labels)
+        if histogram is None:
+            with lock:
+                histogram = histograms.get(labels)
+                if histogram is None:
+                    histogram = histograms[labels] = Histogram(
+                        "coldhot_handler_seconds",
+                        "Handler latency in seconds",
+                        ",".join(filter(None, (handler_label, labels))),
+                        sample=METRICS_SAMPLE)
+        return histogram
+
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args):
+            if _profiles is not None:
+                return _profile(function, args)
+            histogram = histogram_of(args[0])
+            histogram.calls += 1
+            if histogram.calls % histogram.sample:
+                return function(*args)
+            start = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def render() -> str:
+    families = dict()  # name -> metrics, all the labels of a name together
+    for metric in _metrics:
+        families.setdefault(metric.name, []).append(metric)
+    lines = []
+    for name, family in families.items():
+        help = next((metric.help for metric in family if metric.help), "")
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {family[0].kind}")
+        for metric in family:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                logging.warning(f"Metric {name} error {e}")
+    return "\n".join(lines) + "\n"
+
+
+def _profile(function, args):
+    profiles = _profiles
+    if profiles is None:
+        return function(*args)
+    thread = threading.get_ident()
+    profile = profiles.get(thread)
+    if profile is None:
+        with _profiles_lock:
+            profile = profiles[thread] = cProfile.Profile()
+    return profile.runcall(function, *args)
+
+
+def profile(seconds: float) -> str:
+    global _profiles
+    with _profiles_lock:
+        if _profiles is not None:
+            return "Profiling is already running\n"
+        _profiles = dict()
+    time.sleep(seconds)
+    with _profiles_lock:
+        profiles, _profiles = _profiles, None
+    time.sleep(1)  # let the handlers in progress finish
+    if not profiles:
+        return "No handler was called\n"
+    output = io.StringIO()
+    stats = pstats.Stats(*profiles.values(), stream=output)
+    stats.sort_stats("cumulative").print_stats(_PROFILE_TOP)
+    return output.getvalue()
+
+
+def trace_memory(seconds: float) -> str:
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    time.sleep(seconds)
+    after = tracemalloc.take_snapshot()
+    if started:
+        tracemalloc.stop()
+    lines = [str(stat) for stat in after.compare_to(before, "lineno")]
+    return "\n".join(lines[:_PROFILE_TOP]) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query))
+        if url.path == "/metrics":
+            self._answer(render(), "text/plain; version=0.0.4")
+        elif url.path in ("/profile", "/tracemalloc") and self.server.profiling:
+            try:
+                seconds = min(float(params.get("seconds", 10)), 600)
+            except ValueError:
+                self.send_error(400)
+                return
+            action = profile if url.path == "/profile" else trace_memory
+            self._answer(action(seconds), "text/plain")
+        else:
+            self.send_error(404)
+
+    def _answer(self, text: str, content_type: str) -> None:
+        body = text.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def start(host: str = METRICS_HOST, port: int = METRICS_PORT,
+          profiling: bool = False) -> ThreadingHTTPServer:
+    try:
+        server = ThreadingHTTPServer((host, port), _Handler)
+    except OSError as e:
+        logging.error(f"Metrics are not served on {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    server.profiling = profiling
+    threading.Thread(
+        target=server.serve_forever, daemon=True, name="metrics").start()
+    host, port = server.server_address[:2]
+    logging.info(f"Metrics served on http://{host}:{port}/metrics")
+    return server
+
+
+if __name__ == "__main__":
+    print(__doc__)
@@ -0,0 +1,121 @@
+"""
+Background group commit of the changed players
+
+Handlers only mark a changed player as dirty, a background thread saves
+all the dirty players with one Players.save_many() call every
+settings.SAVE_INTERVAL seconds or as soon as SAVE_BATCH players are dirty.
+A player changed several times between the flushes is written once. So
+the replies never wait for the disk, at the price of losing up to
+SAVE_INTERVAL seconds of results on a crash; stop() makes the final flush.
+Dirty players are pinned in the storage, so a backend with a players cache
+does not evict them and read a stale copy back before they are saved.
+With SAVE_INTERVAL = 0 mark() saves the player at once as before.
+
+Every flush is logged with its records count and latency, stats() returns
+the totals.
+
+Persister methods:
+    flush() -> int
+    mark(id: int, player: Player = None) -> None
+    start() -> None
+    stats() -> dict
+    stop() -> None
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import logging
+import threading
+import time
+
+from src.config import SAVE_BATCH, SAVE_INTERVAL
+
+
+class Persister:
+    def __init__(self, players, interval: float = SAVE_INTERVAL,
+                 batch: int = SAVE_BATCH) -> None:
+        self._players = players
+        self._interval = interval
+        self._batch = batch
+        self._dirty = dict()  # id -> Player
+        self._changed = threading.Condition()
+        self._flushing = threading.Lock()
+        self._running = False
+        self._thread = threading.Thread(
+            target=self._work, daemon=True, name="persister")
+        self.flushes = self.records = self.max_records = 0
+        self.latency = self.max_latency = 0.0
+
+    def start(self) -> None:
+        if self._interval > 0:
+            self._running = True
+            self._thread.start()
+
+    def stop(self) -> None:
+        with self._changed:
+            self._running = False
+            self._changed.notify()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.flush()
+        logging.info(f"Persister stopped, {self.stats()}")
+
+    def stats(self) -> dict:
+        return {
+            "dirty": len(self._dirty), "flushes": self.flushes,
+            "records": self.records, "max_records": self.max_records,
+            "latency": self.latency, "max_latency": self.max_latency,
+        }
+
+    def mark(self, pid: int, player=None) -> None:
+        if player is None:
+            player = self._players[pid]
+        if not self._running:
+            self._players.save_many({pid: player})
+            return
+        with self._changed:
+            self._players.pin(pid, player)
+            self._dirty[pid] = player
+            if len(self._dirty) >= self._batch:
+                self._changed.notify()
+
+    def flush(self) -> int:
+        with self._flushing:
+            with self._changed:
+                dirty, self._dirty = self._dirty, dict()
+            if not dirty:
+                return 0
+            start = time.perf_counter()
+            self._players.save_many(dirty)
+            latency = time.perf_counter() - start
+            with self._changed:
+                self._players.unpin(
+                    pid for pid in dirty if pid not in self._dirty)
+        self.flushes += 1
+        self.records += len(dirty)
+        self.max_records = max(self.max_records, len(dirty))
+        self.latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        logging.info(
+            f"Players flushed records={len(dirty)} "
+            f"in {latency * 1000:.1f} ms")
+        return len(dirty)
+
+    def _work(self) -> None:
+        while True:
+            with self._changed:
+                self._changed.wait_for(
+                    lambda: not self._running
+                    or len(self._dirty) >= self._batch,
+                    self._interval)
+                if not self._running:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                logging.exception(f"Players flush error {e}")
+
+
+if __name__ == "__main__":
+    print(__doc__)
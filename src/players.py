@@ -3,11 +3,7 @@ Bots Player and Players classes
 
 Player attributes:
     name: str,
-    # Active game status
-    start_time: int
-    hard_mode: bool
-    guess_number: int
-    steps_count: int
+    escaped_name: str - MarkdownV2 escaped name, refreshed when name is set
     # Player statistics
     games_played: int
     best_time: int
@@ -16,48 +12,141 @@ Player attributes:
     hard_best_time: int
     hard_best_steps: int
 
+Games in progress are kept by src.sessions.Sessions.
+
+Player keeps its attributes in __slots__; pickles and JSON use the
+attributes dictionary returned by __getstate__(), so databases written
+before are read as is (the former active game attributes are ignored).
+The leaderboards keep the escaped names, get_top() returns them ready to
+be put into a message.
+
 Player methods:
-    init_game(number: int, time: int, hard_mode: bool)
-    increase_games_count()
-    is_game_started() -> bool
-    reset_game()
-    set_best_time(time: int) -> bool
-    set_best_steps(steps: int) -> bool
+    increase_games_count(hard_mode: bool)
+    set_best_time(time: int, hard_mode: bool) -> bool
+    set_best_steps(steps: int, hard_mode: bool) -> bool
     was_games_played() -> bool
 
 
+BasePlayers is the storage backend interface, Players is the pickle backend,
+src.sqlite_players.SqlitePlayers is the SQLite one and
+src.indexed_players.IndexedPlayers loads the players lazily from an indexed
+file. create_players() returns the backend selected by
+settings.PLAYERS_BACKEND. Every bot hosted in the process (see src.bot)
+keeps its players in its own namespace of the same backend: the files of
+the pickle and indexed backends get the "<namespace>." prefix by
+namespaced(), the SQLite backend keeps them in the "players_<namespace>"
+table of the shared database. The empty namespace is the former storage.
+
 Players methods:
-    add_new_player(id: int, name: str) -> None
+    add_many(players: {id: Player}) -> int
+    add_new(id: int, name: str) -> None
+    get_player_at(board: str, rank: int) -> id
+    get_rank(id: int, board: str) -> (rank, total) or None
+    get_top(board: str, k: int) -> [(name, value)...]
     get_top3_steps() -> [(name, steps)...]
     get_top3_time() -> [(name, time)...]
     get_top3_hard_steps() -> [(name, steps)...]
     get_top3_hard_time() -> [(name, time)...]
     is_exist(id: int) -> bool
-    is_game_started(id: int) -> bool
+    items(first: int = None, last: int = None) -> (id, Player) generator
     load(),
-    save()
+    pin(id: int, player: Player) -> None
+    save(id: int = None)
+    save_many(players: {id: Player}) -> None
+    set_best_time(id: int, time: int, hard_mode: bool) -> bool
+    set_best_steps(id: int, steps: int, hard_mode: bool) -> bool
+    unpin(ids) -> None
     was_games_played(id: int) -> bool
 
+Players are persisted as a pickle snapshot plus an append-only journal.
+save(id) appends a single player record to the journal, save_many() appends
+a batch of records with one write. save() without arguments (or a journal
+longer than PLAYERS_JOURNAL_LIMIT records) compacts the journal into a new
+snapshot. load() replays the snapshot and then the
+journal, dropping a torn record left by a crash in the middle of a write.
+Players are safe to use from several threads as long as every player is
+changed by one thread at a time: the snapshot is serialized in memory under
+the lock and written to the disk while the other threads keep journaling
+into a new journal, the previous one is kept until the snapshot is stored.
+An old journal left by a crash before its snapshot was stored is not in
+any snapshot yet, so the journal is appended to it instead of replacing it.
+
+items() walks the players with the ids in first..last (inclusive, None is
+unbounded) in the storage order without taking all of them into memory
+(the pickle backend, which keeps all of them in memory anyway, walks a
+copy of its ids). add_many() adds the players which are not in the
+storage yet with one batch save and returns their number; both are used
+by the streaming export and import of src.transfer.
+
+Leaderboards and ranks are kept by src.leaderboard.Leaderboard: it is
+rebuilt on load() and updated by Players.set_best_time() and
+set_best_steps(), which call the Player ones and pass the improved record
+with the player id to the leaderboard, so a player keeps no reference to
+its storage. get_player_at() takes the values of the rank from the
+leaderboard and the player from its top-K entries or else from the first
+player with such a value met by items() (by an indexed query in the
+SQLite backend).
+
 ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
 mtrineyev@gmail.com
 """
 
 import json
 import logging
+import os
 import pickle
-
-from settings import PLAYERS_FILE_NAME
+import shutil
+import struct
+import threading
+import time
+import zlib
+
+from src.config import (
+    LEADERS_TOP_SIZE, PLAYERS_BACKEND, PLAYERS_FILE_NAME, PLAYERS_JOURNAL_LIMIT,
+)
+from src import metrics
+from src.leaderboard import BOARDS, Leaderboard
+from src.utils import escape_markdown
 
 _INFINITY = 9223372036854775807
+_JOURNAL_FILE_NAME = f"{PLAYERS_FILE_NAME}.journal"
+_OLD_JOURNAL_FILE_NAME = f"{_JOURNAL_FILE_NAME}.old"
+_RECORD_HEADER = struct.Struct("<II")  # payload length, payload crc32
+_SAVE_SECONDS = metrics.Histogram(
+    "coldhot_players_save_seconds", "Duration of a players save in seconds",
+    'kind="journal"')
+_SAVE_BYTES = metrics.Histogram(
+    "coldhot_players_save_bytes", "Size of a players save in bytes",
+    'kind="journal"', metrics.SIZE_BUCKETS)
+_SNAPSHOT_SECONDS = metrics.Histogram(
+    "coldhot_players_save_seconds", "", 'kind="snapshot"')
+_SNAPSHOT_BYTES = metrics.Histogram(
+    "coldhot_players_save_bytes", "", 'kind="snapshot"', metrics.SIZE_BUCKETS)
+_LOAD_SECONDS = metrics.Gauge(
+    "coldhot_players_load_seconds", "Duration of the players load in seconds")
+_LOAD_BYTES = metrics.Gauge(
+    "coldhot_players_load_bytes", "Size of the loaded players files in bytes")
+
+
+def _files_size(*file_names: str) -> int:
+    return sum(
+        os.path.getsize(file_name) for file_name in file_names
+        if os.path.exists(file_name))
+
+
+def _in_range(pid: int, first: int = None, last: int = None) -> bool:
+    return (first is None or pid >= first) and (last is None or pid <= last)
 
 
 class Player:
+    __slots__ = (
+        "_name", "escaped_name", "games_played", "best_time", "best_steps",
+        "games_played_hard", "best_time_hard", "best_steps_hard",
+    )
+    _FIELDS = ("name",) + __slots__[2:]
+
     def __init__(self, name: str) -> None:
         self.name = name
-        self.number_to_guess = 0
-        self.start_time = 0
-        self.hard_mode = False
-        self.steps_count = 0
         self.games_played = 0
         self.best_time = _INFINITY
         self.best_steps = _INFINITY
@@ -65,23 +154,31 @@ class Player:
         self.best_time_hard = _INFINITY
         self.best_steps_hard = _INFINITY
 
-    def __str__(self) -> str:
-        return json.dumps(self.__dict__, indent=2, ensure_ascii=False)
+    def __getstate__(self) -> dict:
+        return {field: getattr(self, field) for field in self._FIELDS}
 
-    def init_game(self, number: int, time: int, hard_mode: bool) -> None:
-        self.number_to_guess = number
-        self.start_time = time
-        self.hard_mode = hard_mode
-        self.steps_count = 0
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["name"])
+        for field in self._FIELDS[1:]:
+            if field in state:
+                value = state[field]
+                # share one object instead of a 36 bytes int per attribute
+                setattr(self, field, _INFINITY if value == _INFINITY else value)
 
-    def reset_game(self) -> None:
-        self.init_game(0, 0, False)
+    def __str__(self) -> str:
+        return json.dumps(self.__getstate__(), indent=2, ensure_ascii=False)
 
-    def is_game_started(self) -> bool:
-        return bool(self.number_to_guess)
+    @property
+    def name(self) -> str:
+        return self._name
 
-    def set_best_time(self, time: int) -> bool:
-        if self.hard_mode:
+    @name.setter
+    def name(self, name: str) -> None:
+        self._name = name
+        self.escaped_name = escape_markdown(name)  # the same str if unchanged
+
+    def set_best_time(self, time: int, hard_mode: bool) -> bool:
+        if hard_mode:
             if time < self.best_time_hard:
                 self.best_time_hard = time
                 return True
@@ -91,8 +188,8 @@ class Player:
             return True
         return False
 
-    def set_best_steps(self, steps: int) -> bool:
-        if self.hard_mode:
+    def set_best_steps(self, steps: int, hard_mode: bool) -> bool:
+        if hard_mode:
             if steps < self.best_steps_hard:
                 self.best_steps_hard = steps
                 return True
@@ -102,8 +199,8 @@ class Player:
             return True
         return False
 
-    def increase_games_count(self) -> None:
-        if self.hard_mode:
+    def increase_games_count(self, hard_mode: bool) -> None:
+        if hard_mode:
             self.games_played_hard += 1
         else:
             self.games_played += 1
@@ -112,96 +209,361 @@ class Player:
         return bool(self.games_played or self.games_played_hard)
 
 
-class Players:
+class BasePlayers:
     class _Encoder(json.JSONEncoder):
         def default(self, o):
-            return o.__dict__
+            return o.__getstate__()
 
     def __init__(self) -> None:
-        self._players = dict()
+        self._leaderboard = Leaderboard(LEADERS_TOP_SIZE)
+        self._lock = threading.RLock()
 
     def __iter__(self):
-        return iter(self._players)
+        raise NotImplementedError
 
     def __getitem__(self, key):
-        return self._players[key]
+        raise NotImplementedError
 
     def __len__(self) -> int:
-        return len(self._players)
+        raise NotImplementedError
 
     def __str__(self) -> str:
         return json.dumps(
-            self._players, indent=2, ensure_ascii=False, cls=self._Encoder)
+            {pid: self[pid] for pid in self},
+            indent=2, ensure_ascii=False, cls=self._Encoder)
 
     def add_new(self, pid: int, name: str) -> None:
-        if self.is_exist(pid):
-            raise KeyError(f"Player {pid=} already in the database")
-        self._players[pid] = Player(name)
+        raise NotImplementedError
+
+    def add_many(self, players: dict) -> int:
+        with self._lock:
+            new = {
+                pid: player for pid, player in players.items()
+                if not self.is_exist(pid)
+            }
+            for pid, player in new.items():
+                self._added(pid, player)
+        if new:
+            self.save_many(new)
+        return len(new)
+
+    def items(self, first: int = None, last: int = None):
+        raise NotImplementedError
+
+    def get_top(self, board: str, k: int = LEADERS_TOP_SIZE) -> list:
+        return self._leaderboard.top(board, k)
+
+    def get_rank(self, pid: int, board: str) -> tuple:
+        value = getattr(self[pid], board)
+        if value == _INFINITY:
+            return None
+        return self._leaderboard.rank(board, value)
+
+    def get_player_at(self, board: str, rank: int) -> int:
+        low, high = self._leaderboard.values_at(board, rank)
+        pid = self._leaderboard.player_in_top(board, low, high)
+        return self._find(board, low, high) if pid is None else pid
+
+    def set_best_time(self, pid: int, time: int, hard_mode: bool) -> bool:
+        return self._improve(
+            pid, "best_time_hard" if hard_mode else "best_time",
+            Player.set_best_time, time, hard_mode)
+
+    def set_best_steps(self, pid: int, steps: int, hard_mode: bool) -> bool:
+        return self._improve(
+            pid, "best_steps_hard" if hard_mode else "best_steps",
+            Player.set_best_steps, steps, hard_mode)
 
     def get_top3_steps(self) -> list:
-        top = sorted(
-            [(v.name, v.best_steps) for v in self._players.values()
-             if v.best_steps != _INFINITY],
-            key=lambda x: x[1]
-        )
-        return top[:3]
+        return self.get_top("best_steps", 3)
 
     def get_top3_time(self) -> list:
-        top = sorted(
-            [(v.name, v.best_time) for v in self._players.values()
-             if v.best_time != _INFINITY],
-            key=lambda x: x[1]
-        )
-        return top[:3]
+        return self.get_top("best_time", 3)
 
     def get_top3_hard_steps(self) -> list:
-        top = sorted(
-            [(v.name, v.best_steps_hard) for v in self._players.values()
-             if v.best_steps_hard != _INFINITY],
-            key=lambda x: x[1]
-        )
-        return top[:3]
+        return self.get_top("best_steps_hard", 3)
 
     def get_top3_hard_time(self) -> list:
-        top = sorted(
-            [(v.name, v.best_time_hard) for v in self._players.values()
-             if v.best_time_hard != _INFINITY],
-            key=lambda x: x[1]
-        )
-        return top[:3]
+        return self.get_top("best_time_hard", 3)
 
     def is_exist(self, pid: int) -> bool:
-        return pid in self._players
-
-    def is_game_started(self, pid: int) -> bool:
-        if self.is_exist(pid):
-            return self._players[pid].is_game_started()
-        return False
+        raise NotImplementedError
 
     def was_games_played(self, pid: int) -> bool:
         if self.is_exist(pid):
-            return self._players[pid].was_games_played()
+            return self[pid].was_games_played()
         return False
 
     def load(self) -> None:
+        raise NotImplementedError
+
+    def save(self, pid: int = None) -> None:
+        raise NotImplementedError
+
+    def save_many(self, players: dict) -> None:
+        raise NotImplementedError
+
+    def pin(self, pid: int, player: Player) -> None:
+        pass
+
+    def unpin(self, pids) -> None:
+        pass
+
+    def _added(self, pid: int, player: Player) -> None:
+        self._rank(pid, player)
+
+    def _find(self, board: str, low: int, high: int) -> int:
+        high = _INFINITY - 1 if high is None else high
+        for pid, player in self.items():
+            if low <= getattr(player, board) <= high:
+                return pid
+        raise KeyError(f"No player of {board=} in {low}..{high}")
+
+    def _improve(self, pid: int, board: str, setter, value: int,
+                 hard_mode: bool) -> bool:
+        player = self[pid]
+        previous = getattr(player, board)
+        if not setter(player, value, hard_mode):
+            return False
+        self._record(
+            pid, player.escaped_name, board, value,
+            None if previous == _INFINITY else previous)
+        return True
+
+    def _record(self, pid: int, name: str, board: str, value: int,
+                previous: int = None) -> None:
+        self._leaderboard.update(pid, name, board, value, previous)
+
+    def _rank(self, pid: int, player: Player) -> None:
+        for board in BOARDS:
+            value = getattr(player, board)
+            if value != _INFINITY:
+                self._leaderboard.update(
+                    pid, player.escaped_name, board, value)
+
+
+class Players(BasePlayers):
+    _file_name = PLAYERS_FILE_NAME
+    _journal_file_name = _JOURNAL_FILE_NAME
+    _old_journal_file_name = _OLD_JOURNAL_FILE_NAME
+
+    def __init__(self, namespace: str = "") -> None:
+        super().__init__()
+        self.namespace = namespace
+        self._file_name = namespaced(self._file_name, namespace)
+        self._journal_file_name = namespaced(
+            self._journal_file_name, namespace)
+        self._old_journal_file_name = namespaced(
+            self._old_journal_file_name, namespace)
+        self._players = dict()
+        self._journal = None
+        self._journal_records = 0
+        self._compaction = threading.Lock()
+
+    def __iter__(self):
+        return iter(self._players)
+
+    def __getitem__(self, key):
+        return self._players[key]
+
+    def __len__(self) -> int:
+        return len(self._players)
+
+    def __str__(self) -> str:
+        return json.dumps(
+            self._players, indent=2, ensure_ascii=False, cls=self._Encoder)
+
+    def add_new(self, pid: int, name: str) -> None:
+        with self._lock:
+            if self.is_exist(pid):
+                raise KeyError(f"Player {pid=} already in the database")
+            self._players[pid] = Player(name)
+
+    def is_exist(self, pid: int) -> bool:
+        return pid in self._players
+
+    def items(self, first: int = None, last: int = None):
+        with self._lock:
+            pids = list(self._players)  # not changed while walked
+        for pid in pids:
+            if not _in_range(pid, first, last):
+                continue
+            player = self._players.get(pid)
+            if player is not None:
+                yield pid, player
+
+    def load(self) -> None:
+        start = time.perf_counter()
         try:
-            with open(PLAYERS_FILE_NAME, "rb") as bf:
+            with open(self._file_name, "rb") as bf:
                 self._players = pickle.load(bf)
         except (
                 FileNotFoundError, PermissionError,
                 OSError, ModuleNotFoundError,
         ) as e:
             logging.warning(
-                f"{PLAYERS_FILE_NAME=} reading error {e}. "
+                f"{self._file_name=} reading error {e}. "
                 "Used empty dictionary."
             )
-
-    def save(self) -> None:
+        self._journal_records = (
+            self._replay_journal(self._old_journal_file_name)
+            + self._replay_journal(self._journal_file_name)
+        )
+        self._leaderboard = Leaderboard(LEADERS_TOP_SIZE)
+        for pid, player in self._players.items():
+            self._rank(pid, player)
+        _LOAD_SECONDS.set(time.perf_counter() - start)
+        _LOAD_BYTES.set(_files_size(
+            self._file_name, self._journal_file_name))
+
+    def save(self, pid: int = None) -> None:
+        if pid is None:
+            self._compact(force=True)
+        else:
+            self.save_many({pid: self[pid]})
+
+    def save_many(self, players: dict) -> None:
+        if self._journal_records >= PLAYERS_JOURNAL_LIMIT:
+            self._compact(force=False)
+        start = time.perf_counter()
+        records = []
+        for pid, player in players.items():
+            payload = pickle.dumps((pid, player))
+            records.append(_RECORD_HEADER.pack(
+                len(payload), zlib.crc32(payload)))
+            records.append(payload)
+        data = b"".join(records)
+        with self._lock:
+            try:
+                if self._journal is None:
+                    self._journal = open(self._journal_file_name, "ab")
+                self._journal.write(data)
+                self._journal.flush()
+                self._journal_records += len(players)
+                self._journaled(players)
+            except (IOError, OSError):
+                logging.error(f"{self._journal_file_name=} writing error")
+        _SAVE_SECONDS.observe(time.perf_counter() - start)
+        _SAVE_BYTES.observe(len(data))
+
+    def _replay_journal(self, file_name: str) -> int:
+        try:
+            with open(file_name, "rb") as bf:
+                data = bf.read()
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            logging.warning(f"{file_name=} reading error {e}")
+            return 0
+        offset = 0
+        records = 0
+        while offset + _RECORD_HEADER.size <= len(data):
+            size, crc = _RECORD_HEADER.unpack_from(data, offset)
+            start = offset + _RECORD_HEADER.size
+            payload = data[start:start + size]
+            if len(payload) != size or zlib.crc32(payload) != crc:
+                break
+            try:
+                pid, player = pickle.loads(payload)
+            except (pickle.UnpicklingError, EOFError, ValueError):
+                break
+            self._players[pid] = player
+            offset = start + size
+            records += 1
+        if offset != len(data):
+            logging.warning(
+                f"{file_name=} torn record at {offset=}, "
+                f"{len(data) - offset} bytes dropped"
+            )
+            with open(file_name, "r+b") as bf:
+                bf.truncate(offset)
+        logging.info(f"{file_name=} replayed {records=}")
+        return records
+
+    def _compact(self, force: bool) -> None:
+        # Snapshot is taken and the journal is rotated under the lock,
+        # the snapshot is written while the other threads keep journaling.
+        if not self._compaction.acquire(blocking=force):
+            return
         try:
-            with open(PLAYERS_FILE_NAME, "wb") as bf:
-                pickle.dump(self._players, bf)
+            start = time.perf_counter()
+            with self._lock:
+                if not force and self._journal_records < PLAYERS_JOURNAL_LIMIT:
+                    return
+                snapshot = self._take_snapshot()
+                if self._journal is not None:
+                    self._journal.close()
+                    self._journal = None
+                self._rotate_journal()
+                self._journal_records = 0
+            temp_file_name = f"{self._file_name}.tmp"
+            with open(temp_file_name, "wb") as bf:
+                self._write_snapshot(bf, snapshot)
+                bf.flush()
+                os.fsync(bf.fileno())
+                size = bf.tell()
+            os.replace(temp_file_name, self._file_name)
+            with self._lock:
+                self._snapshot_stored()
+            _SNAPSHOT_SECONDS.observe(time.perf_counter() - start)
+            _SNAPSHOT_BYTES.observe(size)
+            if os.path.exists(self._old_journal_file_name):
+                os.remove(self._old_journal_file_name)
         except (IOError, OSError):
-            logging.error(f"{PLAYERS_FILE_NAME=} writing error")
+            logging.error(f"{self._file_name=} writing error")
+        finally:
+            self._compaction.release()
+
+    def _rotate_journal(self) -> None:
+        if not os.path.exists(self._journal_file_name):
+            return
+        if not os.path.exists(self._old_journal_file_name):
+            os.replace(self._journal_file_name, self._old_journal_file_name)
+            return
+        # the old journal of a crashed compaction is replayed before it
+        with open(self._journal_file_name, "rb") as source, open(
+                self._old_journal_file_name, "ab") as target:
+            shutil.copyfileobj(source, target)
+            target.flush()
+            os.fsync(target.fileno())
+        os.remove(self._journal_file_name)
+
+    def _added(self, pid: int, player: Player) -> None:
+        self._players[pid] = player
+        self._rank(pid, player)
+
+    def _journaled(self, players: dict) -> None:
+        pass
+
+    def _take_snapshot(self):
+        return pickle.dumps(self._players)
+
+    def _write_snapshot(self, bf, snapshot) -> None:
+        bf.write(snapshot)
+
+    def _snapshot_stored(self) -> None:
+        pass
+
+
+def namespaced(file_name: str, namespace: str) -> str:
+    if not namespace:
+        return file_name
+    directory, name = os.path.split(file_name)
+    return os.path.join(directory, f"{namespace}.{name}")
+
+
+def create_players(namespace: str = "") -> BasePlayers:
+    if namespace and not namespace.isidentifier():
+        raise ValueError(f"Players {namespace=} is not an identifier")
+    if PLAYERS_BACKEND == "sqlite":
+        from src.sqlite_players import SqlitePlayers
+        return SqlitePlayers(namespace)
+    if PLAYERS_BACKEND == "indexed":
+        from src.indexed_players import IndexedPlayers
+        return IndexedPlayers(namespace)
+    if PLAYERS_BACKEND != "pickle":
+        raise ValueError(f"Unknown {PLAYERS_BACKEND=}")
+    return Players(namespace)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,278 @@
+"""
+Rate limited outbound message queue for ColdHotGame bot
+
+All the bot replies go through Sender. Every chat has its own FIFO queue
+and token bucket (settings.SEND_CHAT_RATE messages per second with bursts
+of SEND_CHAT_BURST), all chats share the global bucket of SEND_RATE
+messages per second. Among the chats ready to send the one with the most
+urgent message goes first: in-game hints before other replies and the
+flavour replies last. A message waiting over _AGING seconds per priority
+level overtakes the more urgent ones, so a steady stream of hints never
+starves the other replies. Queued messages of a chat are coalesced into one
+message while it fits MAX_MESSAGE_LENGTH UTF-16 code units (the length as
+counted by Telegram), the parts of a coalesced message which is not sent
+are sent again one by one. A 429 response puts the message back and pauses
+the chat for the retry_after seconds.
+
+When SEND_QUEUE_SIZE messages are queued new flavour replies are dropped,
+the other replies are always accepted. stats() returns the queue depth and
+the sent, coalesced, retried, dropped and failed counters, export_metrics()
+publishes them (labelled by the bot when several are hosted) with the send
+round-trip time to src.metrics.
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import heapq
+import logging
+import threading
+import time
+from collections import deque
+from itertools import count
+
+from src.config import (
+    SEND_CHAT_BURST, SEND_CHAT_RATE, SEND_QUEUE_SIZE, SEND_RATE, SEND_WORKERS,
+)
+from src import metrics
+
+HINT, REPLY, FLAVOUR = range(3)  # message priorities, the most urgent first
+MAX_MESSAGE_LENGTH = 4096
+_SEPARATOR = "\n\n"
+_SWEEP_INTERVAL = 60
+_AGING = 1.0  # seconds of waiting worth one priority level
+_SEND_SECONDS = metrics.Histogram(
+    "coldhot_send_seconds", "send_message round-trip time in seconds")
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def delay(self, now: float) -> float:
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+
+def _length(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+
+class _Chat:
+    __slots__ = (
+        "messages", "bucket", "not_before", "scheduled", "busy", "separate")
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.messages = deque()  # (priority, text)
+        self.bucket = TokenBucket(rate, burst)
+        self.not_before = 0.0
+        self.scheduled = False
+        self.busy = False
+        self.separate = 0  # messages to send without coalescing
+
+
+class Sender:
+    def __init__(self, send, rate: float = SEND_RATE,
+                 chat_rate: float = SEND_CHAT_RATE,
+                 chat_burst: float = SEND_CHAT_BURST,
+                 queue_size: int = SEND_QUEUE_SIZE,
+                 workers: int = SEND_WORKERS) -> None:
+        self._send = send
+        self._bucket = TokenBucket(rate, rate)
+        self._chat_rate = chat_rate
+        self._chat_burst = chat_burst
+        self._queue_size = queue_size
+        self._chats = dict()
+        self._ready = []  # heap of (aged priority, sequence, chat_id)
+        self._waiting = []  # heap of (ready time, sequence, chat_id)
+        self._sequence = count()
+        self._changed = threading.Condition()
+        self._running = False
+        self._swept = time.monotonic()
+        self._workers = [
+            threading.Thread(target=self._work, daemon=True, name=f"sender-{i}")
+            for i in range(workers)
+        ]
+        self.coalesce = True
+        self.depth = 0
+        self.sent = self.coalesced = self.retried = 0
+        self.dropped = self.failed = 0
+
+    def set_limits(self, rate: float, chat_rate: float,
+                   chat_burst: float) -> None:
+        with self._changed:
+            self._bucket = TokenBucket(rate, rate)
+            self._chat_rate = chat_rate
+            self._chat_burst = chat_burst
+            for chat in self._chats.values():
+                chat.bucket = TokenBucket(chat_rate, chat_burst)
+
+    def start(self) -> None:
+        self._running = True
+        for worker in self._workers:
+            worker.start()
+
+    def stop(self, timeout: float = 10) -> None:
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            self._changed.wait_for(
+                lambda: not self.depth, deadline - time.monotonic())
+            self._running = False
+            self._changed.notify_all()
+
+    def stats(self) -> dict:
+        with self._changed:
+            return {
+                "depth": self.depth, "chats": len(self._chats),
+                "sent": self.sent, "coalesced": self.coalesced,
+                "retried": self.retried, "dropped": self.dropped,
+                "failed": self.failed,
+            }
+
+    def put(self, chat_id: int, text: str, priority: int = REPLY) -> None:
+        with self._changed:
+            if self.depth >= self._queue_size and priority == FLAVOUR:
+                self.dropped += 1
+                return
+            chat = self._chats.get(chat_id)
+            if chat is None:
+                chat = self._chats[chat_id] = _Chat(
+                    self._chat_rate, self._chat_burst)
+            chat.messages.append((priority, text))
+            self.depth += 1
+            if not chat.scheduled and not chat.busy:
+                self._schedule(chat_id, chat)
+                self._changed.notify()
+
+    def _schedule(self, chat_id: int, chat: _Chat) -> None:
+        chat.scheduled = True
+        aged = time.monotonic() + chat.messages[0][0] * _AGING
+        heapq.heappush(self._ready, (aged, next(self._sequence), chat_id))
+
+    def _next(self):
+        while self._running:
+            now = time.monotonic()
+            while self._waiting and self._waiting[0][0] <= now:
+                _, _, chat_id = heapq.heappop(self._waiting)
+                self._schedule(chat_id, self._chats[chat_id])
+            if now - self._swept > _SWEEP_INTERVAL:
+                self._sweep(now)
+            if not self._ready:
+                timeout = self._waiting[0][0] - now if self._waiting else None
+                self._changed.wait(timeout)
+                continue
+            delay = self._bucket.delay(now)
+            if delay:
+                self._changed.wait(delay)
+                continue
+            _, _, chat_id = heapq.heappop(self._ready)
+            chat = self._chats[chat_id]
+            delay = max(chat.bucket.delay(now), chat.not_before - now)
+            if delay > 0:
+                heapq.heappush(
+                    self._waiting, (now + delay, next(self._sequence), chat_id))
+                continue
+            chat.scheduled = False
+            chat.busy = True
+            self._bucket.take()
+            chat.bucket.take()
+            priority, text = chat.messages.popleft()
+            parts = [text]
+            if chat.separate:
+                chat.separate -= 1
+            elif self.coalesce:
+                length = _length(text)
+                while chat.messages:
+                    length += len(_SEPARATOR) + _length(chat.messages[0][1])
+                    if length > MAX_MESSAGE_LENGTH:
+                        break
+                    parts.append(chat.messages.popleft()[1])
+            return chat_id, chat, priority, parts
+        return None
+
+    def _work(self) -> None:
+        while True:
+            with self._changed:
+                task = self._next()
+            if task is None:
+                return
+            chat_id, chat, priority, parts = task
+            text = _SEPARATOR.join(parts)
+            retry_after = None
+            failed = False
+            start = time.perf_counter()
+            try:
+                self._send(chat_id, text)
+            except Exception as e:
+                if getattr(e, "error_code", None) == 429:
+                    parameters = (getattr(e, "result_json", None) or {}).get(
+                        "parameters", {})
+                    retry_after = parameters.get("retry_after", 1)
+                else:
+                    failed = True
+                    logging.warning(f"Message to {chat_id=} is not sent: {e}")
+            _SEND_SECONDS.observe(time.perf_counter() - start)
+            with self._changed:
+                chat.busy = False
+                if retry_after is not None:
+                    self.retried += 1
+                    chat.messages.extendleft(
+                        (priority, part) for part in reversed(parts))
+                    chat.not_before = time.monotonic() + retry_after
+                    logging.warning(
+                        f"Sending to {chat_id=} paused for {retry_after=}")
+                elif failed and len(parts) > 1:
+                    chat.messages.extendleft(
+                        (priority, part) for part in reversed(parts))
+                    chat.separate = len(parts)
+                    logging.warning(
+                        f"{len(parts)} messages to {chat_id=} are sent "
+                        f"one by one")
+                else:
+                    self.depth -= len(parts)
+                    self.coalesced += len(parts) - 1
+                    if failed:
+                        self.failed += 1
+                    else:
+                        self.sent += 1
+                if chat.messages and not chat.scheduled:
+                    self._schedule(chat_id, chat)
+                self._changed.notify_all()
+
+    def _sweep(self, now: float) -> None:
+        self._swept = now
+        idle = []
+        for chat_id, chat in self._chats.items():
+            if chat.messages or chat.busy or chat.scheduled:
+                continue
+            chat.bucket.delay(now)
+            if chat.bucket.tokens >= chat.bucket.burst \
+                    and chat.not_before <= now:
+                idle.append(chat_id)
+        for chat_id in idle:
+            del self._chats[chat_id]
+
+
+def export_metrics(sender: Sender, labels: str = "") -> None:
+    metrics.Gauge(
+        "coldhot_send_queue_depth", "Messages waiting to be sent", labels,
+        function=lambda: sender.depth)
+    for counter in ("sent", "coalesced", "retried", "dropped", "failed"):
+        metrics.Gauge(
+            f"coldhot_messages_{counter}_total", f"Messages {counter}", labels,
+            function=lambda counter=counter: getattr(sender, counter),
+            kind="counter")
+
+
+if __name__ == "__main__":
+    print(__doc__)
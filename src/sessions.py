@@ -0,0 +1,167 @@
+"""
+Games in progress of the bot players
+
+Sessions are kept in a small in-memory table keyed by user id apart from
+the players statistics, so the in-game handlers never touch the players
+storage. A session which was not used for settings.SESSION_TTL seconds is
+evicted: deadlines are kept in a heap, a touched session is pushed back
+when its stale deadline pops, so every call costs O(log n) amortized.
+Evictions are logged. The table is thread safe, a session itself is
+expected to be used by one thread at a time. save() and load() keep the
+games in progress over a restart of the bot, the loaded file is removed.
+
+Session attributes:
+    number_to_guess: int
+    start_time: int
+    hard_mode: bool
+    steps_count: int
+    last_seen: float
+
+Sessions methods:
+    expire(now: float = None) -> int
+    get(id: int) -> Session or None
+    is_game_started(id: int) -> bool
+    peek(id: int) -> Session or None - does not refresh last_seen
+    load(file_name: str) -> int
+    save(file_name: str) -> int
+    start(id: int, number: int, time: int, hard_mode: bool) -> Session
+    stop(id: int) -> Session or None
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import heapq
+import logging
+import os
+import pickle
+import threading
+import time
+from itertools import count
+
+
+class Session:
+    __slots__ = (
+        "number_to_guess", "start_time", "hard_mode", "steps_count",
+        "last_seen",
+    )
+
+    def __init__(self, number: int, start_time: int, hard_mode: bool) -> None:
+        self.number_to_guess = number
+        self.start_time = start_time
+        self.hard_mode = hard_mode
+        self.steps_count = 0
+        self.last_seen = time.monotonic()
+
+
+class Sessions:
+    def __init__(self, ttl: float) -> None:
+        self._ttl = ttl
+        self._sessions = dict()
+        self._deadlines = []  # heap of (deadline, sequence, id, session)
+        self._sequence = count()
+        self._lock = threading.RLock()
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def expire(self, now: float = None) -> int:
+        now = time.monotonic() if now is None else now
+        deadlines = self._deadlines
+        evicted = 0
+        with self._lock:
+            while deadlines and deadlines[0][0] <= now:
+                _, _, pid, session = heapq.heappop(deadlines)
+                if self._sessions.get(pid) is not session:
+                    continue  # stopped or restarted game
+                deadline = session.last_seen + self._ttl
+                if deadline > now:
+                    self._push(deadline, pid, session)
+                else:
+                    del self._sessions[pid]
+                    evicted += 1
+            self.evicted += evicted
+        if evicted:
+            logging.info(
+                f"Sessions evicted {evicted=}, "
+                f"total {self.evicted}, active {len(self._sessions)}")
+        return evicted
+
+    def get(self, pid: int) -> Session:
+        self.expire()
+        session = self._sessions.get(pid)
+        if session is not None:
+            session.last_seen = time.monotonic()
+        return session
+
+    def is_game_started(self, pid: int) -> bool:
+        return self.get(pid) is not None
+
+    def peek(self, pid: int) -> Session:
+        session = self._sessions.get(pid)
+        if session is None or (
+                time.monotonic() - session.last_seen > self._ttl):
+            return None
+        return session
+
+    def start(self, pid: int, number: int, start_time: int,
+              hard_mode: bool) -> Session:
+        self.expire()
+        session = Session(number, start_time, hard_mode)
+        with self._lock:
+            self._sessions[pid] = session
+            self._push(session.last_seen + self._ttl, pid, session)
+        return session
+
+    def stop(self, pid: int) -> Session:
+        with self._lock:
+            return self._sessions.pop(pid, None)
+
+    def save(self, file_name: str) -> int:
+        now = time.monotonic()
+        with self._lock:
+            games = [
+                (pid, session.number_to_guess, session.start_time,
+                 session.hard_mode, session.steps_count,
+                 now - session.last_seen)
+                for pid, session in self._sessions.items()
+            ]
+        temp_file_name = f"{file_name}.tmp"
+        try:
+            with open(temp_file_name, "wb") as bf:
+                pickle.dump(games, bf)
+            os.replace(temp_file_name, file_name)
+        except OSError as e:
+            logging.error(f"{file_name=} writing error {e}")
+        return len(games)
+
+    def load(self, file_name: str) -> int:
+        try:
+            with open(file_name, "rb") as bf:
+                games = pickle.load(bf)
+        except FileNotFoundError:
+            return 0
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            logging.warning(f"{file_name=} reading error {e}")
+            return 0
+        os.remove(file_name)  # the games must not be restored twice
+        now = time.monotonic()
+        with self._lock:
+            for pid, number, start_time, hard_mode, steps, idle in games:
+                session = Session(number, start_time, hard_mode)
+                session.steps_count = steps
+                session.last_seen = now - idle
+                self._sessions[pid] = session
+                self._push(session.last_seen + self._ttl, pid, session)
+        self.expire()
+        logging.info(f"{file_name=} restored {len(self._sessions)} games")
+        return len(games)
+
+    def _push(self, deadline: float, pid: int, session: Session) -> None:
+        heapq.heappush(
+            self._deadlines, (deadline, next(self._sequence), pid, session))
+
+
+if __name__ == "__main__":
+    print(__doc__)
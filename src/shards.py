@@ -0,0 +1,389 @@
+"""
+Sharded deployment of ColdHotGame bot over worker processes
+
+Supervisor runs settings.SHARDS worker processes, the worker number
+user.id % SHARDS owns the user: the players storage, the games in progress,
+the handler threads and the outbound queue (with its share of SEND_RATE)
+of a shard live in its own process and in the shard-<number> directory.
+The intake (polling or webhook) only routes the new messages by user id
+into the worker queues.
+
+Cross-shard reads never gather the players: the Fenwick trees of the
+shard ranks are kept in shared memory and summed by the readers, every
+shard publishes its top-K into shared memory and /leaders merges them.
+
+A worker which exited or got SIGTERM is started again by the supervisor,
+the messages routed to it meanwhile wait in its queue. The shard players
+are persisted by the shard itself and the games in progress are saved
+on exit (and every SESSIONS_SAVE_INTERVAL seconds) and restored on start.
+The metrics of shard n are served on settings.METRICS_PORT + 1 + n.
+
+The number of shards is kept in the "shards" file. On the first start of
+the sharded mode reshard() splits the players of the single process
+storage by id into the shard directories (the storage itself is kept
+as is, the games in progress are not carried over), the supervisor
+refuses to start with another number of shards than the one of the file.
+The single process mode refuses to start over the sharded players too.
+
+The published tops are guarded by a sequence number which is odd while
+they are written. A reader gives up after _READ_RETRIES attempts (the
+worker died in the middle of a write) and returns the tops it read last,
+the restarted worker publishes them again. stop() hands the workers over
+the end of the messages; a worker whose queue stays full for
+STOP_TIMEOUT seconds is terminated (it still saves its shard on SIGTERM).
+
+ShardBoard methods:
+    publish(tops: {board: [(name, value)...]}) -> None
+    rank(board: str, value: int) -> (better, total)
+    tops() -> {board: [(name, value)...]}
+
+Functions:
+    reshard(shards: int) -> None
+
+Supervisor methods:
+    route(messages: list) -> None
+    start() -> None
+    stop() -> None
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import heapq
+import logging
+import multiprocessing
+import os
+import pickle
+import queue
+import signal
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+
+import telebot
+
+from src.config import (
+    BOT_API_URL, BOT_TOKEN, LEADERS_TOP_SIZE, METRICS_PORT, SEND_CHAT_BURST,
+    SEND_CHAT_RATE, SEND_RATE, SHARDS, WORKER_QUEUE_SIZE, WORKERS,
+)
+from src.leaderboard import BOARDS, rank_index, share_ranks, tree_size
+from src.players import _INFINITY
+
+PUBLISH_INTERVAL = 1
+SESSIONS_SAVE_INTERVAL = 60
+STOP_TIMEOUT = 10
+_SHARDS_FILE_NAME = "shards"
+_READ_RETRIES = 1000
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_HEADER_SIZE = 16  # sequence and length of the published tops
+_TOPS_SIZE = 1 << 16
+
+
+def _block_size() -> int:
+    return _HEADER_SIZE + _TOPS_SIZE + sum(
+        8 * tree_size(board) for board in BOARDS)
+
+
+class ShardBoard:
+    def __init__(self, name: str) -> None:
+        self._memory = shared_memory.SharedMemory(name)
+        buffer = self._memory.buf
+        self._header = buffer[:_HEADER_SIZE].cast("q")
+        self._tops = buffer[_HEADER_SIZE:_HEADER_SIZE + _TOPS_SIZE]
+        self.trees = {}
+        offset = _HEADER_SIZE + _TOPS_SIZE
+        for board in BOARDS:
+            size = 8 * tree_size(board)
+            self.trees[board] = buffer[offset:offset + size].cast("q")
+            offset += size
+        self._ranks = {
+            board: rank_index(board, self.trees[board], clear=False)
+            for board in BOARDS
+        }
+        self._last = {}  # the tops read last
+
+    def publish(self, tops: dict) -> None:
+        data = pickle.dumps(tops)
+        if len(data) > _TOPS_SIZE:
+            logging.warning(f"Shard tops of {len(data)} bytes not published")
+            return
+        header = self._header
+        sequence = header[0] | 1  # still odd if the last writer died
+        header[0] = sequence  # odd while the tops are written
+        self._tops[:len(data)] = data
+        header[1] = len(data)
+        header[0] = sequence + 1
+
+    def tops(self) -> dict:
+        header = self._header
+        for _ in range(_READ_RETRIES):
+            sequence = header[0]
+            if sequence % 2:
+                time.sleep(0)
+                continue
+            data = bytes(self._tops[:header[1]])
+            if header[0] == sequence:
+                self._last = pickle.loads(data) if data else {}
+                break
+        return self._last
+
+    def rank(self, board: str, value: int) -> tuple:
+        index = self._ranks[board]
+        return index.rank(value) - 1, index.count()
+
+    def close(self) -> None:
+        self._ranks.clear()
+        for view in (self._header, self._tops, *self.trees.values()):
+            view.release()
+        self._memory.close()
+
+
+class ShardedPlayers:
+    def __init__(self, players, shard: int, boards: list) -> None:
+        self._players = players
+        self._shard = shard
+        self._boards = boards
+
+    def __getattr__(self, name: str):
+        return getattr(self._players, name)
+
+    def __len__(self) -> int:
+        return len(self._players)
+
+    def __getitem__(self, key):
+        return self._players[key]
+
+    def local_top(self, board: str, k: int = LEADERS_TOP_SIZE) -> list:
+        return self._players.get_top(board, k)
+
+    def get_top(self, board: str, k: int = LEADERS_TOP_SIZE) -> list:
+        entries = self.local_top(board, k)
+        for shard, shard_board in enumerate(self._boards):
+            if shard != self._shard:
+                entries += shard_board.tops().get(board, [])[:k]
+        return heapq.nsmallest(k, entries, key=lambda entry: entry[1])
+
+    def get_rank(self, pid: int, board: str) -> tuple:
+        value = getattr(self._players[pid], board)
+        if value == _INFINITY:
+            return None
+        better = total = 0
+        for shard_board in self._boards:
+            shard_better, shard_total = shard_board.rank(board, value)
+            better += shard_better
+            total += shard_total
+        return better + 1, total
+
+
+def _recorded_shards() -> int:
+    try:
+        with open(_SHARDS_FILE_NAME) as f:
+            return int(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def _split(players, shard: int, shards: int) -> int:
+    from src.players import create_players
+    from src.transfer import BATCH
+    shard_players = create_players()
+    shard_players.load()
+    added = 0
+    batch = dict()
+    for pid, player in players.items():
+        if pid % shards != shard:
+            continue
+        batch[pid] = player
+        if len(batch) >= BATCH:
+            added += shard_players.add_many(batch)
+            batch = dict()
+    if batch:
+        added += shard_players.add_many(batch)
+    shard_players.save()
+    return added
+
+
+def reshard(shards: int) -> None:
+    recorded = _recorded_shards()
+    if recorded is not None and recorded != shards:
+        raise ValueError(
+            f"The players are split into {recorded} shards, not {shards}")
+    if recorded is not None or shards == 1:
+        return
+    from src.players import create_players
+    players = create_players()
+    players.load()
+    cwd = os.getcwd()
+    for shard in range(shards):
+        directory = f"shard-{shard}"
+        os.makedirs(directory, exist_ok=True)
+        os.chdir(directory)
+        try:
+            added = _split(players, shard, shards)
+        finally:
+            os.chdir(cwd)
+        logging.info(f"{added} players moved into {directory=}")
+    with open(_SHARDS_FILE_NAME, "w") as f:
+        f.write(f"{shards}\n")
+
+
+def _terminate(signum, frame):
+    raise KeyboardInterrupt
+
+
+def _publish(game, board: ShardBoard, stopped: threading.Event) -> None:
+    published = None
+    saved = time.monotonic()
+    while not stopped.wait(PUBLISH_INTERVAL):
+        tops = {name: game.players.local_top(name) for name in BOARDS}
+        if tops != published:
+            board.publish(tops)
+            published = tops
+        if time.monotonic() - saved > SESSIONS_SAVE_INTERVAL:
+            game.sessions.save(game.sessions_file_name)
+            saved = time.monotonic()
+
+
+def _work(shard: int, shards: int, messages, names: list,
+          profiling: bool) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # stopped by the supervisor
+    signal.signal(signal.SIGTERM, _terminate)
+    sys.path.insert(0, _ROOT)
+    directory = f"shard-{shard}"
+    os.makedirs(directory, exist_ok=True)
+    os.chdir(directory)
+    boards = [ShardBoard(name) for name in names]
+    share_ranks(boards[shard].trees)
+    from src import metrics
+    from src.bot import bot, close, game, sender
+    if METRICS_PORT:
+        metrics.start(port=METRICS_PORT + 1 + shard, profiling=profiling)
+    sender.set_limits(SEND_RATE / shards, SEND_CHAT_RATE, SEND_CHAT_BURST)
+    game.players = ShardedPlayers(game.players, shard, boards)
+    stopped = threading.Event()
+    publisher = threading.Thread(
+        target=_publish, args=(game, boards[shard], stopped), daemon=True)
+    publisher.start()
+    logging.info(f"Shard {shard} of {shards} started in {directory=}")
+    try:
+        while True:
+            message = messages.get()
+            if message is None:
+                break
+            bot.process_new_messages([message])
+    except KeyboardInterrupt:
+        pass
+    finally:
+        close()
+        stopped.set()
+        publisher.join()
+        for board in boards:
+            board.close()
+        logging.info(f"Shard {shard} stopped")
+
+
+class Supervisor:
+    def __init__(self, shards: int = SHARDS, profiling: bool = False) -> None:
+        self._context = multiprocessing.get_context("spawn")
+        self._memory = [
+            shared_memory.SharedMemory(create=True, size=_block_size())
+            for _ in range(shards)
+        ]
+        self._queues = [
+            self._context.Queue(WORKERS * WORKER_QUEUE_SIZE)
+            for _ in range(shards)
+        ]
+        self._processes = [None] * shards
+        self._profiling = profiling
+        self._lock = threading.Lock()
+        self._running = False
+        self.restarts = 0
+
+    def route(self, messages: list) -> None:
+        for message in messages:
+            self._queues[message.from_user.id % len(self._queues)].put(message)
+
+    def start(self) -> None:
+        reshard(len(self._processes))
+        with self._lock:
+            self._running = True
+            for shard in range(len(self._processes)):
+                self._spawn(shard)
+        threading.Thread(
+            target=self._monitor, daemon=True, name="supervisor").start()
+
+    def stop(self) -> None:
+        with self._lock:
+            self._running = False
+        for shard, messages in enumerate(self._queues):
+            process = self._processes[shard]
+            if not process.is_alive():
+                continue
+            try:
+                messages.put(None, timeout=STOP_TIMEOUT)
+            except queue.Full:
+                logging.warning(f"Shard {shard} is not stopping, terminated")
+                process.terminate()
+        for process in self._processes:
+            process.join()
+        for messages in self._queues:
+            messages.cancel_join_thread()  # of a worker which did not restart
+        for memory in self._memory:
+            memory.close()
+            memory.unlink()
+        logging.info(f"Shards stopped, {self.restarts} restarts")
+
+    def _spawn(self, shard: int) -> None:
+        process = self._context.Process(
+            target=_work, name=f"shard-{shard}",
+            args=(shard, len(self._processes), self._queues[shard],
+                  [memory.name for memory in self._memory], self._profiling))
+        process.start()
+        self._processes[shard] = process
+
+    def _monitor(self) -> None:
+        while True:
+            time.sleep(1)
+            with self._lock:
+                if not self._running:
+                    return
+                for shard, process in enumerate(self._processes):
+                    if not process.is_alive():
+                        logging.warning(
+                            f"Shard {shard} exited with {process.exitcode}, "
+                            "restarting")
+                        self.restarts += 1
+                        self._spawn(shard)
+
+
+class _Intake(telebot.TeleBot):
+    def __init__(self, supervisor: Supervisor) -> None:
+        if BOT_API_URL:
+            telebot.apihelper.API_URL = BOT_API_URL
+        super().__init__(BOT_TOKEN, threaded=False)
+        self._supervisor = supervisor
+
+    def process_new_messages(self, new_messages: list) -> None:
+        self._supervisor.route(new_messages)
+
+
+def run(shards: int = SHARDS, webhook: bool = False,
+        profiling: bool = False) -> None:
+    supervisor = Supervisor(shards, profiling)
+    supervisor.start()
+    bot = _Intake(supervisor)
+    try:
+        if webhook:
+            from src.webhook import run as serve
+            serve(bot)
+        else:
+            bot.infinity_polling()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        supervisor.stop()
+
+
+if __name__ == "__main__":
+    print(__doc__)
@@ -0,0 +1,282 @@
+"""
+SQLite storage backend for the bot players
+
+The database runs in WAL mode, every player is a row and the best results
+are indexed columns, so saving a player is a single row write and load()
+rebuilds the leaderboard and rank index with ordered index scans. Only the
+recently used players are kept in memory (settings.PLAYERS_CACHE_SIZE).
+
+On the first load() of an empty database the players are migrated from
+settings.PLAYERS_FILE_NAME (snapshot plus journal) if the file exists.
+
+All the bots hosted in the process share one connection to the database
+(and its lock), the players of a namespace live in their own
+"players_<namespace>" table, the empty namespace in "players".
+
+items() reads the table by pages of ids, so walking all the players keeps
+only one page in memory.
+
+add_new(), save() and save_many() commit their writes at once. len() is
+the count of the players taken by load() and kept by add_new() and
+add_many(), so the metrics scrapes do not count the table under the lock
+shared by the bots.
+
+SqlitePlayers methods are the same as src.players.Players ones.
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from src.config import (
+    LEADERS_TOP_SIZE, PLAYERS_CACHE_SIZE, PLAYERS_DB_NAME, PLAYERS_FILE_NAME,
+)
+from src import metrics
+from src.leaderboard import BOARDS, Leaderboard
+from src.players import (
+    _INFINITY, _JOURNAL_FILE_NAME, _LOAD_BYTES, _LOAD_SECONDS, BasePlayers,
+    Player, Players, namespaced,
+)
+from src.utils import escape_markdown
+
+_COLUMNS = (
+    "name", "games_played", "best_time", "best_steps",
+    "games_played_hard", "best_time_hard", "best_steps_hard",
+)
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS {table} ("
+    "id INTEGER PRIMARY KEY, name TEXT NOT NULL, "
+    "games_played INTEGER NOT NULL, best_time INTEGER NOT NULL, "
+    "best_steps INTEGER NOT NULL, games_played_hard INTEGER NOT NULL, "
+    "best_time_hard INTEGER NOT NULL, best_steps_hard INTEGER NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS {table}_best_steps ON {table} (best_steps)",
+    "CREATE INDEX IF NOT EXISTS {table}_best_time ON {table} (best_time)",
+    "CREATE INDEX IF NOT EXISTS {table}_best_steps_hard "
+    "ON {table} (best_steps_hard)",
+    "CREATE INDEX IF NOT EXISTS {table}_best_time_hard "
+    "ON {table} (best_time_hard)",
+)
+_SELECT = f"SELECT {', '.join(_COLUMNS)} FROM {{table}} WHERE id = ?"
+_UPSERT = (
+    f"INSERT OR REPLACE INTO {{table}} (id, {', '.join(_COLUMNS)}) "
+    f"VALUES (?{', ?' * len(_COLUMNS)})"
+)
+_PAGE = (
+    f"SELECT id, {', '.join(_COLUMNS)} FROM {{table}} "
+    "WHERE id > ? AND id <= ? ORDER BY id LIMIT ?"
+)
+_BOARD = (
+    "SELECT id, name, {board} FROM {table} WHERE {board} < ? "
+    "ORDER BY {board}, id"
+)
+_FIND = (
+    "SELECT id FROM {table} WHERE {board} >= ? AND {board} <= ? "
+    "ORDER BY {board} LIMIT 1"
+)
+_PAGE_SIZE = 1000  # rows read at once by items()
+_engines = dict()  # database path -> (connection, lock) of all namespaces
+_engines_lock = threading.Lock()
+
+
+_SAVE_SECONDS = metrics.Histogram(
+    "coldhot_players_save_seconds", "", 'kind="sqlite"')
+
+
+def _to_row(pid: int, player: Player) -> tuple:
+    return (pid, *(getattr(player, column) for column in _COLUMNS))
+
+
+def _engine(db_name: str) -> tuple:
+    db_name = os.path.abspath(db_name)
+    with _engines_lock:
+        engine = _engines.get(db_name)
+        if engine is None:
+            db = sqlite3.connect(db_name, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            engine = _engines[db_name] = (db, threading.RLock())
+        return engine
+
+
+def _from_row(row: tuple) -> Player:
+    player = Player.__new__(Player)
+    player.__setstate__(dict(zip(_COLUMNS, row)))
+    return player
+
+
+class SqlitePlayers(BasePlayers):
+    def __init__(self, namespace: str = "") -> None:
+        super().__init__()
+        self.namespace = namespace
+        self._table = f"players_{namespace}" if namespace else "players"
+        self._select, self._upsert = (
+            statement.format(table=self._table)
+            for statement in (_SELECT, _UPSERT))
+        self._db = None
+        self._cache = OrderedDict()
+        self._pinned = dict()
+        self._count = 0
+
+    def __iter__(self):
+        with self._lock:
+            pids = [row[0] for row in self._db.execute(
+                f"SELECT id FROM {self._table}")]
+        return iter(pids)
+
+    def __getitem__(self, key):
+        with self._lock:
+            player = self._pinned.get(key)
+            if player is not None:
+                return player
+            player = self._cache.get(key)
+            if player is not None:
+                self._cache.move_to_end(key)
+                return player
+            row = self._db.execute(self._select, (key,)).fetchone()
+            if row is None:
+                raise KeyError(key)
+            player = _from_row(row)
+            self._remember(key, player)
+            return player
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add_new(self, pid: int, name: str) -> None:
+        with self._lock:
+            if self.is_exist(pid):
+                raise KeyError(f"Player {pid=} already in the database")
+            player = Player(name)
+            self._remember(pid, player)
+            self._count += 1
+            try:
+                self._db.execute(self._upsert, _to_row(pid, player))
+                self._db.commit()
+            except sqlite3.Error as e:
+                logging.error(f"{PLAYERS_DB_NAME=} writing error {e}")
+
+    def is_exist(self, pid: int) -> bool:
+        with self._lock:
+            if pid in self._cache or pid in self._pinned:
+                return True
+            return self._db.execute(
+                f"SELECT 1 FROM {self._table} WHERE id = ?", (pid,)
+            ).fetchone() is not None
+
+    def items(self, first: int = None, last: int = None):
+        after = -_INFINITY - 1 if first is None else first - 1
+        last = _INFINITY if last is None else last
+        page = _PAGE.format(table=self._table)
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    page, (after, last, _PAGE_SIZE)).fetchall()
+            for row in rows:
+                player = self._pinned.get(row[0])
+                yield row[0], _from_row(row[1:]) if player is None else player
+            if len(rows) < _PAGE_SIZE:
+                return
+            after = rows[-1][0]
+
+    def load(self) -> None:
+        start = time.perf_counter()
+        self._db, self._lock = _engine(PLAYERS_DB_NAME)
+        with self._lock:
+            for statement in _SCHEMA:
+                self._db.execute(statement.format(table=self._table))
+            self._db.commit()
+        self._count_players()
+        if not len(self) and (
+                os.path.exists(namespaced(PLAYERS_FILE_NAME, self.namespace))
+                or os.path.exists(
+                    namespaced(_JOURNAL_FILE_NAME, self.namespace))):
+            self.migrate_from_pickle()
+            self._count_players()
+        self._leaderboard = Leaderboard(LEADERS_TOP_SIZE)
+        for board in BOARDS:
+            rows = self._db.execute(
+                _BOARD.format(board=board, table=self._table), (_INFINITY,))
+            for pid, name, value in rows:
+                self._leaderboard.update(
+                    pid, escape_markdown(name), board, value)
+        _LOAD_SECONDS.set(time.perf_counter() - start)
+        _LOAD_BYTES.set(os.path.getsize(PLAYERS_DB_NAME))
+
+    def save(self, pid: int = None) -> None:
+        with self._lock:
+            try:
+                if pid is not None:
+                    self._db.execute(self._upsert, _to_row(pid, self[pid]))
+                self._db.commit()
+            except sqlite3.Error as e:
+                logging.error(f"{PLAYERS_DB_NAME=} writing error {e}")
+
+    def save_many(self, players: dict) -> None:
+        start = time.perf_counter()
+        with self._lock:
+            try:
+                self._db.executemany(self._upsert, (
+                    _to_row(pid, player) for pid, player in players.items()))
+                self._db.commit()
+            except sqlite3.Error as e:
+                logging.error(f"{PLAYERS_DB_NAME=} writing error {e}")
+        _SAVE_SECONDS.observe(time.perf_counter() - start)
+
+    def pin(self, pid: int, player: Player) -> None:
+        with self._lock:
+            self._pinned[pid] = player
+
+    def unpin(self, pids) -> None:
+        with self._lock:
+            for pid in pids:
+                player = self._pinned.pop(pid, None)
+                if player is not None and pid not in self._cache:
+                    self._remember(pid, player)
+
+    def migrate_from_pickle(self) -> None:
+        players = Players(self.namespace)
+        players.load()
+        with self._lock:
+            self._db.executemany(
+                self._upsert, (_to_row(pid, players[pid]) for pid in players))
+            self._db.commit()
+        logging.info(
+            f"{len(players)} players migrated "
+            f"from {players._file_name=} to {PLAYERS_DB_NAME=} {self._table=}")
+
+    def _added(self, pid: int, player: Player) -> None:
+        super()._added(pid, player)
+        self._count += 1
+
+    def _find(self, board: str, low: int, high: int) -> int:
+        high = _INFINITY - 1 if high is None else high
+        with self._lock:
+            for pid, player in self._pinned.items():  # not saved yet
+                if low <= getattr(player, board) <= high:
+                    return pid
+            row = self._db.execute(
+                _FIND.format(board=board, table=self._table), (low, high)
+            ).fetchone()
+        if row is None:
+            raise KeyError(f"No player of {board=} in {low}..{high}")
+        return row[0]
+
+    def _count_players(self) -> None:
+        with self._lock:
+            self._count = self._db.execute(
+                f"SELECT COUNT(*) FROM {self._table}").fetchone()[0]
+
+    def _remember(self, pid: int, player: Player) -> None:
+        self._cache[pid] = player
+        if len(self._cache) > PLAYERS_CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+
+if __name__ == '__main__':
+    print(__doc__)
@@ -42,7 +42,7 @@ HELP_OUT_GAME = (
     "/start — 😌 звичайна гра\n"
     "/hardcore — 🤪 складна гра\n"
     "/stop — ✋ зупинити поточну гру\n"
-    "/leaders — 🎖 таблиця лідерів TOP\\-3\n"
+    "/leaders — 🎖 таблиця лідерів TOP\\-{1}\n"
     "/stats — ✍ статистика твоїх ігор\n"
     "/help — 🤝 допомога\n\n"
     "*Самореклама:*\n"
@@ -93,16 +93,24 @@ RECORD_FOOTER = (
 )
 
 MEDALS = ("🥇", "🥈", "🥉")
+PLACE = "{0}\\."
 LEADERS_TABLE = (
-    "🏆🏆🏆 *Таблиця лідерів TOP\\-3* 🏆🏆🏆\n\n"
+    "🏆🏆🏆 *Таблиця лідерів TOP\\-{0}* 🏆🏆🏆\n\n"
     "😌 *Звичайна гра*\n"
-    "Рекорд по крокам:\n{0}"
-    "Найкращий час:\n{1}\n"
+    "Рекорд по крокам:\n{1}"
+    "Найкращий час:\n{2}\n"
     "🤪 *Складна гра*\n"
-    "Рекорд по крокам:\n{2}"
-    "Найкращий час:\n{3}"
+    "Рекорд по крокам:\n{3}"
+    "Найкращий час:\n{4}"
 )
 
+RANKS_TITLE = "🎯 *Твоє місце:*\n"
+RANK_NAMES = (
+    "😌 рекорд по крокам", "😌 найкращий час",
+    "🤪 рекорд по крокам", "🤪 найкращий час",
+)
+RANK = "{0} — {1} з {2} \\(топ {3}%\\)\n"
+
 STATS_TITLE = "✍ *Статистика твоїх ігор:*\n\n"
 STATS_NORMAL = (
     "*Звичайний режим*:\n"
@@ -0,0 +1,126 @@
+"""
+Streaming export and import of the bot players
+
+str(players) builds one indented JSON document of the whole database in
+memory. export_players() writes the players one per line instead while
+walking them by Players.items(), so its memory does not depend on the
+number of players (but for the copy of the ids walked by the pickle
+backend, which keeps all the players in memory and exports them in the
+storage order), optionally only the ids in first..last (inclusive) and
+the players passing where(player). import_players() reads such a file
+line by line and adds the players which are not in the storage yet by
+Players.add_many() in batches of BATCH players, the players in the
+storage are kept. Invalid lines are logged and skipped.
+
+The format is taken from the file extension:
+    .jsonl - JSON Lines, an object per player
+    .csv - CSV with a header row
+Fields are "id" and the Player attributes of Player.__getstate__(),
+9223372036854775807 stands for no result yet.
+
+The bot should not run on the same storage during an import, the memory
+of the pickle backend grows with the imported players as it keeps all of
+them in memory anyway.
+
+Functions:
+    export_players(players, file_name: str, first: int = None,
+        last: int = None, where=None) -> int
+    import_players(players, file_name: str) -> (read, added)
+    read_players(file_name: str) -> (id, Player) generator
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import csv
+import json
+import logging
+import os
+
+from src.players import Player
+
+BATCH = 1000
+FORMATS = (".jsonl", ".csv")
+FIELDS = ("id",) + Player._FIELDS
+
+
+def file_format(file_name: str) -> str:
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"{file_name=} is not one of {FORMATS}")
+    return extension
+
+
+def _player(state: dict) -> tuple:
+    pid = int(state.pop("id"))
+    if not isinstance(state["name"], str):
+        raise ValueError(f"Player {pid=} name is not a string")
+    for field in Player._FIELDS[1:]:
+        if field in state:
+            state[field] = int(state[field])
+    player = Player.__new__(Player)
+    player.__setstate__(state)
+    return pid, player
+
+
+def export_players(players, file_name: str, first: int = None,
+                   last: int = None, where=None) -> int:
+    extension = file_format(file_name)
+    count = 0
+    with open(file_name, "w", encoding="utf-8", newline="") as f:
+        if extension == ".csv":
+            writer = csv.writer(f)
+            writer.writerow(FIELDS)
+        for pid, player in players.items(first, last):
+            if where is not None and not where(player):
+                continue
+            state = player.__getstate__()
+            if extension == ".csv":
+                writer.writerow((pid, *state.values()))
+            else:
+                f.write(json.dumps(
+                    {"id": pid, **state}, ensure_ascii=False) + "\n")
+            count += 1
+    logging.info(f"{count} players exported to {file_name=}")
+    return count
+
+
+def read_players(file_name: str):
+    csv_file = file_format(file_name) == ".csv"
+    with open(file_name, encoding="utf-8", newline="") as f:
+        if csv_file:
+            reader = csv.DictReader(f)
+            lines = ((reader.line_num, state) for state in reader)
+        else:
+            lines = (
+                (line_number, line)
+                for line_number, line in enumerate(f, 1) if line.strip())
+        for line_number, line in lines:
+            try:
+                pid, player = _player(line if csv_file else json.loads(line))
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                logging.warning(
+                    f"{file_name=} line {line_number} skipped: {e!r}")
+                continue
+            yield pid, player
+
+
+def import_players(players, file_name: str) -> tuple:
+    read = added = 0
+    batch = dict()
+    for pid, player in read_players(file_name):
+        read += 1
+        batch[pid] = player
+        if len(batch) >= BATCH:
+            added += players.add_many(batch)
+            batch = dict()
+    if batch:
+        added += players.add_many(batch)
+    logging.info(
+        f"{read} players read from {file_name=}, {added} added, "
+        f"{read - added} already in the storage")
+    return read, added
+
+
+if __name__ == "__main__":
+    print(__doc__)
@@ -2,57 +2,136 @@
 Contains utilities for ColdHotGame bot
 
 get_hit_index(guess: int, goal: int) - returns index of the hit
+get_hit_indexes(guesses, goals, max_number, bands) - the same for NumPy
+    arrays of int64, optionally for another MAX_GUESS_NUMBER or bands
+hit_bands(max_number: int) - ascending smallest distances of the hint bands
+make_hit_index(max_number: int) - get_hit_index() for another MAX_GUESS_NUMBER
 get_plural_word() - for the number returns corresponding plural word from list
 seconds_to_ua() - for the seconds returns string in Ukrainian
+escape_markdown() - escapes the MarkdownV2 special characters in one pass
+
+A guess within 1..MAX_GUESS_NUMBER is hinted by the distance to the goal
+only. The smallest distance of every hint band is found once from the float
+checks of the hints, distances are looked up in a table and the ones
+beyond it are banded by bisect. get_hit_indexes() needs numpy.
+
+Plural words of small numbers are taken from precomputed tables, the other
+plural words and the durations are kept in bounded LRU caches.
 
 ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
 mtrineyev@gmail.com
 """
 
-from settings import MAX_GUESS_NUMBER
+import re
+from bisect import bisect_right
+from functools import lru_cache
+
+from src.config import MAX_GUESS_NUMBER
 
 HOURS = ("година", "години", "годин")
 MINUTES = ("хвилина", "хвилини", "хвилин")
 SECONDS = ("секунда", "секунди", "секунд")
 STEPS = ("хід", "ходи", "ходів")
 GAMES = ("гру", "гри", "ігор")
+_SMALL_NUMBERS = 256  # plural words of 0..255 are precomputed
+_RENDER_CACHE_SIZE = 4096  # the other words and durations in LRU caches
+_HIT_TABLE_LIMIT = 1 << 16  # distances beyond are banded by bisect
+_MARKDOWN = str.maketrans({c: f"\\{c}" for c in "_*[]()~`>#+-=|{}.!"})
+_MARKDOWN_SPECIAL = re.compile(r"[_*\[\]()~`>#+\-=|{}.!]")
+
+
+def _hit_band(distance: int) -> int:
+    return 13 - bisect_right(_BAND_THRESHOLDS, distance)
+
+
+def hit_bands(max_number: int = MAX_GUESS_NUMBER) -> list:
+    # the smallest distance of every band in the order of the checks,
+    # a band hidden by a former one with a smaller threshold takes its one
+    bands = (
+        lambda d: d / max_number >= 0.9,
+        lambda d: d / max_number >= 0.6,
+        lambda d: d / max_number >= 0.4,
+        lambda d: d / max_number >= 0.3,
+        lambda d: d / max_number >= 0.2,
+        lambda d: d >= max_number * 0.1,
+        lambda d: d >= 50,
+        lambda d: d >= 25,
+        lambda d: d >= 12,
+        lambda d: d >= 6,
+        lambda d: d >= 2,
+    )
+    thresholds = []
+    for holds in bands:
+        low, high = 0, 1
+        while not holds(high):
+            low, high = high, high * 2
+        while low < high:
+            middle = (low + high) // 2
+            if holds(middle):
+                high = middle
+            else:
+                low = middle + 1
+        thresholds.append(min([high] + thresholds[-1:]))
+    return thresholds[::-1]
+
+
+_BAND_THRESHOLDS = hit_bands()  # ascending, of the indexes 12..2
+_HIT_TABLE = bytes(
+    _hit_band(distance)
+    for distance in range(min(_BAND_THRESHOLDS[-1] + 1, _HIT_TABLE_LIMIT)))
+_FAR = MAX_GUESS_NUMBER * 5
 
 
 def get_hit_index(guess: int, goal: int) -> int:
+    if abs(guess) >= _FAR:
+        return 0
+    if guess > MAX_GUESS_NUMBER or guess <= 0:
+        return 1
     distance = abs(guess - goal)
-    percent = distance / MAX_GUESS_NUMBER
-    if abs(guess) >= MAX_GUESS_NUMBER * 5:
-        index = 0
-    elif guess > MAX_GUESS_NUMBER or guess <= 0:
-        index = 1
-    elif percent >= 0.9:
-        index = 2
-    elif percent >= 0.6:
-        index = 3
-    elif percent >= 0.4:
-        index = 4
-    elif percent >= 0.3:
-        index = 5
-    elif percent >= 0.2:
-        index = 6
-    elif distance >= MAX_GUESS_NUMBER * 0.1:
-        index = 7
-    elif distance >= 50:
-        index = 8
-    elif distance >= 25:
-        index = 9
-    elif distance >= 12:
-        index = 10
-    elif distance >= 6:
-        index = 11
-    elif distance >= 2:
-        index = 12
-    else:
-        index = 13
-    return index
+    if distance < len(_HIT_TABLE):
+        return _HIT_TABLE[distance]
+    return _hit_band(distance)
 
 
-def get_plural_word(number: int, plurals: tuple) -> str:
+def make_hit_index(max_number: int):
+    if max_number == MAX_GUESS_NUMBER:
+        return get_hit_index
+    bands = hit_bands(max_number)
+    table = bytes(
+        13 - bisect_right(bands, distance)
+        for distance in range(min(bands[-1] + 1, _HIT_TABLE_LIMIT)))
+    far = max_number * 5
+
+    def hit_index(guess: int, goal: int) -> int:
+        if abs(guess) >= far:
+            return 0
+        if guess > max_number or guess <= 0:
+            return 1
+        distance = abs(guess - goal)
+        if distance < len(table):
+            return table[distance]
+        return 13 - bisect_right(bands, distance)
+
+    return hit_index
+
+
+def get_hit_indexes(guesses, goals, max_number: int = MAX_GUESS_NUMBER,
+                    bands: list = None):
+    import numpy as np  # optional, the bot itself does not need it
+    if bands is None:
+        bands = (_BAND_THRESHOLDS if max_number == MAX_GUESS_NUMBER
+                 else hit_bands(max_number))
+    guesses = np.asarray(guesses, dtype=np.int64)
+    goals = np.asarray(goals, dtype=np.int64)
+    distances = np.abs(guesses - goals)
+    indexes = 13 - np.searchsorted(
+        np.array(bands, dtype=np.int64), distances, side="right")
+    indexes = np.where((guesses > max_number) | (guesses <= 0), 1, indexes)
+    indexes = np.where(np.abs(guesses) >= max_number * 5, 0, indexes)
+    return indexes.astype(np.uint8)
+
+
+def _plural_word(number: int, plurals: tuple) -> str:
     if number == 0:
         return ""
     modulus = number % 100
@@ -66,6 +145,22 @@ def get_plural_word(number: int, plurals: tuple) -> str:
         return f"{number} {plurals[2]}"
 
 
+_PLURAL_WORDS = {
+    plurals: tuple(_plural_word(n, plurals) for n in range(_SMALL_NUMBERS))
+    for plurals in (HOURS, MINUTES, SECONDS, STEPS, GAMES)
+}
+_cached_plural_word = lru_cache(maxsize=_RENDER_CACHE_SIZE)(_plural_word)
+
+
+def get_plural_word(number: int, plurals: tuple) -> str:
+    words = _PLURAL_WORDS.get(plurals)
+    if words is not None and type(number) is int \
+            and 0 <= number < _SMALL_NUMBERS:
+        return words[number]
+    return _cached_plural_word(number, plurals)
+
+
+@lru_cache(maxsize=_RENDER_CACHE_SIZE)
 def seconds_to_ua(seconds: int, plural=()) -> str:
     assert plural == ()
     m, s = divmod(seconds, 60)
@@ -80,26 +175,10 @@ def seconds_to_ua(seconds: int, plural=()) -> str:
 
 
 def escape_markdown(text: str) -> str:
-    return (text
-            .replace("_", "\\_")
-            .replace("*", "\\*")
-            .replace("[", "\\[")
-            .replace("]", "\\]")
-            .replace("(", "\\(")
-            .replace(")", "\\)")
-            .replace("~", "\\~")
-            .replace("`", "\\`")
-            .replace(">", "\\>")
-            .replace("#", "\\#")
-            .replace("+", "\\+")
-            .replace("-", "\\-")
-            .replace("=", "\\=")
-            .replace("|", "\\|")
-            .replace("{", "\\{")
-            .replace("}", "\\}")
-            .replace(".", "\\.")
-            .replace("!", "\\!")
-            )
+    # most names have nothing to escape and are returned as is
+    if _MARKDOWN_SPECIAL.search(text) is None:
+        return text
+    return text.translate(_MARKDOWN)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,132 @@
+"""
+Webhook mode for ColdHotGame bot with an embedded HTTP server
+
+Telegram POSTs updates to settings.WEBHOOK_HOST:WEBHOOK_PORT (normally
+behind a TLS reverse proxy). Requests without the right
+X-Telegram-Bot-Api-Secret-Token header are rejected, the server refuses
+to start without settings.WEBHOOK_SECRET (or with the former "change-me"
+placeholder of settings.example). Malformed updates are answered
+with 400. Accepted updates go to a bounded queue served by one intake
+thread, which passes them in the order of arrival to the synchronous bot.
+Its handlers only hand them over to the per-user ordered
+src.executor.KeyedExecutor (or to the shard of the user, see src.shards),
+so the updates of a user are handled in order as with polling. When the
+queue stays full for WEBHOOK_QUEUE_TIMEOUT seconds the request is
+answered with 503, so Telegram delivers the update again later.
+
+close() stops accepting updates (they are answered with 503 as well),
+hands the accepted ones over to the bot and closes the server; run()
+calls it when the serving stops, as on SIGTERM.
+
+ColdHotGame bot v3.0 (c) 2020-2023 Maksym Trineiev
+mtrineyev@gmail.com
+"""
+
+import hmac
+import json
+import logging
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telebot.types import Update
+
+from src.config import (
+    WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_QUEUE_SIZE, WEBHOOK_QUEUE_TIMEOUT,
+    WEBHOOK_SECRET, WEBHOOK_URL,
+)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+_PLACEHOLDER = "change-me"  # the WEBHOOK_SECRET shipped before
+_STOP = object()
+
+
+class WebhookServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, bot, host: str = WEBHOOK_HOST,
+                 port: int = WEBHOOK_PORT, secret: str = WEBHOOK_SECRET,
+                 queue_size: int = WEBHOOK_QUEUE_SIZE) -> None:
+        if not secret or secret == _PLACEHOLDER:
+            raise ValueError("WEBHOOK_SECRET is required in webhook mode")
+        super().__init__((host, port), _Handler)
+        self.bot = bot
+        self.secret = secret.encode()
+        self.updates = queue.Queue(queue_size)
+        self.rejected = 0
+        self.closing = False
+        bot.threaded = False  # the updates keep their order
+        self._intake = threading.Thread(
+            target=self._work, daemon=True, name="webhook")
+
+    def serve_forever(self, poll_interval: float = 0.5) -> None:
+        self._intake.start()
+        super().serve_forever(poll_interval)
+
+    def close(self) -> None:
+        self.closing = True
+        self.server_close()
+        if self._intake.is_alive():
+            self.updates.put(_STOP)  # after the accepted updates
+            self._intake.join()
+
+    def _work(self) -> None:
+        while True:
+            update = self.updates.get()
+            if update is _STOP:
+                return
+            try:
+                self.bot.process_new_updates([update])
+            except Exception as e:
+                logging.exception(f"Webhook update processing error {e}")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: WebhookServer
+
+    def do_POST(self) -> None:
+        secret = self.headers.get(SECRET_HEADER, "").encode()
+        if not hmac.compare_digest(secret, self.server.secret):
+            self._answer(403)
+            return
+        try:
+            size = int(self.headers.get("Content-Length", 0))
+            update = Update.de_json(json.loads(self.rfile.read(size)))
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self._answer(400)
+            return
+        if self.server.closing:
+            self._answer(503)
+            return
+        try:
+            self.server.updates.put(update, timeout=WEBHOOK_QUEUE_TIMEOUT)
+        except queue.Full:
+            self.server.rejected += 1
+            logging.warning(
+                f"Webhook queue is full, {self.server.rejected} rejected")
+            self._answer(503)
+            return
+        self._answer(200)
+
+    def _answer(self, code: int) -> None:
+        self.send_response(code)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def run(bot) -> None:
+    if WEBHOOK_URL:
+        bot.set_webhook(url=WEBHOOK_URL, secret_token=WEBHOOK_SECRET)
+    server = WebhookServer(bot)
+    logging.info(f"Webhook server listening on {WEBHOOK_HOST}:{WEBHOOK_PORT}")
+    try:
+        server.serve_forever()
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    print(__doc__)